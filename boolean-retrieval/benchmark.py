@@ -0,0 +1,401 @@
+#!/usr/bin/python3
+import sys
+import getopt
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from functools import partial
+
+from codec import CODECS
+from dictionary import Dictionary
+from postingsfile import PostingsFile
+from skippointer import SkipPointer, SKIP_RULES, DEFAULT_STRIDE, ROOT_L
+from spimi import SpimiIndexer
+import intersect
+import planner
+import terms_eval
+import pipeline
+import util
+from cursors import ListCursor, OrCursor, iter_doc_ids
+
+SMALL_LIST_SIZE = 200  # Postings in the shorter list of a pair
+RATIOS = [1, 4, 16, 64, 256, 1024]  # Length ratios of the longer to the shorter list
+ALL_DOCS = "$all_docs$"
+OPERATOR_NUM_DOCS = 200000  # Document ids of the synthetic index of the operator benchmark
+OPERATOR_SIZES = [(1000, 1000), (1000, 10000), (1000, 100000), (10000, 10000), (10000, 100000), (100000, 100000)]
+NOT_SIZES = [1000, 10000, 100000]
+OR_TERMS = [2, 4, 8, 16, 32, 64]  # Operands of the OR benchmark
+OR_LIST_SIZE = 2000  # Postings in every operand of the OR benchmark
+REGRESSION_THRESHOLD = 0.10  # Slowdown of p50 against the baseline reported as a regression
+
+
+def usage():
+    print("usage: " + sys.argv[0] + " -b " + "|".join(sorted(BENCHMARKS)) + " [-r repeats] [-s seed] [-i directory-of-documents] [-q file-of-queries] [-l query-log] [-f vbyte|pickle] [-k stride]"
+          + " [-n samples] [-o results.json] [-c baseline.json]")
+
+def make_posting_list(rng, size, num_docs):
+    """
+    Builds a sorted posting list of random document ids
+    :param rng: random.Random to draw from
+    :param size: number of postings
+    :param num_docs: document ids are drawn from 1 to num_docs
+    :return: Posting list [(docId, 0)]
+    """
+    return [(doc_id, 0) for doc_id in sorted(rng.sample(range(1, num_docs + 1), size))]
+
+def time_call(function, repeats):
+    """
+    Runs function repeats times
+    :return: fastest run in seconds
+    """
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def time_samples(function, samples):
+    """
+    Runs function samples times
+    :return: sorted list of the run times in seconds
+    """
+    times = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return sorted(times)
+
+def percentile(sorted_times, p):
+    """
+    :return: nearest rank p-th percentile of sorted_times
+    """
+    rank = max(int(len(sorted_times) * p / 100.0 + 0.999999) - 1, 0)
+    return sorted_times[min(rank, len(sorted_times) - 1)]
+
+def bench_intersect(repeats, seed, options):
+    """
+    Compares the intersection strategies on list pairs of increasing length skew
+    """
+    rng = random.Random(seed)
+    names = sorted(intersect.STRATEGIES)
+
+    print("%8s %8s %8s " % ("ratio", "small", "large") + " ".join("%10s" % name for name in names) + " %10s" % "chosen")
+    for ratio in RATIOS:
+        large_size = SMALL_LIST_SIZE * ratio
+        num_docs = large_size * 2
+        small_list = make_posting_list(rng, SMALL_LIST_SIZE, num_docs)
+        large_list = make_posting_list(rng, large_size, num_docs)
+
+        timings = []
+        for name in names:
+            seconds = time_call(lambda: intersect.intersect(small_list, large_list, name), repeats)
+            timings.append("%8.3fms" % (seconds * 1000))
+
+        chosen = intersect.select_strategy(len(small_list), len(large_list))
+        print("%8d %8d %8d " % (ratio, SMALL_LIST_SIZE, large_size) + " ".join("%10s" % t for t in timings) + " %10s" % chosen)
+
+
+def count_skips(doc_ids, posting_list):
+    """
+    Replays doc_ids AND posting_list the way the merge of a list with a stored term does
+    :param doc_ids: sorted document ids of the shorter operand
+    :param posting_list: Posting list [(docId, skipIdx)] of the term with its stored skips
+    :return: (matching document ids, skips taken, postings visited one by one)
+    """
+    result = []
+    skips = steps = 0
+    idx = 0
+    len_posting_list = len(posting_list)
+    for doc_id in doc_ids:
+        while idx < len_posting_list and posting_list[idx][0] < doc_id:
+            skip_ptr = posting_list[idx][1]
+            if skip_ptr != 0 and skip_ptr < len_posting_list and posting_list[skip_ptr][0] <= doc_id:
+                idx = skip_ptr
+                skips += 1
+            else:
+                idx += 1
+                steps += 1
+        if idx < len_posting_list and posting_list[idx][0] == doc_id:
+            result.append(doc_id)
+
+    return result, skips, steps
+
+def replay_plan(node, dictionary, postings):
+    """
+    Counts the skips taken by the intersections of terms in a plan. AND operands are intersected in order
+    of document frequency, and the negated terms of AND NOT are walked for the postings of the positive term
+    :return: (skips taken, postings visited one by one)
+    """
+    skips = steps = 0
+    terms = [child.term for child in node.children if child.op == 'TERM' and dictionary.get_df(child.term) > 0]
+    if node.op == 'AND' and len(terms) > 1:
+        terms.sort(key=dictionary.get_df)
+        doc_ids = [posting[0] for posting in postings.get_posting_list(dictionary.get_offset_of_term(terms[0]))]
+        for term in terms[1:]:
+            doc_ids, term_skips, term_steps = count_skips(doc_ids, postings.get_posting_list(dictionary.get_offset_of_term(term)))
+            skips += term_skips
+            steps += term_steps
+    elif node.op == 'AND_NOT' and node.children[0].op == 'TERM' and terms and terms[0] == node.children[0].term:
+        doc_ids = [posting[0] for posting in postings.get_posting_list(dictionary.get_offset_of_term(terms[0]))]
+        for term in terms[1:]:
+            _, term_skips, term_steps = count_skips(doc_ids, postings.get_posting_list(dictionary.get_offset_of_term(term)))
+            skips += term_skips
+            steps += term_steps
+
+    for child in node.children:
+        child_skips, child_steps = replay_plan(child, dictionary, postings)
+        skips += child_skips
+        steps += child_steps
+
+    return skips, steps
+
+def bench_skips(repeats, seed, options):
+    """
+    Builds the index of a corpus with every skip rule and compares the time to evaluate a queries file
+    and the number of skips taken by the intersections of its terms
+    """
+    if options["documents"] is None:
+        usage()
+        sys.exit(2)
+
+    # Tokenizing dominates building the index, so it is done once for all rules
+    in_dir = options["documents"]
+    documents = list(pipeline.map_documents(partial(util.read_document, in_dir), sorted(map(int, os.listdir(in_dir)))))
+    with open(options["queries"], 'r') as query_file:
+        query_lines = [query for query in query_file if query.strip()]
+
+    temp_dir = tempfile.mkdtemp(prefix="skips_")
+    try:
+        query_log = options["query_log"]
+        if query_log is None:
+            # The adaptive rule must not learn from the queries it is timed on, so without a query log the queries
+            # file is split by seed into a half it learns from and a half every rule is timed on
+            rng = random.Random(seed)
+            rng.shuffle(query_lines)
+            half = len(query_lines) // 2
+            query_log = os.path.join(temp_dir, "query_log.txt")
+            with open(query_log, 'w') as log_file:
+                log_file.writelines(query_lines[:half])
+            query_lines = query_lines[half:]
+            print("adaptive rule learns from %d queries of %s (seed %d), timed on the other %d"
+                  % (half, options["queries"], seed, len(query_lines)))
+        else:
+            print("adaptive rule learns from %s, timed on the %d queries of %s"
+                  % (query_log, len(query_lines), options["queries"]))
+        queries = [util.reverse_polish_expression(query) for query in query_lines]
+
+        print("%10s %12s %10s %10s %10s" % ("rule", "postings", "time", "skips", "steps"))
+        for name in sorted(SKIP_RULES):
+            dictionary = Dictionary(os.path.join(temp_dir, name + ".dict"))
+            postings_file = os.path.join(temp_dir, name + ".postings")
+            skip_pointer = SkipPointer(SKIP_RULES[name], options["stride"], query_log)
+            with SpimiIndexer(1 << 40, skip_pointer, CODECS[options["format"]], temp_dir) as indexer:
+                for document, terms in documents:
+                    indexer.add_document(document, terms + [ALL_DOCS])
+                indexer.merge(postings_file, dictionary)
+
+            with PostingsFile(postings_file) as postings:
+                plans = [planner.plan_query(query, dictionary) for query in queries]
+                seconds = time_call(lambda: [util.execute_query_plan(plan, dictionary, postings) for plan in plans], repeats)
+
+                skips = steps = 0
+                for plan in plans:
+                    if plan is not None:
+                        plan_skips, plan_steps = replay_plan(plan, dictionary, postings)
+                        skips += plan_skips
+                        steps += plan_steps
+
+            print("%10s %12d %8.1fms %10d %10d" % (name, os.path.getsize(postings_file), seconds * 1000, skips, steps))
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def build_synthetic_index(postings_file, doc_lists, codec):
+    """
+    Writes the posting lists of synthetic terms straight to a postings file
+    :param postings_file: postings file to write
+    :param doc_lists: {term: sorted document ids}
+    :param codec: codec of the postings format
+    :return: in memory Dictionary of the terms
+    """
+    dictionary = Dictionary(postings_file + ".dict")
+    skip_pointer = SkipPointer(ROOT_L)
+    with open(postings_file, 'wb') as postings_disk:
+        postings_disk.write(codec.header)
+        for term, doc_ids in sorted(doc_lists.items()):
+            dictionary.add_term(term, len(doc_ids), postings_disk.tell())
+            postings_disk.write(codec.encode(doc_ids, skip_pointer, term))
+    return dictionary
+
+def get_operator_cases(postings, dictionary):
+    """
+    :return: list of (name, function, number of input postings) for every operator, operand kind and size
+    """
+    def as_list(term):
+        return list(terms_eval.get_list(postings, dictionary, term))
+
+    cases = []
+    for small, large in OPERATOR_SIZES:
+        first, second = "a%d" % small, "b%d" % large
+        first_list, second_list = as_list(first), as_list(second)
+        for name, operator in (("AND", terms_eval.eval_AND), ("OR", terms_eval.eval_OR),
+                               ("AND_NOT", terms_eval.eval_AND_NOT)):
+            cases.append(("%s term-term %dx%d" % (name, small, large),
+                          lambda operator=operator, first=first, second=second:
+                              operator(postings, dictionary, first, second), small + large))
+            cases.append(("%s list-list %dx%d" % (name, small, large),
+                          lambda operator=operator, first=first_list, second=second_list:
+                              operator(postings, dictionary, first, second), small + large))
+
+    # NOT is lazy, the work is done when its complement against $all_docs$ is materialized
+    for size in NOT_SIZES:
+        term = "a%d" % size
+        term_list = as_list(term)
+        cases.append(("NOT term %d" % size,
+                      lambda term=term: terms_eval.materialize(postings, dictionary, terms_eval.eval_NOT(postings, dictionary, term)),
+                      size + OPERATOR_NUM_DOCS))
+        cases.append(("NOT list %d" % size,
+                      lambda term_list=term_list: terms_eval.materialize(postings, dictionary, terms_eval.eval_NOT(postings, dictionary, term_list)),
+                      size + OPERATOR_NUM_DOCS))
+    return cases
+
+def bench_operators(repeats, seed, options):
+    """
+    Times AND, OR, AND NOT and NOT of terms_eval on term and result list operands of a seeded synthetic index.
+    The postings file is read without a cache, so operators on terms include decoding the lists.
+    Prints p50 and p99 latency and throughput in input postings per second, compared with a baseline if given
+    """
+    rng = random.Random(seed)
+    doc_lists = {ALL_DOCS: list(range(1, OPERATOR_NUM_DOCS + 1))}
+    for small, large in OPERATOR_SIZES:
+        doc_lists["a%d" % small] = [posting[0] for posting in make_posting_list(rng, small, OPERATOR_NUM_DOCS)]
+        doc_lists["b%d" % large] = [posting[0] for posting in make_posting_list(rng, large, OPERATOR_NUM_DOCS)]
+
+    baseline = None
+    if options["baseline"] is not None:
+        with open(options["baseline"], 'r') as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline["format"] != options["format"] or baseline["seed"] != seed:
+            print("warning: baseline was measured with format %s and seed %d" % (baseline["format"], baseline["seed"]))
+
+    temp_dir = tempfile.mkdtemp(prefix="operators_")
+    results = {"format": options["format"], "seed": seed, "samples": options["samples"], "cases": {}}
+    try:
+        postings_file = os.path.join(temp_dir, "postings")
+        dictionary = build_synthetic_index(postings_file, doc_lists, CODECS[options["format"]])
+        with PostingsFile(postings_file, 0) as postings:
+            print("%-32s %10s %10s %12s %10s" % ("case", "p50", "p99", "postings/s", "vs base"))
+            for name, function, num_postings in get_operator_cases(postings, dictionary):
+                function()  # Warm up
+                times = time_samples(function, options["samples"])
+                p50, p99 = percentile(times, 50), percentile(times, 99)
+                results["cases"][name] = {"p50_ms": p50 * 1000, "p99_ms": p99 * 1000,
+                                          "postings_per_sec": num_postings / p50 if p50 else 0.0}
+
+                comparison = ""
+                if baseline is not None and name in baseline["cases"]:
+                    change = p50 * 1000 / baseline["cases"][name]["p50_ms"] - 1
+                    comparison = "%+9.1f%%" % (change * 100)
+                    if change > REGRESSION_THRESHOLD:
+                        comparison += " REGRESSION"
+                print("%-32s %8.3fms %8.3fms %12.0f %s" % (name, p50 * 1000, p99 * 1000,
+                                                          results["cases"][name]["postings_per_sec"], comparison))
+    finally:
+        shutil.rmtree(temp_dir)
+
+    if options["output"] is not None:
+        with open(options["output"], 'w') as output_file:
+            json.dump(results, output_file, indent=2, sort_keys=True)
+
+
+def bench_or(repeats, seed, options):
+    """
+    Compares an OR of k result lists merged two at a time, by the k-way heap merge and by the heap of cursors
+    """
+    rng = random.Random(seed)
+
+    print("%8s %10s %12s %12s %12s %8s %10s" % ("terms", "postings", "pairwise", "heap", "cursors", "speedup", "chosen"))
+    for num_terms in OR_TERMS:
+        lists = [make_posting_list(rng, OR_LIST_SIZE, OPERATOR_NUM_DOCS) for _ in range(num_terms)]
+
+        def pairwise():
+            result = lists[0]
+            for posting_list in lists[1:]:
+                result = terms_eval.eval_OR(None, None, result, posting_list)
+            return result
+
+        pairwise_time = time_call(pairwise, repeats)
+        heap_time = time_call(lambda: terms_eval.eval_OR_Many(None, None, lists), repeats)
+        cursor_time = time_call(lambda: list(iter_doc_ids(OrCursor([ListCursor(posting_list) for posting_list in lists]))),
+                                repeats)
+        chosen = "heap" if num_terms >= terms_eval.HEAP_OR_MIN_OPERANDS else "pairwise"
+        print("%8d %10d %10.3fms %10.3fms %10.3fms %7.1fx %10s" % (num_terms, num_terms * OR_LIST_SIZE, pairwise_time * 1000,
+                                                                   heap_time * 1000, cursor_time * 1000,
+                                                                   pairwise_time / heap_time, chosen))
+
+
+BENCHMARKS = {
+    "intersect": bench_intersect,
+    "skips": bench_skips,
+    "operators": bench_operators,
+    "or": bench_or,
+}
+
+benchmark = None
+repeats = 5
+seed = 3245
+options = {
+    "documents": None,  # Corpus indexed by benchmarks of the index
+    "queries": "queries.txt",
+    "query_log": None,  # Sample queries of the adaptive skip rule, half of the queries file if not set
+    "format": "vbyte",
+    "stride": DEFAULT_STRIDE,
+    "samples": 30,  # Timed runs of every case of the operator benchmark
+    "output": None,  # JSON file the operator results are written to
+    "baseline": None,  # JSON file of earlier operator results to compare with
+}
+
+try:
+    opts, args = getopt.getopt(sys.argv[1:], 'b:r:s:i:q:l:f:k:n:o:c:')
+except getopt.GetoptError:
+    usage()
+    sys.exit(2)
+
+for o, a in opts:
+    if o == '-b':
+        benchmark = a
+    elif o == '-r':
+        repeats = int(a)
+    elif o == '-s':
+        seed = int(a)
+    elif o == '-i':
+        options["documents"] = a
+    elif o == '-q':
+        options["queries"] = a
+    elif o == '-l':
+        options["query_log"] = a
+    elif o == '-f':
+        options["format"] = a
+    elif o == '-k':
+        options["stride"] = int(a)
+    elif o == '-n':
+        options["samples"] = int(a)
+    elif o == '-o':
+        options["output"] = a
+    elif o == '-c':
+        options["baseline"] = a
+    else:
+        assert False, "unhandled option"
+
+if benchmark not in BENCHMARKS:
+    usage()
+    sys.exit(2)
+
+BENCHMARKS[benchmark](repeats, seed, options)
@@ -0,0 +1,295 @@
+from math import sqrt
+
+CONTAINER_BITS = 16  # Document ids are split in containers of 2^16 ids by their high bits
+LOW_MASK = (1 << CONTAINER_BITS) - 1
+BYTE_BITS = [tuple(i for i in range(8) if byte >> i & 1) for byte in range(256)]  # Set bits of every byte value
+
+
+def bitset_from_lows(lows):
+    """
+    :param lows: sorted low bits of document ids
+    :return: bitset as a python int
+    """
+    data = bytearray((lows[-1] >> 3) + 1)
+    for low in lows:
+        data[low >> 3] |= 1 << (low & 7)
+    return int.from_bytes(data, 'little')
+
+
+def bitset_to_bytes(bits):
+    return bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+
+
+def lows_from_bitset(bits):
+    """
+    :param bits: bitset as a python int
+    :return: sorted low bits of document ids in bitset
+    """
+    lows = []
+    for i, byte in enumerate(bitset_to_bytes(bits)):
+        if byte:
+            base = i << 3
+            lows.extend(base + bit for bit in BYTE_BITS[byte])
+    return lows
+
+
+def filter_lows(lows, bits, keep=True):
+    """
+    :param lows: sorted low bits of document ids
+    :param bits: bitset as a python int
+    :param keep: keep lows in bitset if True, lows not in bitset if False
+    :return: filtered lows
+    """
+    data = bitset_to_bytes(bits)
+    length = len(data)
+    return [low for low in lows if ((low >> 3) < length and data[low >> 3] >> (low & 7) & 1 == 1) == keep]
+
+
+def count_lows(lows, bits):
+    """
+    :param lows: sorted low bits of document ids
+    :param bits: bitset as a python int
+    :return: number of lows in bitset
+    """
+    data = bitset_to_bytes(bits)
+    length = len(data)
+    return sum(1 for low in lows if (low >> 3) < length and data[low >> 3] >> (low & 7) & 1 == 1)
+
+
+def make_container(lows):
+    """
+    Chooses the container for sorted low bits. Same rule as roaring, a bitset is used when it is
+    smaller than an array of 16 bit values. Bitsets are only as long as their highest bit
+    :param lows: sorted low bits of document ids
+    :return: list of lows for a sparse container, int bitset for a dense one, None if empty
+    """
+    if not lows:
+        return None
+    if (lows[-1] >> 3) + 1 < 2 * len(lows):
+        return bitset_from_lows(lows)
+    return lows
+
+
+def normalise_bitset(bits):
+    """
+    Converts the bitset result of a word level operation back to the best container
+    """
+    if not bits:
+        return None
+    cardinality = bin(bits).count("1")
+    if (bits.bit_length() + 7) // 8 < 2 * cardinality:
+        return bits
+    return lows_from_bitset(bits)
+
+
+class Bitmap(object):
+    """
+    Roaring style compressed bitmap of document ids
+    Each container of 2^16 ids is a sorted array of the low bits if sparse, or a bitset (python int) if dense.
+    Operations between two bitsets are word level bitwise operations on the ints
+    """
+    def __init__(self, containers=None):
+        self.containers = containers if containers is not None else {}  # Format : {highBits: container}
+
+    @staticmethod
+    def from_doc_ids(doc_ids):
+        """
+        :param doc_ids: sorted document ids
+        :return: Bitmap of the ids
+        """
+        containers = {}
+        high = None
+        lows = []
+        for doc_id in doc_ids:
+            if doc_id >> CONTAINER_BITS != high:
+                if lows:
+                    containers[high] = make_container(lows)
+                high = doc_id >> CONTAINER_BITS
+                lows = []
+            lows.append(doc_id & LOW_MASK)
+        if lows:
+            containers[high] = make_container(lows)
+
+        return Bitmap(containers)
+
+    @staticmethod
+    def from_posting_list(posting_list):
+        return Bitmap.from_doc_ids([posting[0] for posting in posting_list])
+
+    def to_doc_ids(self):
+        """
+        :return: sorted document ids in bitmap
+        """
+        doc_ids = []
+        for high in sorted(self.containers):
+            container = self.containers[high]
+            lows = lows_from_bitset(container) if isinstance(container, int) else container
+            base = high << CONTAINER_BITS
+            doc_ids.extend(base + low for low in lows)
+        return doc_ids
+
+    def to_posting_list(self):
+        """
+        :return: Posting list [(docId, skipIdx)] with √L evenly spaced skips
+        """
+        doc_ids = self.to_doc_ids()
+        length_of_skip = max(int(sqrt(len(doc_ids))), 1)
+        return [(doc_id, i + length_of_skip if i % length_of_skip == 0 else 0) for i, doc_id in enumerate(doc_ids)]
+
+    def __len__(self):
+        length = 0
+        for container in self.containers.values():
+            length += bin(container).count("1") if isinstance(container, int) else len(container)
+        return length
+
+    def size_in_bytes(self):
+        """
+        :return: approximate memory used by the containers
+        """
+        size = 0
+        for container in self.containers.values():
+            size += container.bit_length() // 8 if isinstance(container, int) else len(container) * 36
+        return size
+
+    def has_bitset(self):
+        """
+        :return: True if any container is a bitset
+        """
+        return any(isinstance(container, int) for container in self.containers.values())
+
+    def filter(self, posting_list, keep=True):
+        """
+        Filters a posting list by membership in the bitmap. Bitsets are converted to bytes once for O(1) lookups
+        :param posting_list: Posting list [(docId, skipIdx)]
+        :param keep: keep postings in bitmap if True (AND), postings not in bitmap if False (AND NOT)
+        :return: filtered posting list
+        """
+        result = []
+        lookups = {}
+        for posting in posting_list:
+            if self.contains(posting[0], lookups) == keep:
+                result.append(posting)
+
+        return result
+
+    def count_in(self, posting_list, limit=None):
+        """
+        Counts the postings of a posting list in the bitmap without building the filtered list
+        :param posting_list: Posting list [(docId, skipIdx)]
+        :param limit: stop counting once this many are found, None to count all
+        :return: number of postings in bitmap, at most limit
+        """
+        count = 0
+        lookups = {}
+        for posting in posting_list:
+            if self.contains(posting[0], lookups):
+                count += 1
+                if count == limit:
+                    break
+
+        return count
+
+    def contains(self, doc_id, lookups):
+        """
+        :param doc_id: document id
+        :param lookups: {highBits: bytes of bitset or frozenset of lows} built so far, shared between calls
+        :return: True if doc_id is in the bitmap
+        """
+        high = doc_id >> CONTAINER_BITS
+        low = doc_id & LOW_MASK
+        lookup = lookups.get(high)
+        if lookup is None:
+            container = self.containers.get(high)
+            if container is None:
+                lookup = frozenset()
+            elif isinstance(container, int):
+                lookup = bitset_to_bytes(container)
+            else:
+                lookup = frozenset(container)
+            lookups[high] = lookup
+
+        if isinstance(lookup, bytes):
+            return (low >> 3) < len(lookup) and lookup[low >> 3] >> (low & 7) & 1 == 1
+        return low in lookup
+
+    def and_(self, other):
+        """
+        :return: Bitmap of self AND other
+        """
+        containers = {}
+        for high, first in self.containers.items():
+            second = other.containers.get(high)
+            if second is None:
+                continue
+            if isinstance(first, int) and isinstance(second, int):
+                container = normalise_bitset(first & second)
+            elif isinstance(first, int):
+                container = make_container(filter_lows(second, first))
+            elif isinstance(second, int):
+                container = make_container(filter_lows(first, second))
+            else:
+                container = make_container(sorted(set(first).intersection(second)))
+            if container is not None:
+                containers[high] = container
+
+        return Bitmap(containers)
+
+    def and_cardinality(self, other):
+        """
+        :return: number of documents in self AND other, counted without building the result containers
+        """
+        count = 0
+        for high, first in self.containers.items():
+            second = other.containers.get(high)
+            if second is None:
+                continue
+            if isinstance(first, int) and isinstance(second, int):
+                count += bin(first & second).count("1")
+            elif isinstance(first, int):
+                count += count_lows(second, first)
+            elif isinstance(second, int):
+                count += count_lows(first, second)
+            else:
+                count += len(set(first).intersection(second))
+
+        return count
+
+    def or_(self, other):
+        """
+        :return: Bitmap of self OR other
+        """
+        containers = dict(self.containers)
+        for high, second in other.containers.items():
+            first = containers.get(high)
+            if first is None:
+                container = second
+            elif isinstance(first, int) or isinstance(second, int):
+                first_bits = first if isinstance(first, int) else bitset_from_lows(first)
+                second_bits = second if isinstance(second, int) else bitset_from_lows(second)
+                container = normalise_bitset(first_bits | second_bits)
+            else:
+                container = make_container(sorted(set(first).union(second)))
+            containers[high] = container
+
+        return Bitmap(containers)
+
+    def and_not(self, other):
+        """
+        :return: Bitmap of self AND NOT other
+        """
+        containers = {}
+        for high, first in self.containers.items():
+            second = other.containers.get(high)
+            if second is None:
+                container = first
+            elif isinstance(first, int):
+                second_bits = second if isinstance(second, int) else bitset_from_lows(second)
+                container = normalise_bitset(first & ~second_bits)
+            elif isinstance(second, int):
+                container = make_container(filter_lows(first, second, False))
+            else:
+                container = make_container(sorted(set(first).difference(second)))
+            if container is not None:
+                containers[high] = container
+
+        return Bitmap(containers)
@@ -0,0 +1,314 @@
+import pickle
+from bisect import bisect_right
+from math import sqrt
+
+from bitmap import Bitmap, bitset_to_bytes
+
+MAGIC = b"BPV\x01"  # Header of a postings file in the compressed format. Pickle files start with b"\x80"
+
+
+def vbyte_encode_number(number, out):
+    """
+    Appends the variable byte encoding of a number to out
+    7 bits per byte with the high bit set on the last byte of the number
+    :param number: non negative int
+    :param out: bytearray to append to
+    """
+    encoded = [number & 127]
+    number >>= 7
+    while number:
+        encoded.append(number & 127)
+        number >>= 7
+    encoded[0] |= 128
+    out.extend(reversed(encoded))
+
+
+def vbyte_decode(data, start, count):
+    """
+    Decodes count variable byte encoded numbers
+    :param data: bytes like object
+    :param start: index of first byte to decode
+    :param count: number of numbers to decode
+    :return: (list of numbers, index of the byte after the last number)
+    """
+    numbers = []
+    number = 0
+    pos = start
+    while len(numbers) < count:
+        byte = data[pos]
+        pos += 1
+        if byte < 128:
+            number = (number << 7) | byte
+        else:
+            numbers.append((number << 7) | (byte - 128))
+            number = 0
+
+    return numbers, pos
+
+
+def vbyte_decode_all(data):
+    """
+    Decodes all variable byte encoded numbers in data
+    :param data: bytes
+    :return: list of numbers
+    """
+    numbers = []
+    number = 0
+    for byte in data:
+        if byte < 128:
+            number = (number << 7) | byte
+        else:
+            numbers.append((number << 7) | (byte - 128))
+            number = 0
+
+    return numbers
+
+
+def encode_posting_list(doc_ids, length_of_skip):
+    """
+    Encodes a sorted list of document ids as d-gaps in variable byte
+    Layout: count, length_of_skip, data length, skip table, data
+    The skip table has an entry for the first posting of every block after the first one with
+    the docId and the byte offset of the posting in data, both stored as gaps from the previous entry
+    :param doc_ids: sorted document ids. E.g. [1, 10, 14]
+    :param length_of_skip: number of postings in a block
+    :return: encoded bytes
+    """
+    data = bytearray()
+    skips = bytearray()
+    prev_doc_id = prev_skip_doc_id = prev_skip_offset = 0
+    for i, doc_id in enumerate(doc_ids):
+        if i and i % length_of_skip == 0:
+            vbyte_encode_number(doc_id - prev_skip_doc_id, skips)
+            vbyte_encode_number(len(data) - prev_skip_offset, skips)
+            prev_skip_doc_id = doc_id
+            prev_skip_offset = len(data)
+        vbyte_encode_number(doc_id - prev_doc_id, data)
+        prev_doc_id = doc_id
+
+    encoded = bytearray()
+    vbyte_encode_number(len(doc_ids), encoded)
+    vbyte_encode_number(length_of_skip, encoded)
+    vbyte_encode_number(len(data), encoded)
+    return bytes(encoded + skips + data)
+
+
+def encode_bitmap_list(bitmap):
+    """
+    Encodes a dense posting list as a roaring style bitmap
+    Layout: count, 0 (marks a bitmap list), data length, data
+    Data has the number of containers, then for each the high bits, kind (0 array, 1 bitset), payload length and payload.
+    Array payloads are variable byte d-gaps of the low bits, bitset payloads are the little endian bytes of the bitset
+    :param bitmap: Bitmap of the list
+    :return: encoded bytes
+    """
+    data = bytearray()
+    vbyte_encode_number(len(bitmap.containers), data)
+    for high in sorted(bitmap.containers):
+        container = bitmap.containers[high]
+        payload = bytearray()
+        if isinstance(container, int):
+            payload.extend(bitset_to_bytes(container))
+        else:
+            prev_low = 0
+            for low in container:
+                vbyte_encode_number(low - prev_low, payload)
+                prev_low = low
+
+        vbyte_encode_number(high, data)
+        vbyte_encode_number(1 if isinstance(container, int) else 0, data)
+        vbyte_encode_number(len(payload), data)
+        data.extend(payload)
+
+    encoded = bytearray()
+    vbyte_encode_number(len(bitmap), encoded)
+    vbyte_encode_number(0, encoded)
+    vbyte_encode_number(len(data), encoded)
+    return bytes(encoded + data)
+
+
+def is_bitmap_list(data, offset):
+    """
+    :param data: bytes like object (memory map) of the postings file
+    :param offset: offset of the encoded list in data
+    :return: True if the list is encoded as a bitmap
+    """
+    (_, length_of_skip), _ = vbyte_decode(data, offset, 2)
+    return length_of_skip == 0
+
+
+class EncodedPostingList(object):
+    """
+    A compressed posting list read in place from the postings file
+    Only the header and skip table are decoded on creation, blocks of postings are decoded on demand
+    Bitmap lists have no skip table and are a single block
+    """
+    def __init__(self, data, offset):
+        """
+        :param data: bytes like object (memory map) of the postings file
+        :param offset: offset of the encoded list in data
+        """
+        self.data = data
+        (self.length, self.length_of_skip, data_length), pos = vbyte_decode(data, offset, 3)
+        self.is_bitmap = self.length_of_skip == 0
+        if self.is_bitmap:
+            self.length_of_skip = max(int(sqrt(self.length)), 1)
+
+        num_skips = (self.length - 1) // self.length_of_skip if self.length and not self.is_bitmap else 0
+        skip_gaps, pos = vbyte_decode(data, pos, 2 * num_skips)
+        self.skip_doc_ids = []  # docId of first posting of blocks 1, 2...
+        self.skip_offsets = []  # Byte offset in data of first posting of blocks 1, 2...
+        doc_id = byte_offset = 0
+        for i in range(0, len(skip_gaps), 2):
+            doc_id += skip_gaps[i]
+            byte_offset += skip_gaps[i + 1]
+            self.skip_doc_ids.append(doc_id)
+            self.skip_offsets.append(pos + byte_offset)
+
+        self.data_start = pos
+        self.data_end = pos + data_length
+
+    def __len__(self):
+        return self.length
+
+    def decode(self):
+        """
+        Decodes the whole list into the tuple format used by the merge algorithms
+        :return: Posting list [(docId, skipIdx)]. SkipIdx is 0 if not possible to skip
+        """
+        if self.is_bitmap:
+            return self.bitmap().to_posting_list()
+
+        gaps, _ = vbyte_decode(self.data[self.data_start:self.data_end], 0, self.length)
+        posting_list = []
+        length_of_skip = self.length_of_skip
+        doc_id = 0
+        for i, gap in enumerate(gaps):
+            doc_id += gap
+            posting_list.append((doc_id, i + length_of_skip if i % length_of_skip == 0 else 0))
+
+        return posting_list
+
+    def get_block(self, block):
+        """
+        Decodes the document ids of one block
+        :param block: index of the block
+        :return: list of document ids in block
+        """
+        if self.is_bitmap:
+            return self.bitmap().to_doc_ids()
+
+        count = min(self.length_of_skip, self.length - block * self.length_of_skip)
+        if block == 0:
+            gaps, _ = vbyte_decode(self.data, self.data_start, count)
+            doc_id = 0
+        else:
+            # The gap of the first posting is from the previous block, its docId is in the skip table
+            gaps, _ = vbyte_decode(self.data, self.skip_offsets[block - 1], count)
+            doc_id = self.skip_doc_ids[block - 1]
+            gaps[0] = 0
+
+        doc_ids = []
+        for gap in gaps:
+            doc_id += gap
+            doc_ids.append(doc_id)
+
+        return doc_ids
+
+    def bitmap(self):
+        """
+        Decodes a list stored as a bitmap
+        :return: Bitmap of the list
+        """
+        (num_containers,), pos = vbyte_decode(self.data, self.data_start, 1)
+        containers = {}
+        for _ in range(num_containers):
+            (high, kind, payload_length), pos = vbyte_decode(self.data, pos, 3)
+            if kind == 1:
+                containers[high] = int.from_bytes(self.data[pos:pos + payload_length], 'little')
+            else:
+                gaps = vbyte_decode_all(self.data[pos:pos + payload_length])
+                lows = []
+                low = 0
+                for gap in gaps:
+                    low += gap
+                    lows.append(low)
+                containers[high] = lows
+            pos += payload_length
+
+        return Bitmap(containers)
+
+    def cursor(self):
+        return PostingCursor(self)
+
+
+class PostingCursor(object):
+    """
+    Forward cursor over an EncodedPostingList which uses the skip table to jump
+    over blocks without decoding them
+    """
+    def __init__(self, encoded_list):
+        self.encoded_list = encoded_list
+        self.num_blocks = len(encoded_list.skip_doc_ids) + 1
+        self.block = 0
+        self.block_doc_ids = encoded_list.get_block(0) if len(encoded_list) else []
+        self.idx = 0
+
+    def skip_to(self, doc_id):
+        """
+        Moves to the first posting with docId >= doc_id
+        :param doc_id: target document id
+        :return: docId of the posting or None if the list is exhausted
+        """
+        skip_doc_ids = self.encoded_list.skip_doc_ids
+        if self.block + 1 < self.num_blocks and skip_doc_ids[self.block] <= doc_id:
+            # Target is past the current block, jump to the last block starting at or before it
+            self.block = bisect_right(skip_doc_ids, doc_id, self.block)
+            self.block_doc_ids = self.encoded_list.get_block(self.block)
+            self.idx = 0
+
+        block_doc_ids = self.block_doc_ids
+        idx = self.idx
+        while idx < len(block_doc_ids) and block_doc_ids[idx] < doc_id:
+            idx += 1
+        self.idx = idx
+
+        if idx < len(block_doc_ids):
+            return block_doc_ids[idx]
+        if self.block + 1 < self.num_blocks:
+            # Remaining postings of block were smaller, answer is the first posting of next block
+            self.block += 1
+            self.block_doc_ids = self.encoded_list.get_block(self.block)
+            self.idx = 0
+            return self.block_doc_ids[0]
+
+        return None
+
+
+class PickleCodec(object):
+    """
+    Original format. Each posting list is a pickled list of (docId, skipIdx) tuples
+    """
+    name = "pickle"
+    header = b""
+
+    def encode(self, doc_ids, skip_pointer, term=None):
+        return pickle.dumps(skip_pointer.get_skip_posting_list(doc_ids, term))
+
+
+class VByteCodec(object):
+    """
+    Compressed format. Each posting list is d-gap + variable byte encoded with a byte offset skip table,
+    or a roaring style bitmap if any part of it is dense
+    """
+    name = "vbyte"
+    header = MAGIC
+
+    def encode(self, doc_ids, skip_pointer, term=None):
+        bitmap = Bitmap.from_doc_ids(doc_ids)
+        if bitmap.has_bitset():
+            return encode_bitmap_list(bitmap)
+        return encode_posting_list(doc_ids, skip_pointer.get_length_of_skip(doc_ids, term))
+
+
+CODECS = {codec.name: codec for codec in (PickleCodec(), VByteCodec())}
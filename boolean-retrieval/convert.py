@@ -0,0 +1,121 @@
+#!/usr/bin/python3
+import sys
+import getopt
+
+from dictionary import Dictionary
+from postingsfile import PostingsFile
+from skippointer import SkipPointer, SKIP_RULES, DEFAULT_STRIDE
+from codec import CODECS
+from permuterm import write_permuterm_index, get_permuterm_file
+from planner import ALL_DOCS
+from sketch import make_sketch
+import shards
+
+
+def usage():
+    print("usage: " + sys.argv[0] + " -d dictionary-file -p postings-file -D output-dictionary-file -P output-postings-file [-f vbyte|pickle] [-s sqrt|fixed|adaptive] [-k stride] [-l query-log]")
+
+def convert_postings(dictionary, postings_file, out_dictionary, out_postings, codec, skipPointer):
+    """
+    Rewrites the posting lists of a dictionary and saves the output dictionary
+    :param dictionary: loaded Dictionary of the input index
+    :param postings_file: postings file of the input index
+    :param out_dictionary: empty Dictionary to which the terms are added
+    :param out_postings: postings file to write
+    :param codec: codec of the output postings file
+    :param skipPointer: SkipPointer used to add skip pointers to the output lists
+    """
+    skipPointer.set_doc_freqs({term: dictionary.get_df(term) for term in dictionary.get_terms()})
+
+    # No cache since every list is read exactly once
+    with PostingsFile(postings_file, 0) as postings, open(out_postings, 'wb') as postings_disk:
+        postings_disk.write(codec.header)
+        for term in dictionary.get_terms():
+            doc_ids = [posting[0] for posting in postings.get_posting_list(dictionary.get_offset_of_term(term))]
+
+            offset = postings_disk.tell()
+            out_dictionary.add_term(term, len(doc_ids), offset, make_sketch(doc_ids))
+            postings_disk.write(codec.encode(doc_ids, skipPointer, term))
+
+    out_dictionary.set_doc_ids(dictionary.get_doc_ids())
+    out_dictionary.save()
+
+
+def convert_index(dict_file, postings_file, out_dict, out_postings, postings_format, skip_rule="sqrt",
+                  stride=DEFAULT_STRIDE, query_log=None):
+    """
+    Rewrites an index in the given postings format and skip rule. The input can be in any readable format
+    A sharded index is converted shard by shard into an output index with the same shards
+    """
+    print('converting...')
+
+    dictionary = Dictionary(dict_file)
+    dictionary.load()
+    codec = CODECS[postings_format]
+    skipPointer = SkipPointer(SKIP_RULES[skip_rule], stride, query_log)
+
+    shard_ranges = dictionary.get_shards()
+    if shard_ranges is None:
+        out_dictionary = Dictionary(out_dict)
+        convert_postings(dictionary, postings_file, out_dictionary, out_postings, codec, skipPointer)
+    else:
+        # The dictionary of the whole index has no postings, see shards.merge_dictionaries
+        merged_terms = {}
+        for shard in range(len(shard_ranges)):
+            shard_dictionary = Dictionary(shards.get_shard_file(dict_file, shard))
+            shard_dictionary.load()
+            out_shard_dictionary = Dictionary(shards.get_shard_file(out_dict, shard))
+            convert_postings(shard_dictionary, shards.get_shard_file(postings_file, shard), out_shard_dictionary,
+                             shards.get_shard_file(out_postings, shard), codec, skipPointer)
+            shard_dictionary.close()
+            shards.fold_shard(merged_terms, out_shard_dictionary)
+
+        out_dictionary = Dictionary(out_dict)
+        shards.merge_dictionaries(out_dictionary, merged_terms)
+        out_dictionary.set_shards(shard_ranges)
+        out_dictionary.set_doc_ids(dictionary.get_doc_ids())
+        out_dictionary.save()
+
+    dictionary.close()
+    write_permuterm_index(get_permuterm_file(out_dict), out_dictionary, (ALL_DOCS,))
+
+
+dictionary_file = postings_file = output_file_dictionary = output_file_postings = None
+postings_format = "vbyte"
+skip_rule = "sqrt"
+stride = DEFAULT_STRIDE
+query_log = None
+
+try:
+    opts, args = getopt.getopt(sys.argv[1:], 'd:p:D:P:f:s:k:l:')
+except getopt.GetoptError:
+    usage()
+    sys.exit(2)
+
+for o, a in opts:
+    if o == '-d':
+        dictionary_file = a
+    elif o == '-p':
+        postings_file = a
+    elif o == '-D':
+        output_file_dictionary = a
+    elif o == '-P':
+        output_file_postings = a
+    elif o == '-f':
+        postings_format = a
+    elif o == '-s':
+        skip_rule = a
+    elif o == '-k':
+        stride = int(a)
+    elif o == '-l':
+        query_log = a
+    else:
+        assert False, "unhandled option"
+
+if dictionary_file == None or postings_file == None or output_file_dictionary == None or output_file_postings == None or postings_format not in CODECS \
+        or skip_rule not in SKIP_RULES or (skip_rule == "adaptive" and query_log == None):
+    usage()
+    sys.exit(2)
+
+convert_index(dictionary_file, postings_file, output_file_dictionary, output_file_postings, postings_format,
+              skip_rule, stride, query_log)
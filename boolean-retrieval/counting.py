@@ -0,0 +1,154 @@
+import intersect
+import terms_eval
+from planner import ALL_DOCS, QueryNode, execute_plan
+from terms_eval import Complement
+
+
+def get_num_docs(dictionary):
+    return max(dictionary.get_df(ALL_DOCS), 0)
+
+
+def cardinality(dictionary, operand):
+    """
+    Number of documents of a term or result. Terms are counted with their stored docFreq without reading their list
+    :param dictionary: in memory dictionary
+    :param operand: term, Complement, Bitmap or result list
+    :return: number of documents in operand
+    """
+    if isinstance(operand, Complement):
+        return get_num_docs(dictionary) - cardinality(dictionary, operand.negated)
+    if isinstance(operand, str):
+        return max(dictionary.get_df(operand), 0)
+    return len(operand)
+
+
+def count_AND(postings, dictionary, first, second, limit=None):
+    """
+    Counts first AND second without building the result list
+    :param postings: PostingsFile object of postings.txt
+    :param dictionary: in memory dictionary
+    :param first: term or result of which AND needs to be counted
+    :param second: term or result of which AND needs to be counted
+    :param limit: stop counting once this many are found, None to count all
+    :return: number of documents in first AND second, at most limit if given
+    """
+    # |A AND NOT b| = |A| - |A AND b| and |NOT a AND NOT b| = N - |a| - |b| + |a AND b|
+    if isinstance(first, Complement) and isinstance(second, Complement):
+        return (get_num_docs(dictionary) - cardinality(dictionary, first.negated) - cardinality(dictionary, second.negated)
+                + count_AND(postings, dictionary, first.negated, second.negated))
+    elif isinstance(first, Complement):
+        return cardinality(dictionary, second) - count_AND(postings, dictionary, second, first.negated)
+    elif isinstance(second, Complement):
+        return cardinality(dictionary, first) - count_AND(postings, dictionary, first, second.negated)
+
+    if cardinality(dictionary, first) == 0 or cardinality(dictionary, second) == 0:
+        return 0
+
+    # Word level AND of two bitmaps, a list is looked up in the bitmap
+    first_bitmap = terms_eval.get_bitmap(postings, dictionary, first)
+    second_bitmap = terms_eval.get_bitmap(postings, dictionary, second)
+    if first_bitmap is not None and second_bitmap is not None:
+        return first_bitmap.and_cardinality(second_bitmap)
+    elif first_bitmap is not None:
+        return first_bitmap.count_in(terms_eval.get_list(postings, dictionary, second), limit)
+    elif second_bitmap is not None:
+        return second_bitmap.count_in(terms_eval.get_list(postings, dictionary, first), limit)
+
+    # Walk the shorter list and skip through a longer compressed term without decoding the skipped blocks
+    if cardinality(dictionary, first) > cardinality(dictionary, second):
+        first, second = second, first
+    if isinstance(second, str) and postings.compressed:
+        encoded_list = postings.get_encoded_posting_list(dictionary.get_offset_of_term(second))
+        return count_List_And_Encoded(terms_eval.get_list(postings, dictionary, first), encoded_list, limit)
+
+    return intersect.count_intersection(terms_eval.get_list(postings, dictionary, first),
+                                        terms_eval.get_list(postings, dictionary, second), limit)
+
+
+def count_List_And_Encoded(res_list, encoded_list, limit=None):
+    """
+    Counts res_list AND encoded_list [blocks of encoded_list with no match are skipped without decoding]
+    :param res_list: list of which AND needs to be counted
+    :param encoded_list: EncodedPostingList of a term
+    :param limit: stop counting once this many are found, None to count all
+    :return: number of common docIds, at most limit if given
+    """
+    count = 0
+    cursor = encoded_list.cursor()
+
+    for posting in res_list:
+        doc_id = cursor.skip_to(posting[0])
+        if doc_id is None:
+            break
+        if doc_id == posting[0]:
+            count += 1
+            if count == limit:
+                break
+
+    return count
+
+
+def has_empty_operand(node):
+    """
+    :return: True if an AND or AND NOT is empty because a term it needs is in no document
+    """
+    if node.op == 'AND':
+        return any(child.op == 'TERM' and child.estimate == 0 for child in node.children)
+    return node.op == 'AND_NOT' and node.children[0].op == 'TERM' and node.children[0].estimate == 0
+
+
+def count_plan(node, dictionary, postings, cache=None, limit=None):
+    """
+    Counts the documents matching a plan without building its final result list
+    Terms and NOT of terms are counted from docFreq. For AND, OR and AND NOT, all operands but the last
+    are evaluated as usual and the last operator is replaced by a counting merge:
+    |A AND b|, |A OR b| = |A| + |b| - |A AND b| and |A AND NOT b| = |A| - |A AND b|
+    :param node: QueryNode
+    :param dictionary: in memory dictionary
+    :param postings: PostingsFile object of postings.txt
+    :param cache: QueryCache of sub-expressions shared by a batch of queries, or None
+    :param limit: an AND may stop counting once this many are found, None to count all
+    :return: number of documents in the result of node, at most limit for an AND
+    """
+    if node.op == 'TERM':
+        return cardinality(dictionary, node.term)
+    if node.op == 'NOT':
+        return get_num_docs(dictionary) - count_plan(node.children[0], dictionary, postings, cache)
+    if has_empty_operand(node):
+        return 0
+
+    rest = node.children[:-1]
+    if len(rest) == 1:
+        result = execute_plan(rest[0], dictionary, postings, cache)
+    else:
+        result = execute_plan(QueryNode(node.op, rest), dictionary, postings, cache)
+    if node.op != 'OR' and isinstance(result, list) and len(result) == 0:
+        return 0
+
+    operand = execute_plan(node.children[-1], dictionary, postings, cache)
+    if node.op == 'AND':
+        return count_AND(postings, dictionary, result, operand, limit)
+
+    common = count_AND(postings, dictionary, result, operand)
+    if node.op == 'OR':
+        return cardinality(dictionary, result) + cardinality(dictionary, operand) - common
+    return cardinality(dictionary, result) - common
+
+
+def exists_plan(node, dictionary, postings, cache=None):
+    """
+    Checks if any document matches a plan, stopping at the first match found
+    OR checks its operands one at a time, the ones counted from docFreq first
+    :param node: QueryNode
+    :param dictionary: in memory dictionary
+    :param postings: PostingsFile object of postings.txt
+    :param cache: QueryCache of sub-expressions shared by a batch of queries, or None
+    :return: True if the result of node is not empty
+    """
+    if node.op == 'TERM':
+        return cardinality(dictionary, node.term) > 0
+    if node.op == 'OR':
+        children = sorted(node.children, key=lambda child: child.op != 'TERM')
+        return any(exists_plan(child, dictionary, postings, cache) for child in children)
+
+    return count_plan(node, dictionary, postings, cache, 1) > 0
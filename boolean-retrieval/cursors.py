@@ -0,0 +1,242 @@
+from bisect import bisect_left
+from heapq import heapify, heappop, heapreplace
+
+from bitmap import CONTAINER_BITS, LOW_MASK, lows_from_bitset
+from planner import ALL_DOCS
+
+
+class Cursor(object):
+    """
+    Forward only cursor over the sorted docIds of a posting list or of an operator result
+    doc_id is -1 before the first posting and None once the cursor is exhausted
+    """
+    def __init__(self):
+        self.doc_id = -1
+
+    def next(self):
+        """
+        Moves to the next posting
+        :return: docId of the posting or None if the cursor is exhausted
+        """
+        if self.doc_id is None:
+            return None
+        return self.skip_to(self.doc_id + 1)
+
+    def skip_to(self, doc_id):
+        """
+        Moves to the first posting with docId >= doc_id. Does not move if the cursor is already there
+        :param doc_id: target document id
+        :return: docId of the posting or None if the cursor is exhausted
+        """
+        if self.doc_id is None or self.doc_id >= doc_id:
+            return self.doc_id
+        self.doc_id = self.advance(doc_id)
+        return self.doc_id
+
+    def advance(self, doc_id):
+        """
+        :param doc_id: target document id, greater than the current docId
+        :return: first docId >= doc_id or None
+        """
+        raise NotImplementedError
+
+
+class ListCursor(Cursor):
+    """
+    Cursor over a decoded posting list [(docId, skipIdx)], skips by galloping search
+    """
+    def __init__(self, posting_list):
+        Cursor.__init__(self)
+        self.posting_list = posting_list
+        self.idx = -1
+
+    def next(self):
+        if self.doc_id is None:
+            return None
+        self.idx += 1
+        self.doc_id = self.posting_list[self.idx][0] if self.idx < len(self.posting_list) else None
+        return self.doc_id
+
+    def advance(self, doc_id):
+        posting_list = self.posting_list
+        length = len(posting_list)
+        idx = max(self.idx, 0)
+        bound = 1
+        while idx + bound < length and posting_list[idx + bound][0] < doc_id:
+            bound *= 2
+        self.idx = bisect_left(posting_list, (doc_id,), idx, min(idx + bound + 1, length))
+        return posting_list[self.idx][0] if self.idx < length else None
+
+
+class EncodedCursor(Cursor):
+    """
+    Cursor over a compressed posting list, blocks are decoded when the cursor enters them
+    """
+    def __init__(self, encoded_list):
+        Cursor.__init__(self)
+        self.cursor = encoded_list.cursor() if len(encoded_list) else None
+
+    def advance(self, doc_id):
+        if self.cursor is None:
+            return None
+        return self.cursor.skip_to(doc_id)
+
+
+class BitmapCursor(Cursor):
+    """
+    Cursor over a Bitmap, the low bits of one container at a time
+    """
+    def __init__(self, bitmap):
+        Cursor.__init__(self)
+        self.containers = bitmap.containers
+        self.highs = sorted(bitmap.containers)
+        self.container = -1  # Index in highs of the container of lows
+        self.lows = []
+        self.idx = 0
+
+    def load(self, container):
+        self.container = container
+        if container < len(self.highs):
+            lows = self.containers[self.highs[container]]
+            self.lows = lows_from_bitset(lows) if isinstance(lows, int) else lows
+        self.idx = 0
+
+    def next(self):
+        if self.doc_id is not None and self.container >= 0 and self.idx + 1 < len(self.lows):
+            self.idx += 1
+            self.doc_id = (self.highs[self.container] << CONTAINER_BITS) + self.lows[self.idx]
+            return self.doc_id
+        return Cursor.next(self)
+
+    def advance(self, doc_id):
+        high = doc_id >> CONTAINER_BITS
+        if self.container < 0 or self.highs[self.container] < high:
+            self.load(bisect_left(self.highs, high, max(self.container, 0)))
+
+        while self.container < len(self.highs):
+            low = doc_id & LOW_MASK if self.highs[self.container] == high else 0
+            self.idx = bisect_left(self.lows, low, self.idx)
+            if self.idx < len(self.lows):
+                return (self.highs[self.container] << CONTAINER_BITS) + self.lows[self.idx]
+            self.load(self.container + 1)
+
+        return None
+
+
+class AndCursor(Cursor):
+    """
+    Intersection of cursors. The rarest child proposes a docId and the others skip to it,
+    a child which lands past it proposes the next target
+    """
+    def __init__(self, children):
+        Cursor.__init__(self)
+        self.children = children  # Ordered by estimated size, rarest first
+
+    def advance(self, doc_id):
+        children = self.children
+        target = doc_id
+        while True:
+            target = children[0].skip_to(target)
+            if target is None:
+                return None
+            for child in children[1:]:
+                found = child.skip_to(target)
+                if found is None:
+                    return None
+                if found > target:
+                    target = found
+                    break
+            else:
+                return target
+
+
+class OrCursor(Cursor):
+    """
+    Union of cursors, the smallest docId of the children
+    The children are kept in a min heap by their docId, so only the ones behind the target are moved
+    """
+    def __init__(self, children):
+        Cursor.__init__(self)
+        self.children = children
+        self.heap = None  # Format : [(docId, index of child)] of the children not exhausted
+
+    def advance(self, doc_id):
+        children = self.children
+        heap = self.heap
+        if heap is None:
+            heap = [(child.skip_to(doc_id), i) for i, child in enumerate(children)]
+            heap = [entry for entry in heap if entry[0] is not None]
+            heapify(heap)
+            self.heap = heap
+
+        while heap and heap[0][0] < doc_id:
+            found = children[heap[0][1]].skip_to(doc_id)
+            if found is None:
+                heappop(heap)
+            else:
+                heapreplace(heap, (found, heap[0][1]))
+
+        return heap[0][0] if heap else None
+
+
+class AndNotCursor(Cursor):
+    """
+    docIds of base which are in none of the negated cursors
+    """
+    def __init__(self, base, negated):
+        Cursor.__init__(self)
+        self.base = base
+        self.negated = negated
+
+    def advance(self, doc_id):
+        found = self.base.skip_to(doc_id)
+        while found is not None and any(child.skip_to(found) == found for child in self.negated):
+            found = self.base.skip_to(found + 1)
+        return found
+
+
+def term_cursor(term, dictionary, postings):
+    """
+    :return: cursor over the stored posting list of a term, empty if the term is not in the dictionary
+    """
+    offset = dictionary.get_offset_of_term(term)
+    if offset == -1:
+        return ListCursor([])
+
+    bitmap = postings.get_bitmap(offset)
+    if bitmap is not None:
+        return BitmapCursor(bitmap)
+    if postings.compressed:
+        return EncodedCursor(postings.get_encoded_posting_list(offset))
+    return ListCursor(postings.get_posting_list(offset))
+
+
+def build_cursor(node, dictionary, postings):
+    """
+    Builds the pull based evaluation tree of a plan. Nothing is evaluated until the cursor is moved
+    :param node: QueryNode
+    :param dictionary: in memory dictionary
+    :param postings: PostingsFile object of postings.txt
+    :return: Cursor over the result of node
+    """
+    if node.op == 'TERM':
+        return term_cursor(node.term, dictionary, postings)
+
+    children = [build_cursor(child, dictionary, postings) for child in node.children]
+    if node.op == 'NOT':
+        return AndNotCursor(term_cursor(ALL_DOCS, dictionary, postings), children)
+    elif node.op == 'AND':
+        return AndCursor(children)
+    elif node.op == 'OR':
+        return OrCursor(children)
+    return AndNotCursor(children[0], children[1:])
+
+
+def iter_doc_ids(cursor):
+    """
+    :return: generator of the docIds of a cursor in sorted order
+    """
+    doc_id = cursor.next()
+    while doc_id is not None:
+        yield doc_id
+        doc_id = cursor.next()
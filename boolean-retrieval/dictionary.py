@@ -1,13 +1,21 @@
 import pickle
 
+from lexicon import Lexicon, write_lexicon, is_lexicon
+from sketch import Sketch, SketchWriter, get_sketch_file, load_sketch_file
+
 class Dictionary(object):
     """
     Getter and Setter functions related to the dictionary
-    Also used to store on disk and access it using pickle
+    Stored on disk as a lexicon file which is memory mapped when loaded, older dictionaries are read with pickle
+    The sketches of the terms are stored next to it, a term has the index of its first hash as third value
     """
     def __init__(self, disk_file):
-        self.terms = {}  # Format : {term: (documentFrequency, offsetOfPostingList) E.g. {"hello": (4, 63)}
+        self.terms = {}  # Format : {term: (documentFrequency, offsetOfPostingList[, sketchStart])} E.g. {"hello": (4, 63, 0)}
         self.disk_file = disk_file  # File name where dictionary is stored in disk
+        self.sketch_writer = None  # SketchWriter streaming the sketches of the added terms to disk, opened by the first one
+        self.sketches = None  # SketchFile of a loaded dictionary with sketches
+        self.shards = None  # Format : [(firstDocId, lastDocId)] of the shards if the index is split in docId ranges
+        self.doc_ids = None  # Format : [originalDocId] at index docId - 1 if documents were given new docIds
 
     def get_terms(self):
         """
@@ -16,14 +24,32 @@ class Dictionary(object):
         """
         return self.terms
 
-    def add_term(self, term, docFreq, offset):
+    def get_df(self, term):
+        """
+        Gets the Document frequency for a term.
+        Returns -1 if term not present
+        :param term: normalised term
+        :return: int representing documentFrequency for the term
+        """
+        if term in self.terms:
+            return self.terms[term][0]
+        else:
+            return -1
+
+    def add_term(self, term, docFreq, offset, sketch=None):
         """
         Add a term to in memory dictionary
         :param term: normalised term
         :param docFreq: document Frequency of term
         :param offset: offset in postings file for posting list of word
+        :param sketch: smallest hashes of the docIds of the term, see sketch.py
         """
-        self.terms[term] = [docFreq, offset]
+        if sketch is None:
+            self.terms[term] = [docFreq, offset]
+        else:
+            if self.sketch_writer is None:
+                self.sketch_writer = SketchWriter(get_sketch_file(self.disk_file))
+            self.terms[term] = [docFreq, offset, self.sketch_writer.add(sketch)]
 
     def get_offset_of_term(self, term):
         """
@@ -36,6 +62,43 @@ class Dictionary(object):
         else:
             return -1
 
+    def has_sketches(self):
+        return self.sketches is not None
+
+    def get_sketch(self, term):
+        """
+        :param term: normalised term
+        :return: Sketch of the docIds of the term, empty if term not present
+        """
+        values = self.terms.get(term)
+        if values is None:
+            return Sketch([])
+        return self.sketches.get_sketch(values[2], values[0])
+
+    def get_shards(self):
+        """
+        :return: docId ranges of the shards of a sharded index, None if the index is not sharded
+        """
+        return self.shards
+
+    def set_shards(self, shards):
+        """
+        :param shards: [(firstDocId, lastDocId)] of every shard, their files are named by shards.get_shard_file
+        """
+        self.shards = shards
+
+    def get_doc_ids(self):
+        """
+        :return: original document ids by docId - 1 if the documents were reordered, None otherwise
+        """
+        return self.doc_ids
+
+    def set_doc_ids(self, doc_ids):
+        """
+        :param doc_ids: original document ids in the order of their docIds, starting from docId 1
+        """
+        self.doc_ids = doc_ids
+
     def update_offset(self, term, offset):
         """
         Updates offset of where data stored in posting list
@@ -46,14 +109,45 @@ class Dictionary(object):
 
     def save(self):
         """
-        Saves dictionary dict() using pickle dump
+        Saves dictionary as a lexicon file of sorted front coded terms with their docFreq and offset,
+        and the start of their sketch if the terms were added with sketches. Shards and original docIds are stored as meta
         """
-        with open(self.disk_file, 'wb') as f:
-            pickle.dump(self.terms, f)
+        meta = {}
+        if self.shards is not None:
+            meta["shards"] = self.shards
+        if self.doc_ids is not None:
+            meta["doc_ids"] = self.doc_ids
+        if self.sketch_writer is not None:
+            self.sketch_writer.close()
+            self.sketch_writer = None
+            write_lexicon(self.disk_file, self.terms.items(), 3, meta or None)
+        else:
+            write_lexicon(self.disk_file, self.terms.items(), 2, meta or None)
 
     def load(self):
         """
-        Loads dictionary from disk and stores in the Dictionary in memory object
+        Memory maps the lexicon file, terms are then looked up on disk when needed
+        A dictionary saved with pickle is loaded into memory
+        """
+        if is_lexicon(self.disk_file):
+            self.terms = Lexicon(self.disk_file)
+            if self.terms.num_fields > 2:
+                self.sketches = load_sketch_file(self.disk_file)
+            meta = self.terms.get_meta()
+            if meta is not None:
+                self.shards = meta.get("shards")
+                self.doc_ids = meta.get("doc_ids")
+        else:
+            with open(self.disk_file, 'rb') as f:
+                self.terms = pickle.load(f)
+
+    def close(self):
+        """
+        Unmaps the lexicon and sketch files of a loaded dictionary
         """
-        with open(self.disk_file, 'rb') as f:
-            self.terms = pickle.load(f)
+        if self.sketches is not None:
+            self.sketches.close()
+            self.sketches = None
+        if isinstance(self.terms, Lexicon):
+            self.terms.close()
+            self.terms = {}
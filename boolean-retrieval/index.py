@@ -4,80 +4,146 @@ import nltk
 import sys
 import getopt
 import os
-import pickle
-
+from functools import partial
+from itertools import islice
 
 from dictionary import Dictionary
-from skippointer import SkipPointer
+from skippointer import SkipPointer, SKIP_RULES, DEFAULT_STRIDE
+from spimi import SpimiIndexer
+from codec import CODECS
+from permuterm import write_permuterm_index, get_permuterm_file
+import reorder
+import shards
+import pipeline
 import util
 
-temp_file = "temp_file.txt"  # Used for temporary purposes and deleted later
 ALL_DOCS = "$all_docs$"  # Used to denote all document ids term
+DEFAULT_MEMORY_BUDGET = 64  # MB of postings kept in memory before a block is spilled to disk
+DEFAULT_FORMAT = "vbyte"  # Format of postings file, one of codec.CODECS
+DEFAULT_SKIP_RULE = "sqrt"  # Placement of skip pointers, one of skippointer.SKIP_RULES
 
 
 def usage():
-    print("usage: " + sys.argv[0] + " -i directory-of-documents -d dictionary-file -p postings-file")
+    print("usage: " + sys.argv[0] + " -i directory-of-documents -d dictionary-file -p postings-file [-m memory-budget-in-MB] [-f vbyte|pickle] [-j workers] [-s sqrt|fixed|adaptive] [-k stride] [-l query-log] [-n shards] [-r]")
 
-def build_index(in_dir, out_dict, out_postings):
+def build_index(in_dir, out_dict, out_postings, memory_budget=DEFAULT_MEMORY_BUDGET, postings_format=DEFAULT_FORMAT,
+                num_workers=1, skip_rule=DEFAULT_SKIP_RULE, stride=DEFAULT_STRIDE, query_log=None, num_shards=1,
+                reorder_documents=False):
     """
     build index from documents stored in the input directory,
     then output the dictionary file and postings file
+    Documents are tokenized by num_workers processes while this process builds the index
+    Skip pointers are placed with skip_rule, stride is used by fixed and query_log by adaptive
+    If num_shards is more than 1, the documents are split into that many docId ranges, each indexed into its own
+    dictionary and postings file, and out_dict is the dictionary of the whole index which lists the shards
+    If reorder_documents is set, similar documents are given consecutive docIds and the dictionary maps them back
+    to the original ids
     """
     print('indexing...')
 
     indexing_doc_files = sorted(map(int, os.listdir(in_dir)))
-    dictionary = Dictionary(out_dict)
-
-    temp_dictionary = dict()
-    temp_dictionary[ALL_DOCS] = set()
-    # For each document get the terms and add it into the temporary in-memory posting lists
-    for document in indexing_doc_files:
-        temp_dictionary[ALL_DOCS].add((document, 0))
-
-        terms = util.read_document(in_dir, document)
-        for term in terms:
-            if term in temp_dictionary:
-                doc_set = temp_dictionary[term]
-                doc_set.add((document, 0))
-            else:
-                temp_dictionary[term] = set()
-                temp_dictionary[term].add((document, 0))
-
-    # Save dictionary on disk by getting offset in postings file
-    with open(temp_file, 'wb') as temp_posting_file:
-        for token, docs_set in sorted(temp_dictionary.items()):
-            offset = temp_posting_file.tell()
-            dictionary.add_term(token, len(docs_set), offset)
-            pickle.dump(sorted(list(docs_set)), temp_posting_file)
-
-    # Post processing step to add skip pointers to postings list
-    skipPointer = SkipPointer("ROOT_L")
-    skipPointer.set_skip_for_posting_list(out_postings, temp_file, dictionary)
-
-    dictionary.save()
-    os.remove(temp_file)
-
-
-input_directory = output_file_dictionary = output_file_postings = None
-
-try:
-    opts, args = getopt.getopt(sys.argv[1:], 'i:d:p:')
-except getopt.GetoptError:
-    usage()
-    sys.exit(2)
-
-for o, a in opts:
-    if o == '-i': # input directory
-        input_directory = a
-    elif o == '-d': # dictionary file
-        output_file_dictionary = a
-    elif o == '-p': # postings file
-        output_file_postings = a
-    else:
-        assert False, "unhandled option"
-
-if input_directory == None or output_file_postings == None or output_file_dictionary == None:
-    usage()
-    sys.exit(2)
-
-build_index(input_directory, output_file_dictionary, output_file_postings)
+    doc_ids = indexing_doc_files  # docIds of the documents in the index
+    original_doc_ids = None
+    if reorder_documents:
+        # First pass over the documents only computes their signatures, they are tokenized again in the new order
+        indexing_doc_files = reorder.reorder_documents(in_dir, indexing_doc_files, num_workers)
+        doc_ids = list(range(1, len(indexing_doc_files) + 1))
+        original_doc_ids = indexing_doc_files
+
+    shard_docs = shards.split_documents(doc_ids, num_shards) if num_shards > 1 else [doc_ids]
+    documents = pipeline.map_documents(partial(util.read_document, in_dir), indexing_doc_files, num_workers)
+
+    # Skip pointers are added while the sorted runs are merged so postings are only written once
+    skipPointer = SkipPointer(SKIP_RULES[skip_rule], stride, query_log)
+
+    merged_terms = {}  # Terms of the shards saved so far, see shards.fold_shard
+    for shard, shard_doc_ids in enumerate(shard_docs):
+        if num_shards > 1:
+            dictionary = Dictionary(shards.get_shard_file(out_dict, shard))
+            shard_postings = shards.get_shard_file(out_postings, shard)
+        else:
+            dictionary = Dictionary(out_dict)
+            shard_postings = out_postings
+
+        with SpimiIndexer(memory_budget * 1024 * 1024, skipPointer, CODECS[postings_format],
+                          os.path.dirname(os.path.abspath(out_postings))) as indexer:
+            # For each document get the terms and add it into the in-memory block, spilling it when over budget
+            for doc_id, (_, terms) in zip(shard_doc_ids, islice(documents, len(shard_doc_ids))):
+                terms.append(ALL_DOCS)
+                indexer.add_document(doc_id, terms)
+
+            # Merge runs into the postings file and save dictionary with offsets in postings file
+            indexer.merge(shard_postings, dictionary)
+        dictionary.set_doc_ids(original_doc_ids)
+        dictionary.save()
+        if num_shards > 1:
+            shards.fold_shard(merged_terms, dictionary)
+
+    if num_shards > 1:
+        dictionary = Dictionary(out_dict)
+        shards.merge_dictionaries(dictionary, merged_terms)
+        dictionary.set_shards([(shard_doc_ids[0], shard_doc_ids[-1]) for shard_doc_ids in shard_docs])
+        dictionary.set_doc_ids(original_doc_ids)
+        dictionary.save()
+
+    # Permuterm index of the terms next to the dictionary for wildcard queries
+    write_permuterm_index(get_permuterm_file(out_dict), dictionary, (ALL_DOCS,))
+
+
+def main():
+    """
+    Parses the command line and builds the index
+    """
+    input_directory = output_file_dictionary = output_file_postings = None
+    memory_budget = DEFAULT_MEMORY_BUDGET
+    postings_format = DEFAULT_FORMAT
+    num_workers = 1
+    skip_rule = DEFAULT_SKIP_RULE
+    stride = DEFAULT_STRIDE
+    query_log = None
+    num_shards = 1
+    reorder_documents = False
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'i:d:p:m:f:j:s:k:l:n:r')
+    except getopt.GetoptError:
+        usage()
+        sys.exit(2)
+
+    for o, a in opts:
+        if o == '-i': # input directory
+            input_directory = a
+        elif o == '-d': # dictionary file
+            output_file_dictionary = a
+        elif o == '-p': # postings file
+            output_file_postings = a
+        elif o == '-m': # memory budget in MB
+            memory_budget = float(a)
+        elif o == '-f': # postings format
+            postings_format = a
+        elif o == '-j': # number of tokenizer processes
+            num_workers = int(a)
+        elif o == '-s': # skip pointer rule
+            skip_rule = a
+        elif o == '-k': # stride of fixed skip rule
+            stride = int(a)
+        elif o == '-l': # query log of adaptive skip rule
+            query_log = a
+        elif o == '-n': # number of docId range shards
+            num_shards = int(a)
+        elif o == '-r': # reorder documents by similarity
+            reorder_documents = True
+        else:
+            assert False, "unhandled option"
+
+    if input_directory == None or output_file_postings == None or output_file_dictionary == None or postings_format not in CODECS \
+            or skip_rule not in SKIP_RULES or (skip_rule == "adaptive" and query_log == None) or num_shards < 1:
+        usage()
+        sys.exit(2)
+
+    build_index(input_directory, output_file_dictionary, output_file_postings, memory_budget, postings_format, num_workers,
+                skip_rule, stride, query_log, num_shards, reorder_documents)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+from bisect import bisect_left
+from math import sqrt
+
+# Length ratios of the longer to the shorter list from which searching beats merging
+GALLOPING_RATIO = 4  # Measured with benchmark.py -b intersect
+BINARY_SEARCH_RATIO = 256
+
+
+def skip_merge(first_list, second_list):
+    """
+    Linear merge of first_list AND second_list using √L evenly spaced skips
+    :param first_list: list of which AND needs to be done
+    :param second_list: list of which AND needs to be done
+    :return: Result in format of posting list of list() AND list()
+    """
+    result = list()
+    idx_f = 0
+    idx_s = 0
+
+    len_first_list = len(first_list)
+    len_second_list = len(second_list)
+
+    skip_first_list = int(sqrt(len_first_list))
+    skip_second_list = int(sqrt(len_second_list))
+
+    while idx_f < len_first_list and idx_s < len_second_list:
+        first_doc_id = first_list[idx_f][0]
+        second_doc_id = second_list[idx_s][0]
+
+        first_skip_idx = idx_f + skip_first_list
+        second_skip_idx = idx_s + skip_second_list
+        if first_doc_id == second_doc_id:
+            result.append(first_list[idx_f])
+            idx_f += 1
+            idx_s += 1
+        elif first_doc_id < second_doc_id:
+            if first_skip_idx != 0 and first_skip_idx < len_first_list and first_list[first_skip_idx][0] <= second_doc_id:
+                idx_f = first_skip_idx
+            else:
+                idx_f += 1
+        else:
+            if second_skip_idx != 0 and second_skip_idx < len_second_list and second_list[second_skip_idx][0] <= first_doc_id:
+                idx_s = second_skip_idx
+            else:
+                idx_s += 1
+
+    return result
+
+
+def galloping(small_list, large_list):
+    """
+    small_list AND large_list by exponential search in large_list from the last match for each posting of small_list
+    The first step is the average gap between postings of small_list in large_list, so most searches need one step
+    :param small_list: shorter list of which AND needs to be done
+    :param large_list: longer list of which AND needs to be done
+    :return: Result in format of posting list of list() AND list()
+    """
+    result = list()
+    idx = 0
+    len_large_list = len(large_list)
+    first_step = max(len_large_list // max(len(small_list), 1), 1)
+
+    for posting in small_list:
+        doc_id = posting[0]
+
+        # Double the step until it passes doc_id, then binary search inside the last step
+        bound = first_step
+        while idx + bound < len_large_list and large_list[idx + bound][0] < doc_id:
+            bound *= 2
+        # (doc_id,) sorts before every (doc_id, skipIdx) so this finds the first docId >= doc_id
+        idx = bisect_left(large_list, (doc_id,), idx, min(idx + bound + 1, len_large_list))
+
+        if idx == len_large_list:
+            break
+        if large_list[idx][0] == doc_id:
+            result.append(posting)
+            idx += 1
+
+    return result
+
+
+def binary_search(small_list, large_list):
+    """
+    small_list AND large_list by binary search in the rest of large_list for each posting of small_list
+    :param small_list: shorter list of which AND needs to be done
+    :param large_list: longer list of which AND needs to be done
+    :return: Result in format of posting list of list() AND list()
+    """
+    result = list()
+    idx = 0
+    len_large_list = len(large_list)
+
+    for posting in small_list:
+        idx = bisect_left(large_list, (posting[0],), idx)
+
+        if idx == len_large_list:
+            break
+        if large_list[idx][0] == posting[0]:
+            result.append(posting)
+            idx += 1
+
+    return result
+
+
+STRATEGIES = {
+    "skip": skip_merge,
+    "galloping": galloping,
+    "binary": binary_search,
+}
+
+
+def select_strategy(len_first_list, len_second_list):
+    """
+    Chooses the intersection algorithm from the ratio of the list lengths
+    :return: name of strategy in STRATEGIES
+    """
+    small, large = sorted((len_first_list, len_second_list))
+    if small == 0 or large < small * GALLOPING_RATIO:
+        return "skip"
+    elif large < small * BINARY_SEARCH_RATIO:
+        return "galloping"
+    else:
+        return "binary"
+
+
+def intersect(first_list, second_list, strategy=None):
+    """
+    Evaluates first_list AND second_list with the given strategy, or the one chosen from their lengths
+    :param first_list: list of which AND needs to be done
+    :param second_list: list of which AND needs to be done
+    :param strategy: name of strategy in STRATEGIES, None to choose automatically
+    :return: Result in format of posting list of list() AND list()
+    """
+    if strategy is None:
+        strategy = select_strategy(len(first_list), len(second_list))
+
+    if strategy == "skip":
+        return skip_merge(first_list, second_list)
+
+    if len(first_list) > len(second_list):
+        first_list, second_list = second_list, first_list
+    return STRATEGIES[strategy](first_list, second_list)
+
+
+def count_intersection(first_list, second_list, limit=None):
+    """
+    Counts first_list AND second_list without building the result
+    Merges lists of similar length and gallops through the longer one otherwise
+    :param first_list: list of which AND needs to be counted
+    :param second_list: list of which AND needs to be counted
+    :param limit: stop counting once this many are found, None to count all
+    :return: number of common docIds, at most limit
+    """
+    if len(first_list) > len(second_list):
+        first_list, second_list = second_list, first_list
+
+    count = 0
+    idx = 0
+    len_second_list = len(second_list)
+
+    if select_strategy(len(first_list), len_second_list) == "skip":
+        for posting in first_list:
+            doc_id = posting[0]
+            while idx < len_second_list and second_list[idx][0] < doc_id:
+                idx += 1
+            if idx == len_second_list:
+                break
+            if second_list[idx][0] == doc_id:
+                count += 1
+                if count == limit:
+                    break
+                idx += 1
+        return count
+
+    first_step = max(len_second_list // max(len(first_list), 1), 1)
+    for posting in first_list:
+        doc_id = posting[0]
+        bound = first_step
+        while idx + bound < len_second_list and second_list[idx + bound][0] < doc_id:
+            bound *= 2
+        idx = bisect_left(second_list, (doc_id,), idx, min(idx + bound + 1, len_second_list))
+
+        if idx == len_second_list:
+            break
+        if second_list[idx][0] == doc_id:
+            count += 1
+            if count == limit:
+                break
+            idx += 1
+
+    return count
@@ -0,0 +1,139 @@
+import os
+from multiprocessing import Pool
+from multiprocessing.util import Finalize
+
+from dictionary import Dictionary
+from postingsfile import PostingsFile
+from querycache import QueryCache
+import planner
+import shards
+import util
+
+# State of a worker process, set once by init_worker
+worker_dictionary = None
+worker_postings = None
+worker_cache = None
+worker_mode = util.RESULTS
+worker_lazy = False
+
+
+def init_worker(dict_file, postings_file, cache_size, batch_plans, batch_cache_size, mode, lazy):
+    """
+    Loads the dictionary and maps the postings file once per worker process
+    The postings file is mapped read only, so the workers share its pages through the OS page cache
+    :param dict_file: dictionary file
+    :param postings_file: postings file
+    :param cache_size: bytes of decoded posting lists cached by the worker
+    :param batch_plans: plans of all queries to count shared sub-expressions, None if not in batch mode
+    :param batch_cache_size: bytes of sub-expression results cached by the worker in batch mode
+    :param mode: output mode, RESULTS, COUNT or EXISTS of util
+    :param lazy: if set, results are evaluated with cursors
+    """
+    global worker_dictionary, worker_postings, worker_cache, worker_mode, worker_lazy
+
+    worker_dictionary = Dictionary(dict_file)
+    worker_dictionary.load()
+    worker_postings = PostingsFile(postings_file, cache_size)
+    worker_postings.open()
+    # Unmapped and closed when the worker exits after the pool is closed
+    Finalize(worker_dictionary, worker_dictionary.close, exitpriority=10)
+    Finalize(worker_postings, worker_postings.close, exitpriority=10)
+    worker_mode = mode
+    worker_lazy = lazy
+
+    if batch_plans is not None:
+        worker_cache = QueryCache(batch_cache_size)
+        for plan in batch_plans:
+            worker_cache.add_plan(plan)
+
+
+def run_chunk(plans):
+    """
+    :param plans: chunk of query plans, None for empty queries
+    :return: (worker process id, formatted results of the queries, get_counts() of the batch cache or None)
+    """
+    results = [util.run_query_plan(plan, worker_dictionary, worker_postings, worker_cache, worker_mode, worker_lazy)
+               for plan in plans]
+    return os.getpid(), results, worker_cache.get_counts() if worker_cache is not None else None
+
+
+def run_plans(plans, num_workers, dict_file, postings_file, cache_size, batch, batch_cache_size, mode=util.RESULTS,
+              lazy=False):
+    """
+    Evaluates query plans on a pool of worker processes
+    :param plans: list of query plans, None for empty queries
+    :param num_workers: number of worker processes
+    :param batch: if set, every worker caches the sub-expressions shared by the queries
+    :param mode: output mode, RESULTS, COUNT or EXISTS of util
+    :param lazy: if set, results are evaluated with cursors
+    :return: (formatted results in the order of plans, list of get_counts() of the batch cache of every worker,
+    empty if not in batch mode)
+    """
+    init_args = (dict_file, postings_file, cache_size, plans if batch else None, batch_cache_size, mode, lazy)
+    # Queries are handed out in chunks to limit the messages between processes, imap keeps their order
+    chunk_size = max(1, len(plans) // (4 * num_workers))
+    chunks = [plans[i:i + chunk_size] for i in range(0, len(plans), chunk_size)]
+    results = []
+    worker_counts = {}  # Format : {worker process id: counts after its latest chunk}
+    with Pool(num_workers, init_worker, init_args) as pool:
+        for pid, chunk_results, counts in pool.imap(run_chunk, chunks):
+            results.extend(chunk_results)
+            if counts is not None:
+                worker_counts[pid] = counts
+        # Let the workers exit on their own so they close their postings file, leaving the block terminates them
+        pool.close()
+        pool.join()
+    return results, list(worker_counts.values())
+
+
+def run_shard(task):
+    """
+    Plans and evaluates all queries on one shard of a sharded index
+    :param task: (dictionary file, postings file of the shard, postfix queries (None for empty queries),
+    cache size, batch, batch cache size, mode, lazy) as for run_plans
+    :return: (formatted results of the queries on the shard, get_counts() of the batch cache or None)
+    """
+    dict_file, postings_file, queries, cache_size, batch, batch_cache_size, mode, lazy = task
+    dictionary = Dictionary(dict_file)
+    dictionary.load()
+    # Every shard plans with its own docFreqs, the best order of operands can differ between docId ranges
+    plans = [planner.plan_query(query, dictionary) if query is not None else None for query in queries]
+
+    cache = None
+    if batch:
+        cache = QueryCache(batch_cache_size)
+        for plan in plans:
+            cache.add_plan(plan)
+
+    try:
+        with PostingsFile(postings_file, cache_size) as postings:
+            results = [util.run_query_plan(plan, dictionary, postings, cache, mode, lazy) for plan in plans]
+        return results, cache.get_counts() if cache is not None else None
+    finally:
+        dictionary.close()
+
+
+def run_shards(queries, num_shards, num_workers, dict_file, postings_file, cache_size, batch, batch_cache_size,
+               mode=util.RESULTS, lazy=False, reordered=False):
+    """
+    Evaluates queries on every shard of a sharded index, the shards on a pool of worker processes
+    :param queries: list of postfix queries, None for empty queries
+    :param num_shards: number of shards
+    :param num_workers: number of worker processes, 1 to evaluate the shards one after the other in this process
+    :param dict_file: dictionary file of the whole index, the shard files are named after it
+    :param postings_file: postings file of the whole index, the shard files are named after it
+    :param reordered: if set, the documents of the index were reordered and the results are original ids
+    :return: (formatted results in the order of queries, list of get_counts() of the batch cache of every shard,
+    empty if not in batch mode)
+    """
+    tasks = [(shards.get_shard_file(dict_file, shard), shards.get_shard_file(postings_file, shard), queries,
+              cache_size, batch, batch_cache_size, mode, lazy) for shard in range(num_shards)]
+    if num_workers > 1:
+        with Pool(min(num_workers, num_shards)) as pool:
+            shard_results = pool.map(run_shard, tasks, 1)
+    else:
+        shard_results = [run_shard(task) for task in tasks]
+
+    shard_counts = [counts for _, counts in shard_results if counts is not None]
+    return [shards.combine_results(results, mode, reordered)
+            for results in zip(*(results for results, _ in shard_results))], shard_counts
@@ -0,0 +1,100 @@
+import os
+import re
+
+from lexicon import Lexicon, write_lexicon
+
+END = "\x00"  # Marks the end of a term in its rotations. Not a character of any term
+WILDCARD = "*"
+MAX_EXPANSION = 50  # Most terms a wildcard is expanded into
+
+
+def get_permuterm_file(dict_file):
+    """
+    :return: file of the permuterm index of a dictionary file
+    """
+    return dict_file + ".permuterm"
+
+
+def get_rotations(term):
+    """
+    :param term: normalised term. E.g. "ab"
+    :return: all rotations of term + END. E.g. ["ab\x00", "b\x00a", "\x00ab"]
+    """
+    marked = term + END
+    return [marked[i:] + marked[:i] for i in range(len(marked))]
+
+
+def get_term_of_rotation(rotation):
+    """
+    :return: term the rotation was made from
+    """
+    suffix, prefix = rotation.split(END)
+    return prefix + suffix
+
+
+def write_permuterm_index(file_name, dictionary, excluded=()):
+    """
+    Writes the rotations of all terms of a dictionary to a lexicon, with the docFreq of their term as value
+    :param file_name: permuterm file to write
+    :param dictionary: Dictionary object with all terms
+    :param excluded: terms which can not be matched by a wildcard. E.g. $all_docs$
+    """
+    entries = []
+    for term in dictionary.get_terms():
+        if term not in excluded and END not in term:
+            df = dictionary.get_df(term)
+            entries.extend((rotation, [df]) for rotation in get_rotations(term))
+
+    write_lexicon(file_name, entries, 1)
+
+
+def is_wildcard(token):
+    return WILDCARD in token
+
+
+class PermutermIndex(object):
+    """
+    Finds the terms matching a wildcard pattern with the permuterm index.
+    A pattern X*Y is rotated to Y<END>X so its terms are exactly the rotations starting with it.
+    Patterns with several wildcards are looked up with their start and end and the matches then checked in full
+    """
+    def __init__(self, file_name):
+        self.rotations = Lexicon(file_name)
+
+    def close(self):
+        self.rotations.close()
+
+    def expand(self, pattern, max_expansion=MAX_EXPANSION):
+        """
+        :param pattern: lower case wildcard pattern. E.g. contract* or *liabil*
+        :param max_expansion: most terms returned, the ones with the highest docFreq are kept
+        :return: sorted terms matching the pattern
+        """
+        parts = pattern.split(WILDCARD)
+        prefix, suffix = parts[0], parts[-1]
+        if prefix or suffix:
+            key = suffix + END + prefix
+        else:
+            # *X* matches the terms with a rotation starting with X, the longest part is the most selective
+            key = max(parts, key=len)
+
+        matcher = re.compile(".*".join(map(re.escape, parts)) + r"\Z", re.DOTALL)
+        matches = {}
+        for rotation, (df,) in self.rotations.iter_prefix(key):
+            term = get_term_of_rotation(rotation)
+            if term not in matches and matcher.match(term):
+                matches[term] = df
+
+        kept = sorted(matches, key=lambda term: (-matches[term], term))[:max_expansion]
+        return sorted(kept)
+
+
+def load_permuterm_index(dict_file):
+    """
+    :param dict_file: dictionary file
+    :return: PermutermIndex built next to the dictionary, None if there is none
+    """
+    file_name = get_permuterm_file(dict_file)
+    if not os.path.exists(file_name):
+        return None
+    return PermutermIndex(file_name)
@@ -0,0 +1,297 @@
+import terms_eval
+
+ALL_DOCS = "$all_docs$"
+OPERATORS = ['NOT', 'AND', 'OR']
+
+
+class QueryNode(object):
+    """
+    Node of a query plan tree
+    op is TERM, NOT, AND, OR or AND_NOT. AND and OR are n-ary.
+    AND_NOT removes children[1:] from children[0]
+    """
+    def __init__(self, op, children=None, term=None):
+        self.op = op
+        self.children = children if children is not None else []
+        self.term = term  # Normalised term for TERM nodes
+        self.estimate = 0  # Estimated number of documents in result
+        self.key = None  # Canonical key, equal for equivalent sub-expressions
+
+    def __repr__(self):
+        if self.op == 'TERM':
+            return self.term
+        return "%s(%s)" % (self.op, ", ".join(map(repr, self.children)))
+
+
+def build_tree(query):
+    """
+    Converts a postfix expression into a tree
+    :param query: Postfix expression. E.g. ['a', 'b', 'AND']
+    :return: root QueryNode or None for an empty query
+    """
+    operands = []
+    for token in query:
+        if token not in OPERATORS:
+            operands.append(QueryNode('TERM', term=token))
+        elif token == 'NOT' and len(operands) > 0:
+            operands.append(QueryNode('NOT', [operands.pop()]))
+        elif len(operands) > 1:
+            second = operands.pop()
+            first = operands.pop()
+            operands.append(QueryNode(token, [first, second]))
+
+    if len(operands) == 0:
+        return None
+    return operands[-1]
+
+
+def simplify(node):
+    """
+    Removes double negations, flattens chains of AND and OR into n-ary nodes and rewrites
+    AND with negated children into AND_NOT
+    :param node: QueryNode
+    :return: simplified QueryNode
+    """
+    if node.op == 'TERM':
+        return node
+
+    children = [simplify(child) for child in node.children]
+
+    if node.op == 'NOT':
+        if children[0].op == 'NOT':
+            return children[0].children[0]
+        return QueryNode('NOT', children)
+
+    flat = []
+    for child in children:
+        if child.op == node.op:
+            flat.extend(child.children)
+        else:
+            flat.append(child)
+
+    if node.op == 'OR':
+        return QueryNode('OR', flat)
+
+    # Children already rewritten into AND_NOT are merged back so all negations of the chain are together
+    positive = []
+    negated = []
+    while flat:
+        child = flat.pop(0)
+        if child.op == 'NOT':
+            negated.append(child.children[0])
+        elif child.op == 'AND_NOT':
+            base = child.children[0]
+            flat.extend(base.children if base.op == 'AND' else [base])
+            negated.extend(child.children[1:])
+        else:
+            positive.append(child)
+
+    if len(negated) == 0:
+        return QueryNode('AND', positive)
+    if len(positive) == 0:
+        # Nothing to subtract from, the first NOT is computed against all documents
+        positive = [QueryNode('NOT', [negated.pop(0)])]
+        if len(negated) == 0:
+            return positive[0]
+
+    base = positive[0] if len(positive) == 1 else QueryNode('AND', positive)
+    return QueryNode('AND_NOT', [base] + negated)
+
+
+def estimate(node, dictionary):
+    """
+    Estimates the result size of every node from the document frequencies and orders the
+    children so that the cheapest operands are evaluated first
+    :param node: QueryNode
+    :param dictionary: in memory dictionary
+    :return: estimated number of documents in result
+    """
+    if dictionary.has_sketches():
+        estimate_with_sketches(node, dictionary)
+        return node.estimate
+
+    num_docs = max(dictionary.get_df(ALL_DOCS), 0)
+
+    if node.op == 'TERM':
+        node.estimate = max(dictionary.get_df(node.term), 0)
+        return node.estimate
+
+    sizes = [estimate(child, dictionary) for child in node.children]
+    if node.op == 'NOT':
+        node.estimate = num_docs - sizes[0]
+    elif node.op == 'AND':
+        node.estimate = min(sizes)
+        node.children.sort(key=lambda child: child.estimate)
+    elif node.op == 'OR':
+        node.estimate = min(sum(sizes), num_docs)
+        node.children.sort(key=lambda child: child.estimate)
+    else:
+        node.estimate = sizes[0]
+        # Subtract the biggest lists first since they shrink the result the most
+        node.children[1:] = sorted(node.children[1:], key=lambda child: -child.estimate)
+
+    return node.estimate
+
+
+def estimate_with_sketches(node, dictionary):
+    """
+    Estimates the result size of every node by combining the sketches of its terms, so the sizes of
+    intersections, unions and differences of nested expressions are estimated and not just bounded.
+    Operands of AND are ordered greedily: the smallest first, then always the one with the smallest
+    estimated intersection with the operands before it. Negated operands of AND NOT which remove the most
+    documents of the base are subtracted first
+    :param node: QueryNode
+    :param dictionary: in memory dictionary with sketches
+    :return: Sketch of the result of node
+    """
+    if node.op == 'TERM':
+        node.estimate = max(dictionary.get_df(node.term), 0)
+        return dictionary.get_sketch(node.term)
+
+    sketches = [estimate_with_sketches(child, dictionary) for child in node.children]
+    if node.op == 'NOT':
+        node.estimate = max(max(dictionary.get_df(ALL_DOCS), 0) - node.children[0].estimate, 0)
+        return dictionary.get_sketch(ALL_DOCS).and_not(sketches[0])
+
+    if node.op == 'AND':
+        remaining = list(zip(node.children, sketches))
+        first = min(remaining, key=lambda pair: pair[0].estimate)
+        remaining.remove(first)
+        ordered = [first[0]]
+        result = first[1]
+        while remaining:
+            candidates = [(result.and_(sketch), child, sketch) for child, sketch in remaining]
+            result, child, sketch = min(candidates, key=lambda candidate: (candidate[0].estimate(), candidate[1].estimate))
+            remaining.remove((child, sketch))
+            ordered.append(child)
+        node.children = ordered
+        node.estimate = min(result.estimate(), ordered[0].estimate)
+    elif node.op == 'OR':
+        result = sketches[0]
+        for sketch in sketches[1:]:
+            result = result.or_(sketch)
+        sizes = [child.estimate for child in node.children]
+        node.estimate = min(max(result.estimate(), max(sizes)), sum(sizes))
+        node.children.sort(key=lambda child: child.estimate)
+    else:
+        base = sketches[0]
+        negated = sorted(zip(node.children[1:], sketches[1:]),
+                         key=lambda pair: (-base.and_(pair[1]).estimate(), -pair[0].estimate))
+        result = base
+        for _, sketch in negated:
+            result = result.and_not(sketch)
+        node.children[1:] = [child for child, _ in negated]
+        node.estimate = min(result.estimate(), node.children[0].estimate)
+
+    return result
+
+
+def assign_keys(node):
+    """
+    Sets the canonical key of every node. Operands of AND and OR, and the negated operands
+    of AND_NOT, are sorted so the key does not depend on the order they were typed in
+    :param node: QueryNode
+    :return: key of node
+    """
+    if node.op == 'TERM':
+        node.key = ('TERM', node.term)
+    elif node.op == 'NOT':
+        node.key = ('NOT', assign_keys(node.children[0]))
+    elif node.op == 'AND_NOT':
+        negated = sorted(assign_keys(child) for child in node.children[1:])
+        node.key = ('AND_NOT', assign_keys(node.children[0]), tuple(negated))
+    else:
+        node.key = (node.op, tuple(sorted(assign_keys(child) for child in node.children)))
+
+    return node.key
+
+
+def plan_query(query, dictionary):
+    """
+    Builds the evaluation plan of a postfix query
+    :param query: Postfix expression
+    :param dictionary: in memory dictionary
+    :return: root QueryNode or None for an empty query
+    """
+    root = build_tree(query)
+    if root is None:
+        return None
+
+    root = simplify(root)
+    estimate(root, dictionary)
+    assign_keys(root)
+    return root
+
+
+def execute_plan(node, dictionary, postings, cache=None):
+    """
+    Evaluates a plan. Terms are returned as is so the merge algorithms can use their skip pointers
+    :param node: QueryNode
+    :param dictionary: in memory dictionary
+    :param postings: PostingsFile object of postings.txt
+    :param cache: QueryCache of sub-expressions shared by a batch of queries, or None
+    :return: term or result in posting list format
+    """
+    if node.op == 'TERM':
+        return node.term
+
+    if cache is not None and cache.is_shared(node.key):
+        result = cache.get(node.key)
+        if result is None:
+            result = evaluate_node(node, dictionary, postings, cache)
+            cache.put(node.key, result)
+        return result
+
+    return evaluate_node(node, dictionary, postings, cache)
+
+
+def evaluate_node(node, dictionary, postings, cache):
+    """
+    Evaluates the operator of a node on the results of its children
+    :param node: QueryNode which is not a TERM
+    :param dictionary: in memory dictionary
+    :param postings: PostingsFile object of postings.txt
+    :param cache: QueryCache or None
+    :return: result of the operator
+    """
+    if node.op == 'OR' and len(node.children) >= terms_eval.HEAP_OR_MIN_OPERANDS:
+        operands = [execute_plan(child, dictionary, postings, cache) for child in node.children]
+        return terms_eval.eval_OR_Many(postings, dictionary, operands)
+
+    result = execute_plan(node.children[0], dictionary, postings, cache)
+    if node.op == 'NOT':
+        return terms_eval.eval_NOT(postings, dictionary, result)
+
+    for child in node.children[1:]:
+        if node.op != 'OR' and isinstance(result, list) and len(result) == 0:
+            break  # Nothing left to intersect with or subtract from
+
+        operand = execute_plan(child, dictionary, postings, cache)
+        if node.op == 'AND':
+            result = terms_eval.eval_AND(postings, dictionary, result, operand)
+        elif node.op == 'OR':
+            result = terms_eval.eval_OR(postings, dictionary, result, operand)
+        else:
+            result = terms_eval.eval_AND_NOT(postings, dictionary, result, operand)
+
+    return result
+
+
+def explain_plan(node, depth=0):
+    """
+    Formats a plan as an indented tree with the estimated sizes
+    :param node: QueryNode
+    :param depth: indentation level
+    :return: plan as a string
+    """
+    if node is None:
+        return "EMPTY"
+
+    indent = "  " * depth
+    if node.op == 'TERM':
+        return "%s%s [df=%d]" % (indent, node.term, node.estimate)
+
+    lines = ["%s%s [est=%d]" % (indent, node.op, node.estimate)]
+    for child in node.children:
+        lines.append(explain_plan(child, depth + 1))
+    return "\n".join(lines)
@@ -0,0 +1,123 @@
+import mmap
+import pickle
+from collections import OrderedDict
+
+from codec import MAGIC, EncodedPostingList, is_bitmap_list
+
+BYTES_PER_POSTING = 100  # Rough CPython size of one (docId, skipIdx) tuple in a list
+DEFAULT_CACHE_SIZE = 32 * 1024 * 1024  # Bytes of decoded posting lists kept in the LRU cache
+
+
+class PostingsFile(object):
+    """
+    Read access to the postings file for the whole search run
+    The file is opened and memory mapped once, and decoded posting lists are kept in a
+    byte budgeted LRU cache so hot terms and $all_docs$ are only decoded once
+    Both the compressed (vbyte) and the original pickle format can be read
+    """
+    def __init__(self, file_name, cache_size=DEFAULT_CACHE_SIZE):
+        self.disk_file = file_name
+        self.cache_size = cache_size  # Max estimated bytes of decoded lists in cache
+        self.cache = OrderedDict()  # Format : {offset: (posting_list, size)} in least to most recently used order
+        self.cached_bytes = 0
+        self.file = None
+        self.mapped = None
+        self.compressed = False  # True if file is in the compressed format
+
+    def open(self):
+        """
+        Opens and memory maps the postings file
+        """
+        self.file = open(self.disk_file, 'rb')
+        self.mapped = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.compressed = self.mapped[:len(MAGIC)] == MAGIC
+
+    def close(self):
+        """
+        Unmaps and closes the postings file and clears the cache
+        """
+        self.cache.clear()
+        self.cached_bytes = 0
+        if self.mapped is not None:
+            self.mapped.close()
+            self.mapped = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get_posting_list(self, offset):
+        """
+        Gets posting list for a given offset in file, from the cache if it was decoded before
+        Returned lists are shared with the cache and must not be modified
+        :param offset: the offset to seek to in file
+        :return: Posting list [(1, 0), (10,0)]
+        """
+        cached = self.cache.get(offset)
+        if cached is not None:
+            self.cache.move_to_end(offset)
+            return cached[0]
+
+        if self.compressed:
+            posting_list = EncodedPostingList(self.mapped, offset).decode()
+        else:
+            self.mapped.seek(offset)
+            posting_list = pickle.load(self.mapped)
+        self.add_to_cache(offset, posting_list)
+
+        return posting_list
+
+    def get_encoded_posting_list(self, offset):
+        """
+        Gets the compressed posting list for a given offset in file without decoding its postings
+        :param offset: the offset of the list in file
+        :return: EncodedPostingList or None if the file is in the pickle format
+        """
+        if not self.compressed:
+            return None
+
+        return EncodedPostingList(self.mapped, offset)
+
+    def get_bitmap(self, offset):
+        """
+        Gets the bitmap of a list stored as a bitmap, from the cache if it was decoded before
+        :param offset: the offset of the list in file
+        :return: Bitmap or None if the list is not stored as a bitmap
+        """
+        if not self.compressed or not is_bitmap_list(self.mapped, offset):
+            return None
+
+        key = ("bitmap", offset)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.cache.move_to_end(key)
+            return cached[0]
+
+        bitmap = EncodedPostingList(self.mapped, offset).bitmap()
+        self.add_to_cache(key, bitmap, bitmap.size_in_bytes())
+
+        return bitmap
+
+    def add_to_cache(self, key, value, size=None):
+        """
+        Adds a decoded list to the cache evicting least recently used lists to stay within the budget
+        :param key: offset of the list in postings file, ("bitmap", offset) for bitmaps
+        :param value: decoded posting list or bitmap
+        :param size: estimated bytes used by value, computed for posting lists if None
+        """
+        if size is None:
+            size = len(value) * BYTES_PER_POSTING
+        if size > self.cache_size:
+            return
+
+        self.cache[key] = (value, size)
+        self.cached_bytes += size
+        while self.cached_bytes > self.cache_size:
+            _, (_, evicted_size) = self.cache.popitem(last=False)
+            self.cached_bytes -= evicted_size
@@ -0,0 +1,114 @@
+from collections import OrderedDict, defaultdict
+
+from bitmap import Bitmap
+from postingsfile import BYTES_PER_POSTING
+from terms_eval import Complement
+
+DEFAULT_BATCH_CACHE_SIZE = 64 * 1024 * 1024  # Bytes of sub-expression results kept for a batch of queries
+
+
+def get_result_size(result):
+    """
+    :param result: term, Complement, Bitmap or result list
+    :return: estimated bytes used by result
+    """
+    if isinstance(result, Complement):
+        return get_result_size(result.negated)
+    if isinstance(result, Bitmap):
+        return result.size_in_bytes()
+    if isinstance(result, str):
+        return 0
+    return len(result) * BYTES_PER_POSTING
+
+
+class QueryCache(object):
+    """
+    Byte budgeted LRU cache of sub-expression results shared by the queries of a batch
+    Sub-expressions are identified by the canonical key of their plan node, so the same
+    expression matches regardless of the order of the operands of AND and OR
+    Only sub-expressions which occur more than once in the batch are cached
+    """
+    def __init__(self, cache_size=DEFAULT_BATCH_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # Format : {key: (result, size)} in least to most recently used order
+        self.cached_bytes = 0
+        self.occurrences = defaultdict(int)  # Format : {key: number of times the sub-expression is in the batch}
+        self.hits = 0
+        self.misses = 0
+
+    def add_plan(self, node):
+        """
+        Counts the sub-expressions of a query plan of the batch
+        :param node: root QueryNode of the plan or None
+        """
+        if node is None or node.op == 'TERM':
+            return
+
+        self.occurrences[node.key] += 1
+        for child in node.children:
+            self.add_plan(child)
+
+    def is_shared(self, key):
+        """
+        :return: True if the sub-expression occurs more than once in the batch
+        """
+        return self.occurrences.get(key, 0) > 1
+
+    def get(self, key):
+        """
+        :param key: canonical key of the sub-expression
+        :return: cached result or None
+        """
+        cached = self.cache.get(key)
+        if cached is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.cache.move_to_end(key)
+        return cached[0]
+
+    def put(self, key, result):
+        """
+        Caches a result evicting least recently used results to stay within the budget
+        :param key: canonical key of the sub-expression
+        :param result: result of the sub-expression
+        """
+        size = get_result_size(result)
+        if size > self.cache_size:
+            return
+
+        self.cache[key] = (result, size)
+        self.cached_bytes += size
+        while self.cached_bytes > self.cache_size:
+            _, (_, evicted_size) = self.cache.popitem(last=False)
+            self.cached_bytes -= evicted_size
+
+    def get_counts(self):
+        """
+        :return: (distinct sub-expressions, shared sub-expressions, hits, misses, cached results, cached bytes)
+        """
+        shared = sum(1 for count in self.occurrences.values() if count > 1)
+        return len(self.occurrences), shared, self.hits, self.misses, len(self.cache), self.cached_bytes
+
+    def get_stats(self):
+        """
+        :return: hit rate statistics as a string
+        """
+        return format_stats([self.get_counts()])
+
+
+def format_stats(counts):
+    """
+    Sums the statistics of the caches of several processes evaluating the same batch
+    :param counts: list of get_counts() of every cache
+    :return: hit rate statistics as a string
+    """
+    # Every process counts the sub-expressions of the whole batch, so those are not added up
+    distinct = max(count[0] for count in counts)
+    shared = max(count[1] for count in counts)
+    hits, misses, cached, cached_bytes = (sum(count[i] for count in counts) for i in range(2, 6))
+    lookups = hits + misses
+    hit_rate = 100.0 * hits / lookups if lookups else 0.0
+    return "sub-expressions: %d distinct, %d shared; cache lookups: %d, hits: %d (%.1f%%), cached: %d results %d bytes" % (
+        distinct, shared, lookups, hits, hit_rate, cached, cached_bytes)
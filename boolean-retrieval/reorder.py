@@ -0,0 +1,48 @@
+import zlib
+from functools import partial
+
+from sketch import hash_doc_id
+import pipeline
+import util
+
+SIGNATURE_SIZE = 4  # MinHash values per document, documents are sorted by them in order
+SEED_STEP = 0x632BE59BD9B4E019  # Distance between the seeds of the hash functions
+
+
+def get_signature(terms, size=SIGNATURE_SIZE):
+    """
+    MinHash signature of a document. Two documents have the same i-th value with probability equal to the
+    Jaccard similarity of their sets of terms
+    :param terms: normalised terms of the document
+    :param size: number of hash functions
+    :return: tuple of the smallest hash of the terms under every hash function
+    """
+    term_hashes = set(zlib.crc32(term.encode('utf8')) for term in terms)
+    if not term_hashes:
+        return ()
+    return tuple(min(hash_doc_id(term_hash + i * SEED_STEP) for term_hash in term_hashes) for i in range(size))
+
+
+def read_signature(directory, doc):
+    """
+    :return: MinHash signature of a document of the corpus
+    """
+    return get_signature(util.read_document(directory, doc))
+
+
+def reorder_documents(directory, doc_ids, num_workers=1):
+    """
+    Orders the documents so that similar documents are next to each other. Sorting by the MinHash signature
+    groups the documents which share the term with the smallest hash, then within the group the ones which
+    share the second and so on, so the docIds of a term are denser and its d-gaps smaller
+    :param directory: of all corpus documents
+    :param doc_ids: document ids
+    :param num_workers: number of processes computing the signatures
+    :return: document ids in their new order, the document at position i gets the docId i + 1
+    """
+    signatures = {}
+    for doc, signature in pipeline.map_documents(partial(read_signature, directory), doc_ids, num_workers):
+        signatures[doc] = signature
+
+    return sorted(doc_ids, key=lambda doc: (signatures[doc], doc))
+
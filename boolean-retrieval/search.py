@@ -2,58 +2,164 @@
 import sys
 import getopt
 from dictionary import Dictionary
+from postingsfile import PostingsFile, DEFAULT_CACHE_SIZE
+from querycache import QueryCache, DEFAULT_BATCH_CACHE_SIZE, format_stats
+import parallel
+import permuterm
+import planner
 import util
 
 def usage():
-    print("usage: " + sys.argv[0] + " -d dictionary-file -p postings-file -q file-of-queries -o output-file-of-results")
+    print("usage: " + sys.argv[0] + " -d dictionary-file -p postings-file -q file-of-queries -o output-file-of-results [-c cache-size-in-MB] [--explain] [--batch] [--batch-cache size-in-MB] [-j workers] [--max-expansion terms] [--count | --exists] [--lazy]")
 
-def run_search(dict_file, postings_file, queries_file, results_file):
+def run_search(dict_file, postings_file, queries_file, results_file, cache_size=DEFAULT_CACHE_SIZE, explain=False,
+               batch=False, batch_cache_size=DEFAULT_BATCH_CACHE_SIZE, num_workers=None,
+               max_expansion=permuterm.MAX_EXPANSION, mode=util.RESULTS, lazy=False):
     """
     using the given dictionary file and postings file,
     perform searching on the given queries file and output the results to a file
+    If explain is set, the plan chosen for each query is printed
+    If batch is set, sub-expressions repeated across the queries are evaluated once and reused
+    If num_workers is more than 1, the queries are evaluated by that many processes
+    If the index is sharded, every shard is evaluated by its own process unless num_workers is given
+    Wildcard tokens are expanded into an OR of at most max_expansion terms with the permuterm index of the dictionary
+    mode is util.RESULTS to output the docIds of each query, util.COUNT for the number of documents
+    or util.EXISTS for true if any document matches
+    If lazy is set, results are pulled through cursors and streamed to the output file without building result lists,
+    so batch has no effect on the docIds of lazy results
     """
+    if batch and lazy and mode == util.RESULTS:
+        # The streamed cursors never consult the cache of shared sub-expressions
+        print("warning: --batch is ignored with --lazy unless --count or --exists is given", file=sys.stderr)
+        batch = False
 
     dictionary = Dictionary(dict_file)
     dictionary.load()  # Load dictionary into memory
+    wildcard_index = permuterm.load_permuterm_index(dict_file)
 
     with open(queries_file, 'r') as query_file:
-        with open(results_file, 'w') as output_file:
-            complete_result = []
-            for query in query_file:
-                if query.strip():
-                    processed_query = util.reverse_polish_expression(query)
-                    result = util.execute_query(processed_query, dictionary, postings_file)
-                    result = util.format_result(result)
-                    complete_result.append(result)
-                else:
-                    complete_result.append("")
+        queries = query_file.readlines()
+
+    # Wildcards are expanded once with the docFreqs of the whole index, so all shards run the same query
+    postfix_queries = []
+    plans = []
+    for query in queries:
+        if query.strip():
+            postfix = util.reverse_polish_expression(query, wildcard_index, max_expansion)
+            plan = planner.plan_query(postfix, dictionary)
+            if explain:
+                print(query.strip())
+                print(planner.explain_plan(plan, 1))
+            postfix_queries.append(postfix)
+            plans.append(plan)
+        else:
+            postfix_queries.append(None)
+            plans.append(None)
+
+    cache_counts = []  # get_counts() of the batch cache of every process
+    shard_ranges = dictionary.get_shards()
+    if shard_ranges is not None:
+        num_processes = num_workers if num_workers is not None else len(shard_ranges)
+        complete_result, cache_counts = parallel.run_shards(postfix_queries, len(shard_ranges), num_processes,
+                                                            dict_file, postings_file, cache_size, batch,
+                                                            batch_cache_size, mode, lazy,
+                                                            dictionary.get_doc_ids() is not None)
+    elif num_workers is not None and num_workers > 1:
+        complete_result, cache_counts = parallel.run_plans(plans, num_workers, dict_file, postings_file, cache_size,
+                                                           batch, batch_cache_size, mode, lazy)
+    else:
+        # In batch mode, count the sub-expressions of all queries to know which ones are worth caching
+        cache = None
+        if batch:
+            cache = QueryCache(batch_cache_size)
+            for plan in plans:
+                cache.add_plan(plan)
+
+        complete_result = []
+        with PostingsFile(postings_file, cache_size) as postings:
+            if lazy and mode == util.RESULTS:
+                # The docIds are written as the cursors produce them, the results are never held in memory
+                with open(results_file, 'w') as output_file:
+                    for i, plan in enumerate(plans):
+                        if i > 0:
+                            output_file.write("\n")
+                        util.write_query_plan(plan, dictionary, postings, output_file)
+                complete_result = None
+            else:
+                for plan in plans:
+                    complete_result.append(util.run_query_plan(plan, dictionary, postings, cache, mode, lazy))
+        if cache is not None:
+            cache_counts.append(cache.get_counts())
+    dictionary.close()
+    if wildcard_index is not None:
+        wildcard_index.close()
 
+    if complete_result is not None:
+        with open(results_file, 'w') as output_file:
             write_data = "\n".join(complete_result)
             output_file.write(write_data)
 
+    if cache_counts:
+        print(format_stats(cache_counts))
 
-dictionary_file = postings_file = file_of_queries = file_of_output = None
+def main():
+    """
+    Parses the command line and runs the search
+    """
+    dictionary_file = postings_file = file_of_queries = file_of_output = None
+    cache_size = DEFAULT_CACHE_SIZE
+    explain = False
+    batch = False
+    batch_cache_size = DEFAULT_BATCH_CACHE_SIZE
+    num_workers = None
+    max_expansion = permuterm.MAX_EXPANSION
+    mode = util.RESULTS
+    lazy = False
 
-try:
-    opts, args = getopt.getopt(sys.argv[1:], 'd:p:q:o:')
-except getopt.GetoptError:
-    usage()
-    sys.exit(2)
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'd:p:q:o:c:j:', ['explain', 'batch', 'batch-cache=', 'max-expansion=',
+                                                                    'count', 'exists', 'lazy'])
+    except getopt.GetoptError:
+        usage()
+        sys.exit(2)
 
-for o, a in opts:
-    if o == '-d':
-        dictionary_file  = a
-    elif o == '-p':
-        postings_file = a
-    elif o == '-q':
-        file_of_queries = a
-    elif o == '-o':
-        file_of_output = a
-    else:
-        assert False, "unhandled option"
+    for o, a in opts:
+        if o == '-d':
+            dictionary_file  = a
+        elif o == '-p':
+            postings_file = a
+        elif o == '-q':
+            file_of_queries = a
+        elif o == '-o':
+            file_of_output = a
+        elif o == '-c':
+            cache_size = int(float(a) * 1024 * 1024)
+        elif o == '-j':
+            num_workers = int(a)
+        elif o == '--explain':
+            explain = True
+        elif o == '--batch':
+            batch = True
+        elif o == '--batch-cache':
+            batch_cache_size = int(float(a) * 1024 * 1024)
+        elif o == '--max-expansion':
+            max_expansion = int(a)
+        elif o == '--count':
+            mode = util.COUNT
+        elif o == '--exists':
+            mode = util.EXISTS
+        elif o == '--lazy':
+            lazy = True
+        else:
+            assert False, "unhandled option"
+
+    if dictionary_file == None or postings_file == None or file_of_queries == None or file_of_output == None :
+        usage()
+        sys.exit(2)
+
+    run_search(dictionary_file, postings_file, file_of_queries, file_of_output, cache_size, explain, batch, batch_cache_size,
+               num_workers, max_expansion, mode, lazy)
 
-if dictionary_file == None or postings_file == None or file_of_queries == None or file_of_output == None :
-    usage()
-    sys.exit(2)
 
-run_search(dictionary_file, postings_file, file_of_queries, file_of_output)
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+from heapq import nsmallest
+
+from sketch import SKETCH_SIZE, load_sketch_file
+import util
+
+SHARDED_OFFSET = -2  # Offset of the terms of the dictionary of a sharded index, their postings are in the shards
+
+
+def get_shard_file(file_name, shard):
+    """
+    :return: file of a shard of a dictionary or postings file
+    """
+    return "%s.%d" % (file_name, shard)
+
+
+def split_documents(doc_ids, num_shards):
+    """
+    Splits the documents into docId ranges of about the same number of documents
+    :param doc_ids: sorted document ids
+    :param num_shards: number of shards
+    :return: list of the sorted document ids of every shard, empty shards are left out
+    """
+    shard_docs = []
+    for shard in range(num_shards):
+        docs = doc_ids[shard * len(doc_ids) // num_shards:(shard + 1) * len(doc_ids) // num_shards]
+        if docs:
+            shard_docs.append(docs)
+    return shard_docs
+
+
+def fold_shard(merged_terms, shard_dictionary):
+    """
+    Adds the terms of a shard to the terms of the whole index as soon as the shard is saved, so only one shard
+    dictionary is in memory at a time. The docFreqs are summed and only the smallest hashes of the sketches kept
+    :param merged_terms: {term: [documentFrequency, [smallest hashes]]} of the shards folded so far, updated
+    :param shard_dictionary: saved Dictionary of the shard as built by the indexer, with its sketches
+    """
+    sketches = load_sketch_file(shard_dictionary.disk_file)
+    try:
+        for term, (df, _, start) in shard_dictionary.get_terms().items():
+            values = sketches.get_sketch(start, df).values
+            entry = merged_terms.get(term)
+            if entry is None:
+                merged_terms[term] = [df, values]
+            else:
+                entry[0] += df
+                entry[1] = nsmallest(SKETCH_SIZE, entry[1] + values)
+    finally:
+        sketches.close()
+
+
+def merge_dictionaries(dictionary, merged_terms):
+    """
+    Adds the terms of all shards to the dictionary of the whole index, which is used to expand wildcards and
+    plan queries. Its docFreqs are the sums of the shards and its sketches the smallest hashes of the shard
+    sketches. It has no postings, so the offsets are SHARDED_OFFSET, which unlike -1 does not mean the term is absent
+    :param dictionary: empty Dictionary of the whole index
+    :param merged_terms: terms of all shards as folded by fold_shard
+    """
+    for term, (df, sketch_values) in merged_terms.items():
+        dictionary.add_term(term, df, SHARDED_OFFSET, sketch_values)
+
+
+def combine_results(shard_results, mode, reordered=False):
+    """
+    Combines the formatted results of one query on every shard. Shards cover increasing disjoint docId
+    ranges, so the docIds are concatenated without merging
+    :param shard_results: formatted results in shard order
+    :param mode: output mode, RESULTS, COUNT or EXISTS of util
+    :param reordered: if set, the results are original document ids which are sorted again since the
+    docId ranges of the shards do not map to ranges of original ids
+    :return: formatted result of the query on the whole index
+    """
+    if mode == util.COUNT:
+        return str(sum(int(result) for result in shard_results))
+    if mode == util.EXISTS:
+        return "true" if "true" in shard_results else "false"
+    if reordered:
+        return " ".join(map(str, sorted(int(doc_id) for result in shard_results for doc_id in result.split())))
+    return " ".join(result for result in shard_results if result)
@@ -0,0 +1,150 @@
+import mmap
+import os
+import struct
+from bisect import bisect_left
+from heapq import nsmallest
+
+MASK = (1 << 64) - 1
+HASH_BITS = 32  # Collisions between docIds are rare enough for estimates and halve the file compared to 64 bits
+HASH_RANGE = 1 << HASH_BITS
+SKETCH_SIZE = 64  # Smallest hashes kept per term. Terms in at most this many documents have an exact sketch
+HASH_VALUE = struct.Struct("<I")
+
+
+def hash_doc_id(doc_id):
+    """
+    Mixes a docId into a uniformly distributed hash [high bits of the splitmix64 finalizer]
+    :return: hash in [0, HASH_RANGE)
+    """
+    z = (doc_id + 0x9E3779B97F4A7C15) & MASK
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK
+    return (z ^ (z >> 31)) >> (64 - HASH_BITS)
+
+
+def make_sketch(doc_ids, size=SKETCH_SIZE):
+    """
+    :param doc_ids: document ids of a term
+    :param size: number of hashes kept
+    :return: sorted list of the smallest hashes of doc_ids
+    """
+    return nsmallest(size, map(hash_doc_id, doc_ids))
+
+
+def get_sketch_file(dict_file):
+    """
+    :return: file of the sketches of a dictionary file
+    """
+    return dict_file + ".sketch"
+
+
+class SketchWriter(object):
+    """
+    Writes the hashes of the sketches as unsigned 32 bit ints as the terms are added, a term finds its sketch
+    by its start index. Only the file buffer is held in memory, not the sketches of the whole vocabulary
+    """
+    def __init__(self, file_name):
+        self.file = open(file_name, 'wb')
+        self.count = 0  # Hashes written so far
+
+    def add(self, values):
+        """
+        :param values: hashes of the sketch of a term
+        :return: index of the first hash of the sketch
+        """
+        start = self.count
+        self.file.write(struct.pack("<%dI" % len(values), *values))
+        self.count += len(values)
+        return start
+
+    def close(self):
+        self.file.close()
+
+
+class Sketch(object):
+    """
+    K minimum values sketch of a set of documents: the hashes of its documents which are below threshold.
+    A sketch with threshold HASH_RANGE has the hashes of all documents and is exact.
+    Two sketches are combined below the smaller threshold, where both have all hashes of their set, so
+    AND, OR and AND NOT of the hashes are a uniform sample of the result and its size is estimated from
+    the fraction of the hash range below the threshold
+    """
+    def __init__(self, values, threshold=HASH_RANGE):
+        self.values = values  # Sorted hashes below threshold
+        self.threshold = threshold
+
+    @staticmethod
+    def from_values(values, df):
+        """
+        :param values: sorted smallest hashes of a term
+        :param df: document frequency of the term
+        :return: Sketch of the term
+        """
+        if df <= len(values):
+            return Sketch(values)
+        return Sketch(values, values[-1] + 1)
+
+    def estimate(self):
+        """
+        :return: estimated number of documents in the set
+        """
+        if self.threshold == HASH_RANGE:
+            return len(self.values)
+        return int(round(len(self.values) * HASH_RANGE / float(self.threshold)))
+
+    def combine(self, other, operation):
+        threshold = min(self.threshold, other.threshold)
+        first = set(self.values[:bisect_left(self.values, threshold)])
+        second = set(other.values[:bisect_left(other.values, threshold)])
+        values = sorted(operation(first, second))
+        if len(values) > SKETCH_SIZE:
+            values = values[:SKETCH_SIZE]
+            threshold = values[-1] + 1
+        return Sketch(values, threshold)
+
+    def and_(self, other):
+        return self.combine(other, set.intersection)
+
+    def or_(self, other):
+        return self.combine(other, set.union)
+
+    def and_not(self, other):
+        return self.combine(other, set.difference)
+
+
+class SketchFile(object):
+    """
+    Memory mapped sketch file
+    """
+    def __init__(self, file_name):
+        self.file = open(file_name, 'rb')
+        if os.path.getsize(file_name):
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.data = b""
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    def get_sketch(self, start, df):
+        """
+        :param start: index of the first hash of the sketch
+        :param df: document frequency of the term
+        :return: Sketch of the term
+        """
+        count = min(df, SKETCH_SIZE)
+        values = list(struct.unpack_from("<%dI" % count, self.data, start * HASH_VALUE.size))
+        return Sketch.from_values(values, df)
+
+
+def load_sketch_file(dict_file):
+    """
+    :param dict_file: dictionary file
+    :return: SketchFile written next to the dictionary, None if there is none
+    """
+    file_name = get_sketch_file(dict_file)
+    if not os.path.exists(file_name):
+        return None
+    return SketchFile(file_name)
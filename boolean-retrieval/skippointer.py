@@ -1,43 +1,125 @@
-from math import sqrt
-import pickle
+from math import exp, log, sqrt
+
+import planner
 import util
 
+ROOT_L = "ROOT_L"  # √L evenly spaced skips
+FIXED = "FIXED"  # Skip every stride postings
+ADAPTIVE = "ADAPTIVE"  # Stride of each term chosen from the lists it is intersected with in a query log
+SKIP_RULES = {"sqrt": ROOT_L, "fixed": FIXED, "adaptive": ADAPTIVE}  # Names used on the command line
+DEFAULT_STRIDE = 8
+
+
+def read_query_log(query_log):
+    """
+    Finds the terms each term is intersected with in a log of queries
+    Only terms which are direct operands of the same AND are counted, since the size of other operands is
+    not known before the index is built. Negated terms of an AND NOT are skipped through while walking the
+    positive operand, so the positive term is their partner
+    :param query_log: file with one query per line
+    :return: {term: [list of partner terms of one intersection]}
+    """
+    partners = {}
+
+    def add_partners(node):
+        if node.op == 'AND':
+            terms = [child.term for child in node.children if child.op == 'TERM']
+            if len(terms) > 1:
+                for term in terms:
+                    partners.setdefault(term, []).append([other for other in terms if other != term])
+        elif node.op == 'AND_NOT':
+            base = node.children[0]
+            if base.op == 'TERM':
+                for child in node.children[1:]:
+                    if child.op == 'TERM':
+                        partners.setdefault(child.term, []).append([base.term])
+        for child in node.children:
+            add_partners(child)
+
+    with open(query_log, 'r') as log_file:
+        for query in log_file:
+            if query.strip():
+                root = planner.build_tree(util.reverse_polish_expression(query))
+                if root is not None:
+                    add_partners(planner.simplify(root))
+
+    return partners
+
+
 class SkipPointer(object):
-    def __init__(self, rule):
+    def __init__(self, rule, stride=DEFAULT_STRIDE, query_log=None):
+        """
+        :param rule: ROOT_L, FIXED or ADAPTIVE
+        :param stride: postings between skips for FIXED
+        :param query_log: file of sample queries for ADAPTIVE
+        """
         self.rule = rule  # Rule to use for making skip pointers
+        self.stride = stride
+        self.partners = read_query_log(query_log) if rule == ADAPTIVE else {}  # Format : {term: [[partner terms]]}
+        self.doc_freqs = {}  # Format : {term: documentFrequency}, needed by ADAPTIVE
 
-    def get_length_of_skip(self, posting_list):
-        if self.rule == "ROOT_L":
-            return int(sqrt(len(posting_list)))  # Square root of length
+    def set_doc_freqs(self, doc_freqs):
+        """
+        :param doc_freqs: {term: documentFrequency} of every term in the index
+        """
+        self.doc_freqs = doc_freqs
 
-    def set_skip_for_posting_list(self, posting_file, temp_file, dictionary):
+    def get_length_of_skip(self, posting_list, term=None):
         """
+        :param posting_list: document ids or posting list of a term
+        :param term: normalised term of the list, used by ADAPTIVE
+        :return: number of postings between skips, at least 1
+        """
+        length = len(posting_list)
+        if self.rule == FIXED:
+            return max(self.stride, 1)
+        elif self.rule == ADAPTIVE and term in self.partners:
+            return self.get_adaptive_length_of_skip(length, self.partners[term])
+        else:
+            return max(int(sqrt(length)), 1)  # Square root of length
 
-        :param posting_file: posting file to store the Skip Posting List
-        :param temp_file:
-        :param dictionary: dictionary object to get and store offset
+    def get_adaptive_length_of_skip(self, length, intersections):
+        """
+        A list of length n walked for the m postings of a shorter list costs about n/L skip checks
+        plus m*L steps inside the skipped blocks, which is lowest at L = √(n/m).
+        √L is the special case m = 1. The stride is the geometric mean of the best stride of every
+        intersection of the term in the log, where m is the document frequency of the rarest partner.
+        If the partner is not shorter, the list drives the merge and gets no skips (one block).
+        Terms with no usable intersection in the log fall back to √L
+        :param length: length of the posting list
+        :param intersections: partner terms of each intersection of the term
+        :return: number of postings between skips
         """
-        with open(temp_file, 'rb') as f:
-            with open(posting_file, 'wb') as postings_disk:
-                # For all terms get the postings list and update their skip pointer
-                for term in dictionary.get_terms():
-                    offset = dictionary.get_offset_of_term(term)
-                    posting_list = util.get_posting_list(temp_file, offset)
+        log_sum = 0.0
+        count = 0
+        for partner_terms in intersections:
+            # Partners missing from the index make the intersection empty without walking the list
+            partner_lengths = [self.doc_freqs[term] for term in partner_terms if self.doc_freqs.get(term, 0) > 0]
+            if not partner_lengths:
+                continue
+            partner_length = min(partner_lengths)
+            if partner_length < length:
+                log_sum += log(max(sqrt(length / partner_length), 1))
+            else:
+                log_sum += log(length)
+            count += 1
 
-                    length_of_skip = self.get_length_of_skip(posting_list)
+        if count == 0:
+            return max(int(sqrt(length)), 1)
+        return max(int(round(exp(log_sum / count))), 1)
 
-                    temp_list = list(posting_list[0])
-                    temp_list[1] = length_of_skip
-                    posting_list[0] = tuple(temp_list)
-                    prev = length_of_skip
+    def get_skip_posting_list(self, doc_ids, term=None):
+        """
+        Builds the posting list with skip pointers for a sorted list of document ids
+        If skip_len is 5, skip index is set only for 0, 5, 10... etc and is 0 for the rest
+        :param doc_ids: sorted document ids of a term. E.g. [1, 10, 14]
+        :param term: normalised term of the list
+        :return: Posting list [(1, 1), (10, 2), (14, 3)]
+        """
+        length_of_skip = self.get_length_of_skip(doc_ids, term)
 
-                    # If skip_len is 5, update index only for 0, 5, 10... etc
-                    for i in range(length_of_skip, len(posting_list), length_of_skip):
-                        temp_list = list(posting_list[i])
-                        temp_list[1] = length_of_skip + prev
-                        posting_list[i] = tuple(temp_list)
-                        prev = posting_list[i][1]
+        posting_list = [(doc_id, 0) for doc_id in doc_ids]
+        for i in range(0, len(posting_list), length_of_skip):
+            posting_list[i] = (posting_list[i][0], i + length_of_skip)
 
-                    offset = postings_disk.tell()
-                    dictionary.update_offset(term, offset)
-                    pickle.dump(posting_list, postings_disk)
+        return posting_list
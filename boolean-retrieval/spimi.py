@@ -0,0 +1,128 @@
+import heapq
+import os
+import pickle
+import shutil
+import tempfile
+from itertools import groupby
+from operator import itemgetter
+
+from sketch import make_sketch
+
+# Rough CPython sizes used to estimate how much memory a block takes
+TERM_OVERHEAD = 200  # str object, list object and dict slot for a new term
+POSTING_OVERHEAD = 36  # list slot and int object for one docId
+
+
+class SpimiIndexer(object):
+    """
+    Single-pass in-memory indexer (SPIMI) with a bounded memory budget
+    Postings of a block of documents are accumulated in memory until the budget is reached,
+    the block is then sorted by term and spilled to disk as a run.
+    All runs are k-way merged into the final postings file with skip pointers added during the merge
+    Used as a context manager, so the directory of the runs is removed even if indexing fails
+    """
+    def __init__(self, memory_budget, skip_pointer, codec, temp_dir=None):
+        """
+        :param memory_budget: approximate number of bytes a block may use before it is spilled
+        :param skip_pointer: SkipPointer object used to add skip pointers while merging
+        :param codec: codec used to encode the posting lists in the postings file
+        :param temp_dir: directory in which the runs are created (system default if None)
+        """
+        self.memory_budget = memory_budget
+        self.skip_pointer = skip_pointer
+        self.codec = codec
+        self.run_dir = tempfile.mkdtemp(prefix="spimi_", dir=temp_dir)
+        self.runs = []  # File names of the spilled runs in document order
+        self.block = dict()  # Format : {term: [docId, ...]} for the current block
+        self.block_size = 0  # Estimated bytes used by the current block
+        self.doc_freqs = dict()  # Format : {term: documentFrequency} of all spilled blocks
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Removes the directory of the runs
+        """
+        shutil.rmtree(self.run_dir, ignore_errors=True)
+
+    def add_document(self, doc_id, terms):
+        """
+        Adds all terms of a document to the current block, spilling it if it goes over budget
+        Documents must be added in increasing docId order
+        :param doc_id: documentId of the terms
+        :param terms: normalised terms of the document
+        """
+        block = self.block
+        for term in terms:
+            doc_list = block.get(term)
+            if doc_list is None:
+                block[term] = [doc_id]
+                self.block_size += TERM_OVERHEAD + POSTING_OVERHEAD
+            elif doc_list[-1] != doc_id:
+                doc_list.append(doc_id)
+                self.block_size += POSTING_OVERHEAD
+
+        if self.block_size >= self.memory_budget:
+            self.spill()
+
+    def spill(self):
+        """
+        Writes the current block to disk as a run of (term, [docId]) records sorted by term
+        """
+        if not self.block:
+            return
+
+        run_file = os.path.join(self.run_dir, "run%d" % len(self.runs))
+        with open(run_file, 'wb') as f:
+            for term in sorted(self.block):
+                pickle.dump((term, self.block[term]), f, pickle.HIGHEST_PROTOCOL)
+                self.doc_freqs[term] = self.doc_freqs.get(term, 0) + len(self.block[term])
+
+        self.runs.append(run_file)
+        self.block = dict()
+        self.block_size = 0
+
+    def merge(self, out_postings, dictionary):
+        """
+        k-way merges all runs into the postings file, writing every posting list once with skip pointers
+        :param out_postings: postings file to write
+        :param dictionary: dictionary object in which terms, document frequency and offsets are added
+        """
+        self.spill()
+        # Skip rules which depend on other terms need their document frequencies before any list is written
+        self.skip_pointer.set_doc_freqs(self.doc_freqs)
+
+        run_files = [open(run_file, 'rb') for run_file in self.runs]
+        try:
+            # heapq.merge is stable so the doc lists of a term come out in run (document) order
+            records = heapq.merge(*[read_run(f) for f in run_files], key=itemgetter(0))
+            with open(out_postings, 'wb') as postings_disk:
+                postings_disk.write(self.codec.header)
+                for term, group in groupby(records, key=itemgetter(0)):
+                    doc_ids = []
+                    for _, run_doc_ids in group:
+                        doc_ids.extend(run_doc_ids)
+
+                    offset = postings_disk.tell()
+                    dictionary.add_term(term, len(doc_ids), offset, make_sketch(doc_ids))
+                    postings_disk.write(self.codec.encode(doc_ids, self.skip_pointer, term))
+        finally:
+            for f in run_files:
+                f.close()
+
+
+def read_run(run_file):
+    """
+    Reads the records of a run one at a time
+    :param run_file: opened run file
+    :return: generator of (term, [docId]) in term order
+    """
+    while True:
+        try:
+            yield pickle.load(run_file)
+        except EOFError:
+            return
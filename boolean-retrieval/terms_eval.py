@@ -1,30 +1,113 @@
-import util
+from heapq import heapify, heappop, heapreplace
 from math import sqrt
 
+import intersect
+from bitmap import Bitmap
+
 ALL_DOCS = "$all_docs$"
+HEAP_OR_MIN_OPERANDS = 8  # Operands from which the k-way OR beats merging two at a time, measured with benchmark.py -b or
+
+
+class Complement(object):
+    """
+    Lazy result of NOT. Stands for all documents except the ones in negated
+    It is only computed against $all_docs$ when the final result is needed, operators
+    rewrite it with De Morgan's laws and AND NOT instead
+    """
+    def __init__(self, negated):
+        self.negated = negated  # term or result list which is negated
+
 
-def eval_NOT(posting_file, dictionary, first):
+def eval_NOT(postings, dictionary, first):
     """
-    Evaluates NOT of first
-    :param posting_file: postings.txt disk file
+    Evaluates NOT of first lazily
+    :param postings: PostingsFile object of postings.txt
     :param dictionary: in memory dictionary
     :param first: term or result of which NOT needs to be done
-    :return: Result in format of posting list of NOT a
+    :return: Complement of first, or the negated result if first is itself a Complement
     """
-    result = list()
-    #  Get from posting if term otherwise use given result
-    if isinstance(first, str):
-        first_offset = dictionary.get_offset_of_term(first)
-        if first_offset != -1:
-            first_list = util.get_posting_list(posting_file, first_offset)
+    if isinstance(first, Complement):
+        return first.negated
+
+    return Complement(first)
+
+
+def materialize(postings, dictionary, result):
+    """
+    Gets the final posting list of a term or result
+    :param postings: PostingsFile object of postings.txt
+    :param dictionary: in memory dictionary
+    :param result: term, Complement, Bitmap or result list
+    :return: Result in format of posting list
+    """
+    if isinstance(result, Complement):
+        result = eval_complement(postings, dictionary, result.negated)
+
+    return get_list(postings, dictionary, result)
+
+
+def get_list(postings, dictionary, operand):
+    """
+    Gets the posting list of a term or result
+    :param postings: PostingsFile object of postings.txt
+    :param dictionary: in memory dictionary
+    :param operand: term, Bitmap or result list
+    :return: Result in format of posting list
+    """
+    if isinstance(operand, Bitmap):
+        return operand.to_posting_list()
+
+    if isinstance(operand, str):
+        offset = dictionary.get_offset_of_term(operand)
+        if offset != -1:
+            return postings.get_posting_list(offset)
         else:
-            first_list = []
-    else:
-        first_list = first
+            return []
+
+    return operand
+
+
+def get_bitmap(postings, dictionary, operand):
+    """
+    Gets a term stored as a bitmap or a bitmap result
+    :param postings: PostingsFile object of postings.txt
+    :param dictionary: in memory dictionary
+    :param operand: term, Bitmap or result list
+    :return: Bitmap or None if operand is a list or a term not stored as a bitmap
+    """
+    if isinstance(operand, Bitmap):
+        return operand
+
+    if isinstance(operand, str):
+        offset = dictionary.get_offset_of_term(operand)
+        if offset != -1:
+            return postings.get_bitmap(offset)
+
+    return None
+
+
+def eval_complement(postings, dictionary, first):
+    """
+    Computes NOT of first against all documents
+    Uses word level operations if all documents are stored as a bitmap
+    :param postings: PostingsFile object of postings.txt
+    :param dictionary: in memory dictionary
+    :param first: term or result of which NOT needs to be done
+    :return: Result in format of posting list or Bitmap of NOT a
+    """
+    all_docs_bitmap = get_bitmap(postings, dictionary, ALL_DOCS)
+    if all_docs_bitmap is not None:
+        first_bitmap = get_bitmap(postings, dictionary, first)
+        if first_bitmap is None:
+            first_bitmap = Bitmap.from_posting_list(get_list(postings, dictionary, first))
+        return all_docs_bitmap.and_not(first_bitmap)
+
+    result = list()
+    first_list = get_list(postings, dictionary, first)
 
     all_docs_offset = dictionary.get_offset_of_term(ALL_DOCS)
     if all_docs_offset != -1:
-        all_docs_list = util.get_posting_list(posting_file, all_docs_offset)
+        all_docs_list = postings.get_posting_list(all_docs_offset)
     else:
         all_docs_list = []
 
@@ -49,22 +132,40 @@ def eval_NOT(posting_file, dictionary, first):
 
     return result
 
-def eval_OR(posting_file, dictionary, first, second):
+def eval_OR(postings, dictionary, first, second):
     """
     Evaluates first OR second  [can be term or direct result]
-    :param posting_file: postings.txt disk file
+    :param postings: PostingsFile object of postings.txt
     :param dictionary: in memory dictionary
     :param first: term or result of which OR needs to be done
     :param second: term or result of which OR needs to be done
     :return: Result in format of posting list of a OR B
     """
+    # NOT a OR NOT b = NOT (a AND b) and NOT a OR b = NOT (a AND NOT b)
+    if isinstance(first, Complement) and isinstance(second, Complement):
+        return Complement(eval_AND(postings, dictionary, first.negated, second.negated))
+    elif isinstance(first, Complement):
+        return Complement(eval_AND_NOT(postings, dictionary, first.negated, second))
+    elif isinstance(second, Complement):
+        return Complement(eval_AND_NOT(postings, dictionary, second.negated, first))
+
+    # Word level OR if any side is a bitmap, the other side is converted since the union is at least as dense
+    first_bitmap = get_bitmap(postings, dictionary, first)
+    second_bitmap = get_bitmap(postings, dictionary, second)
+    if first_bitmap is not None or second_bitmap is not None:
+        if first_bitmap is None:
+            first_bitmap = Bitmap.from_posting_list(get_list(postings, dictionary, first))
+        if second_bitmap is None:
+            second_bitmap = Bitmap.from_posting_list(get_list(postings, dictionary, second))
+        return first_bitmap.or_(second_bitmap)
+
     result = list()
 
     #  Get from posting if term otherwise use given result
     if isinstance(first, str):
         first_offset = dictionary.get_offset_of_term(first)
         if first_offset != -1:
-            first_list = util.get_posting_list(posting_file, first_offset)
+            first_list = postings.get_posting_list(first_offset)
         else:
             first_list = []
     else:
@@ -73,7 +174,7 @@ def eval_OR(posting_file, dictionary, first, second):
     if isinstance(second, str):
         second_offset = dictionary.get_offset_of_term(second)
         if second_offset != -1:
-            second_list = util.get_posting_list(posting_file, second_offset)
+            second_list = postings.get_posting_list(second_offset)
         else:
             second_list = []
     else:
@@ -109,49 +210,121 @@ def eval_OR(posting_file, dictionary, first, second):
 
     return result
 
-def eval_AND(posting_file, dictionary, first, second):
+def eval_OR_Many(postings, dictionary, operands):
+    """
+    Evaluates the OR of any number of operands in one pass [k-way merge with a min heap of the list heads]
+    Merging two lists at a time copies the growing result once per operand, the heap merge copies every posting once
+    :param postings: PostingsFile object of postings.txt
+    :param dictionary: in memory dictionary
+    :param operands: list of terms or results of which OR needs to be done
+    :return: Result in format of posting list of a OR b OR c...
+    """
+    # NOT a OR NOT b OR c = NOT ((a AND b) AND NOT c)
+    negated = [operand.negated for operand in operands if isinstance(operand, Complement)]
+    if negated:
+        positive = [operand for operand in operands if not isinstance(operand, Complement)]
+        result = negated[0]
+        for operand in negated[1:]:
+            result = eval_AND(postings, dictionary, result, operand)
+        if positive:
+            result = eval_AND_NOT(postings, dictionary, result, eval_OR_Many(postings, dictionary, positive))
+        return Complement(result)
+
+    # Word level OR if any operand is a bitmap, the lists are converted since the union is at least as dense
+    bitmaps = [get_bitmap(postings, dictionary, operand) for operand in operands]
+    if any(bitmap is not None for bitmap in bitmaps):
+        result = Bitmap()
+        for operand, bitmap in zip(operands, bitmaps):
+            if bitmap is None:
+                bitmap = Bitmap.from_posting_list(get_list(postings, dictionary, operand))
+            result = result.or_(bitmap)
+        return result
+
+    lists = [get_list(postings, dictionary, operand) for operand in operands]
+    heap = [(posting_list[0][0], i) for i, posting_list in enumerate(lists) if posting_list]
+    heapify(heap)
+    positions = [0] * len(lists)
+
+    result = list()
+    last_doc_id = -1
+    while heap:
+        doc_id, i = heap[0]
+        posting_list = lists[i]
+        if doc_id != last_doc_id:
+            result.append(posting_list[positions[i]])
+            last_doc_id = doc_id
+
+        positions[i] += 1
+        if positions[i] < len(posting_list):
+            heapreplace(heap, (posting_list[positions[i]][0], i))
+        else:
+            heappop(heap)
+
+    return result
+
+
+def eval_AND(postings, dictionary, first, second):
     """
     Evaluates first AND second  [can be term or direct result]
     Uses skip pointer if one of argument is directly a posting list with correct skips
-    :param posting_file: postings.txt disk file
+    :param postings: PostingsFile object of postings.txt
     :param dictionary: in memory dictionary
     :param first: term or result of which AND needs to be done
     :param second: term or result of which AND needs to be done
     :return: Result in format of posting list of a AND B
     """
+    # NOT a AND NOT b = NOT (a OR b) and NOT a AND b = b AND NOT a
+    if isinstance(first, Complement) and isinstance(second, Complement):
+        return Complement(eval_OR(postings, dictionary, first.negated, second.negated))
+    elif isinstance(first, Complement):
+        return eval_AND_NOT(postings, dictionary, second, first.negated)
+    elif isinstance(second, Complement):
+        return eval_AND_NOT(postings, dictionary, first, second.negated)
+
+    # Word level AND of two bitmaps, a list is filtered by lookups in the bitmap
+    first_bitmap = get_bitmap(postings, dictionary, first)
+    second_bitmap = get_bitmap(postings, dictionary, second)
+    if first_bitmap is not None and second_bitmap is not None:
+        return first_bitmap.and_(second_bitmap)
+    elif first_bitmap is not None:
+        return first_bitmap.filter(get_list(postings, dictionary, second))
+    elif second_bitmap is not None:
+        return second_bitmap.filter(get_list(postings, dictionary, first))
+
     result = list()
 
     # Based on if its a term or intermediate result find the posting list and use skip pointer if possible
     if not isinstance(first, str) and not isinstance(second, str):
         result = eval_AND_Lists(first, second)
     elif isinstance(first, str) and not isinstance(second, str):
-        offset = dictionary.get_offset_of_term(first)
-        if offset != -1:
-            term_list = util.get_posting_list(posting_file, offset)
-        else:
-            term_list = []
-        result = eval_AND_List_And_Term(second, term_list)
+        result = eval_AND_List_And_Stored_Term(postings, dictionary, second, first)
     elif not isinstance(first, str) and isinstance(second, str):
-        offset = dictionary.get_offset_of_term(second)
+        result = eval_AND_List_And_Stored_Term(postings, dictionary, first, second)
+    elif postings.compressed:
+        # Decode the shorter list and skip through the longer one without decoding the skipped blocks
+        if dictionary.get_df(first) > dictionary.get_df(second):
+            first, second = second, first
+        offset = dictionary.get_offset_of_term(first)
         if offset != -1:
-            term_list = util.get_posting_list(posting_file, offset)
-        else:
-            term_list = []
-        result = eval_AND_List_And_Term(first, term_list)
+            result = eval_AND_List_And_Stored_Term(postings, dictionary, postings.get_posting_list(offset), second)
     else:
 
         first_offset = dictionary.get_offset_of_term(first)
         if first_offset != -1:
-            first_list = util.get_posting_list(posting_file, first_offset)
+            first_list = postings.get_posting_list(first_offset)
         else:
             first_list = []
 
         second_offset = dictionary.get_offset_of_term(second)
         if second_offset != -1:
-            second_list = util.get_posting_list(posting_file, second_offset)
+            second_list = postings.get_posting_list(second_offset)
         else:
             second_list = []
 
+        strategy = intersect.select_strategy(len(first_list), len(second_list))
+        if strategy != "skip":
+            return intersect.intersect(first_list, second_list, strategy)
+
         idx_f = 0
         idx_s = 0
 
@@ -184,43 +357,12 @@ def eval_AND(posting_file, dictionary, first, second):
 def eval_AND_Lists(first_list, second_list):
     """
     Evaluates first_list AND second_list  [is direct result and hence no skip pointer]
+    The intersection algorithm is chosen from the ratio of the list lengths
     :param first_list: list of which AND needs to be done
     :param second_list: list of which AND needs to be done
     :return: Result in format of posting list of list() AND list()
     """
-
-    result = list()
-    idx_f = 0
-    idx_s = 0
-
-    len_first_list = len(first_list)
-    len_second_list = len(second_list)
-
-    skip_first_list = int(sqrt(len_first_list))
-    skip_second_list = int(sqrt(len_second_list))
-
-    while idx_f < len_first_list and idx_s < len_second_list:
-        first_doc_id = first_list[idx_f][0]
-        second_doc_id = second_list[idx_s][0]
-
-        first_skip_idx = idx_f + skip_first_list
-        second_skip_idx = idx_s + skip_second_list
-        if first_doc_id == second_doc_id:
-            result.append(first_list[idx_f])
-            idx_f += 1
-            idx_s += 1
-        elif first_doc_id < second_doc_id:
-            if first_skip_idx != 0 and first_skip_idx < len_first_list and first_list[first_skip_idx][0] <= second_doc_id:
-                idx_f = first_skip_idx
-            else:
-                idx_f += 1
-        else:
-            if second_skip_idx != 0 and second_skip_idx < len_second_list and second_list[second_skip_idx][0] <= first_doc_id:
-                idx_s = second_skip_idx
-            else:
-                idx_s += 1
-
-    return result
+    return intersect.intersect(first_list, second_list)
 
 
 def eval_AND_List_And_Term(res_list, term_list):
@@ -230,6 +372,11 @@ def eval_AND_List_And_Term(res_list, term_list):
     :param term_list: term of which AND needs to be done. skip can be used for this
     :return: Result in format of posting list of list() AND term
     """
+    # Searching in the longer list beats following its skip pointers if the lengths are skewed
+    strategy = intersect.select_strategy(len(res_list), len(term_list))
+    if strategy != "skip":
+        return intersect.intersect(res_list, term_list, strategy)
+
     result = list()
     idx_f = 0
     idx_s = 0
@@ -257,15 +404,71 @@ def eval_AND_List_And_Term(res_list, term_list):
     return result
 
 
-def eval_AND_NOT(posting_file, dictionary, first, second):
+def eval_AND_List_And_Stored_Term(postings, dictionary, res_list, term):
+    """
+    Evaluates res_list AND term where the posting list of term is read from the postings file
+    Skips through the compressed list block by block if possible, otherwise uses the stored skip pointers
+    :param postings: PostingsFile object of postings.txt
+    :param dictionary: in memory dictionary
+    :param res_list: list of which AND needs to be done
+    :param term: term of which AND needs to be done
+    :return: Result in format of posting list of list() AND term
+    """
+    offset = dictionary.get_offset_of_term(term)
+    if offset == -1:
+        return []
+
+    if postings.compressed:
+        return eval_AND_List_And_Encoded(res_list, postings.get_encoded_posting_list(offset))
+
+    return eval_AND_List_And_Term(res_list, postings.get_posting_list(offset))
+
+
+def eval_AND_List_And_Encoded(res_list, encoded_list):
+    """
+    Evaluates res_list AND encoded_list [blocks of encoded_list with no match are skipped without decoding]
+    :param res_list: list of which AND needs to be done
+    :param encoded_list: EncodedPostingList of a term
+    :return: Result in format of posting list of list() AND term
+    """
+    result = list()
+    cursor = encoded_list.cursor()
+
+    for posting in res_list:
+        doc_id = cursor.skip_to(posting[0])
+        if doc_id is None:
+            break
+        if doc_id == posting[0]:
+            result.append(posting)
+
+    return result
+
+
+def eval_AND_NOT(postings, dictionary, first, second):
     """
     first AND NOT second [using skip pointer]
-    :param posting_file: postings.txt
+    :param postings: PostingsFile object of postings.txt
     :param dictionary: Dictionary object in memory
     :param first: first postings list
     :param second: second postings list
     :return: merged list
     """
+    # a AND NOT NOT b = a AND b and NOT a AND NOT b = NOT (a OR b)
+    if isinstance(second, Complement):
+        return eval_AND(postings, dictionary, first, second.negated)
+    elif isinstance(first, Complement):
+        return Complement(eval_OR(postings, dictionary, first.negated, second))
+
+    # Word level AND NOT if first is a bitmap, otherwise first is filtered by lookups in the bitmap of second
+    first_bitmap = get_bitmap(postings, dictionary, first)
+    second_bitmap = get_bitmap(postings, dictionary, second)
+    if first_bitmap is not None:
+        if second_bitmap is None:
+            second_bitmap = Bitmap.from_posting_list(get_list(postings, dictionary, second))
+        return first_bitmap.and_not(second_bitmap)
+    elif second_bitmap is not None:
+        return second_bitmap.filter(get_list(postings, dictionary, first), False)
+
     result = list()
 
     # If the term being NOT is a string then we use skip pointer otherwise we cant since its intermediate result
@@ -274,7 +477,7 @@ def eval_AND_NOT(posting_file, dictionary, first, second):
     elif isinstance(first, str) and not isinstance(second, str):
         offset = dictionary.get_offset_of_term(first)
         if offset != -1:
-            term_list = util.get_posting_list(posting_file, offset)
+            term_list = postings.get_posting_list(offset)
         else:
             term_list = []
         result = eval_AND_NOT_Lists(term_list, second)
@@ -282,15 +485,17 @@ def eval_AND_NOT(posting_file, dictionary, first, second):
         if isinstance(first, str):
             first_offset = dictionary.get_offset_of_term(first)
             if first_offset != -1:
-                first_list = util.get_posting_list(posting_file, first_offset)
+                first_list = postings.get_posting_list(first_offset)
             else:
                 first_list = []
         else:
             first_list = first
 
         second_offset = dictionary.get_offset_of_term(second)
-        if second_offset != -1:
-            second_list = util.get_posting_list(posting_file, second_offset)
+        if second_offset != -1 and postings.compressed:
+            return eval_AND_NOT_List_And_Encoded(first_list, postings.get_encoded_posting_list(second_offset))
+        elif second_offset != -1:
+            second_list = postings.get_posting_list(second_offset)
         else:
             second_list = []
 
@@ -324,6 +529,23 @@ def eval_AND_NOT(posting_file, dictionary, first, second):
     return result
 
 
+def eval_AND_NOT_List_And_Encoded(first_list, encoded_list):
+    """
+    first_list AND NOT encoded_list [blocks of encoded_list with no match are skipped without decoding]
+    :param first_list: first postings list
+    :param encoded_list: EncodedPostingList of the term being NOT
+    :return: merged list
+    """
+    result = list()
+    cursor = encoded_list.cursor()
+
+    for posting in first_list:
+        if cursor.skip_to(posting[0]) != posting[0]:
+            result.append(posting)
+
+    return result
+
+
 def eval_AND_NOT_Lists(first_list, second_list):
     """
     first_list AND NOT second_list [not using skip pointer]
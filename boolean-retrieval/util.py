@@ -1,21 +1,16 @@
 import nltk
 import os
+import re
+import counting
+import cursors
+import permuterm
+import planner
 import terms_eval
-import pickle
 
 STEMMER = nltk.stem.porter.PorterStemmer()
-
-
-def get_posting_list(posting_file, offset):
-    """
-    Gets posting list for a given offset in file
-    :param posting_file: postings.txt disk file
-    :param offset: the offset to seek to in file
-    :return: Posting list [(1, 0), (10,0)]
-    """
-    with open(posting_file, 'rb') as file:
-        file.seek(offset)
-        return pickle.load(file)
+RESULTS = "RESULTS"  # Output modes of search: docIds of the matching documents,
+COUNT = "COUNT"  # number of matching documents,
+EXISTS = "EXISTS"  # or if any document matches
 
 
 def read_document(directory, doc):
@@ -36,21 +31,59 @@ def read_document(directory, doc):
 
         return terms
 
-def reverse_polish_expression(query):
+
+def tokenize_query(query):
+    """
+    Tokenizes a query keeping wildcard patterns like contract* as one token
+    :param query: Query to evaluate. E.g. contract* AND NOT (a OR b)
+    :return: list of tokens
+    """
+    query_tokens = []
+    for part in re.split(r"([^\s()]*\*[^\s()]*)", query):
+        if permuterm.is_wildcard(part):
+            query_tokens.append(part)
+        elif part.strip():
+            query_tokens.extend(nltk.tokenize.word_tokenize(part))
+    return query_tokens
+
+def expand_wildcard(pattern, wildcard_index, max_expansion):
+    """
+    Expands a wildcard pattern into an OR of the matching terms
+    Patterns are matched against the normalised terms, so they are lower cased but not stemmed
+    :param pattern: wildcard token of the query. E.g. contract*
+    :param wildcard_index: PermutermIndex of the dictionary or None
+    :param max_expansion: most terms the pattern is expanded into
+    :return: postfix expression. E.g. contract contractor OR
+    """
+    pattern = pattern.lower()
+    terms = wildcard_index.expand(pattern, max_expansion) if wildcard_index is not None else []
+    if len(terms) == 0:
+        return [pattern]  # Not a term of the dictionary, so matches no documents
+
+    postfix_expression = [terms[0]]
+    for term in terms[1:]:
+        postfix_expression.extend([term, 'OR'])
+    return postfix_expression
+
+def reverse_polish_expression(query, wildcard_index=None, max_expansion=permuterm.MAX_EXPANSION):
     """
     Converts the input query to a postfix expression using Shunting yard algorithm
     :param query: Query to evaluate. E.g. a AND b
+    :param wildcard_index: PermutermIndex used to expand wildcard tokens, None if not available
+    :param max_expansion: most terms a wildcard token is expanded into
     :return: Postfix expression of query. E.g. a b AND
     """
 
-    query_tokens = nltk.tokenize.word_tokenize(query)
+    query_tokens = tokenize_query(query)
     postfix_expression = []
     temp_stack = []
     OPERATORS = ['NOT', 'AND', 'OR']
     BRACKETS = ['(', ')']
 
     for query_token in query_tokens:
-        if query_token not in OPERATORS and (query_token not in BRACKETS):
+        if permuterm.is_wildcard(query_token):
+            postfix_expression.extend(expand_wildcard(query_token, wildcard_index, max_expansion))
+        elif query_token not in OPERATORS and (query_token not in BRACKETS):
             postfix_expression.append(STEMMER.stem(query_token).lower())
         elif query_token == 'NOT':
             temp_stack.append(query_token)
@@ -75,69 +108,147 @@ def reverse_polish_expression(query):
     return postfix_expression
 
 
-def execute_query(query, dictionary, posting_file):
+def execute_query(query, dictionary, postings, cache=None):
     """
-    Computes the result of the user query
+    Computes the result of the user query using the cost based plan of planner.py
     :param query: Postfix expression
     :param dictionary: in memory dictionary object
-    :param posting_file:
+    :param postings: PostingsFile object of postings.txt
+    :param cache: QueryCache of sub-expressions shared by a batch of queries, or None
     :return: final result in posting list format
     """
+    return execute_query_plan(planner.plan_query(query, dictionary), dictionary, postings, cache)
 
-    OPERATORS = ['NOT', 'AND', 'OR']
-    operands = []
-    len_query = len(query)
-
-    i = 0
-    while i < len_query:
-        token = query[i]
-        if token not in OPERATORS:
-            operands.append(token)
-
-        elif len(operands) > 0:
-            intermediate_result = []
-            if token == 'NOT':
-                term = operands.pop()
-                #  optimize for AND NOT queries
-                if i < len_query - 1 and len(operands) > 0 and query[i+1] == "AND":
-                    i += 1
-                    later_term = operands.pop()
-                    intermediate_result = terms_eval.eval_AND_NOT(posting_file, dictionary, later_term, term)
-                else:
-                    intermediate_result = terms_eval.eval_NOT(posting_file, dictionary, term)
-            elif token == 'AND':
-                first = operands.pop()
-                second = operands.pop()
-                intermediate_result = terms_eval.eval_AND(posting_file, dictionary, first, second)
-            elif token == 'OR':
-                first = operands.pop()
-                second = operands.pop()
-                intermediate_result = terms_eval.eval_OR(posting_file, dictionary, first, second)
-            operands.append(intermediate_result)
-
-        i += 1
-
-    final_result = operands.pop()
-    if isinstance(final_result, str):
-        first_offset = dictionary.get_offset_of_term(final_result)
-        if first_offset != -1:
-            final_result = get_posting_list(posting_file, first_offset)
-        else:
-            final_result = []
 
-    return final_result
+def execute_query_plan(plan, dictionary, postings, cache=None):
+    """
+    Computes the result of a query plan
+    :param plan: root QueryNode of the plan or None
+    :param dictionary: in memory dictionary object
+    :param postings: PostingsFile object of postings.txt
+    :param cache: QueryCache of sub-expressions shared by a batch of queries, or None
+    :return: final result in posting list format
+    """
+    if plan is None:
+        return []
+
+    # NOT is only computed against all documents here, if the final result is still negated
+    final_result = planner.execute_plan(plan, dictionary, postings, cache)
+    return terms_eval.materialize(postings, dictionary, final_result)
 
 
-def format_result(result):
+def count_query_plan(plan, dictionary, postings, cache=None):
+    """
+    Counts the documents matching a query plan without building the final result list
+    :param plan: root QueryNode of the plan or None
+    :param dictionary: in memory dictionary object
+    :param postings: PostingsFile object of postings.txt
+    :param cache: QueryCache of sub-expressions shared by a batch of queries, or None
+    :return: number of documents in the result
+    """
+    if plan is None:
+        return 0
+
+    return counting.count_plan(plan, dictionary, postings, cache)
+
+
+def exists_query_plan(plan, dictionary, postings, cache=None):
+    """
+    Checks if any document matches a query plan, stopping at the first match
+    :param plan: root QueryNode of the plan or None
+    :param dictionary: in memory dictionary object
+    :param postings: PostingsFile object of postings.txt
+    :param cache: QueryCache of sub-expressions shared by a batch of queries, or None
+    :return: True if the result is not empty
+    """
+    if plan is None:
+        return False
+
+    return counting.exists_plan(plan, dictionary, postings, cache)
+
+
+def iter_query_plan(plan, dictionary, postings):
+    """
+    Evaluates a query plan lazily with cursors, no intermediate result list is built
+    :param plan: root QueryNode of the plan or None
+    :param dictionary: in memory dictionary object
+    :param postings: PostingsFile object of postings.txt
+    :return: generator of the docIds of the result in sorted order
+    """
+    if plan is None:
+        return iter(())
+
+    return cursors.iter_doc_ids(cursors.build_cursor(plan, dictionary, postings))
+
+
+def write_query_plan(plan, dictionary, postings, output_file):
+    """
+    Streams the docIds of a query plan to the output file as the cursors produce them
+    :param plan: root QueryNode of the plan or None
+    :param dictionary: in memory dictionary object
+    :param postings: PostingsFile object of postings.txt
+    :param output_file: file opened for writing
+    """
+    if dictionary.get_doc_ids() is not None:
+        # The original ids are not in docId order, so the result has to be collected and sorted
+        output_file.write(format_doc_ids(iter_query_plan(plan, dictionary, postings), dictionary.get_doc_ids()))
+        return
+
+    separator = ""
+    for doc_id in iter_query_plan(plan, dictionary, postings):
+        output_file.write(separator + str(doc_id))
+        separator = " "
+
+
+def format_doc_ids(doc_id_iterable, doc_ids=None):
+    """
+    :param doc_id_iterable: docIds in increasing order
+    :param doc_ids: original document ids by docId - 1 if the documents were reordered, or None
+    :return: formatted string of the (original) document ids in increasing order
+    """
+    if doc_ids is not None:
+        return " ".join(map(str, sorted(doc_ids[doc_id - 1] for doc_id in doc_id_iterable)))
+    return " ".join(map(str, doc_id_iterable))
+
+
+def run_query_plan(plan, dictionary, postings, cache=None, mode=RESULTS, lazy=False):
+    """
+    Evaluates a query plan in one of the output modes
+    :param plan: root QueryNode of the plan or None
+    :param dictionary: in memory dictionary object
+    :param postings: PostingsFile object of postings.txt
+    :param cache: QueryCache of sub-expressions shared by a batch of queries, or None
+    :param mode: RESULTS for the docIds, COUNT for the number of documents, EXISTS for true or false
+    :param lazy: if set, the docIds are pulled through cursors instead of merging lists
+    :return: formatted line of the output file
+    """
+    if mode == COUNT:
+        return str(count_query_plan(plan, dictionary, postings, cache))
+    if mode == EXISTS:
+        return "true" if exists_query_plan(plan, dictionary, postings, cache) else "false"
+    if lazy:
+        return format_doc_ids(iter_query_plan(plan, dictionary, postings), dictionary.get_doc_ids())
+    if plan is None:
+        return ""
+
+    return format_result(execute_query_plan(plan, dictionary, postings, cache), dictionary.get_doc_ids())
+
+
+def format_result(result, doc_ids=None):
     """
     Formats result as required for output file
     :param result: In format [(1, 0), (10, 0)]
+    :param doc_ids: original document ids by docId - 1 if the documents were reordered, the result is then
+    printed with the original ids in increasing order
     :return: '1 10' formatted string
     """
     formatted_res = list()
     for val in result:
         formatted_res.append(val[0])
 
+    if doc_ids is not None:
+        formatted_res = sorted(doc_ids[doc_id - 1] for doc_id in formatted_res)
+
     formatted_res = " ".join(map(str, formatted_res))
     return formatted_res
 
@@ -0,0 +1,248 @@
+import mmap
+import pickle
+import struct
+from collections import OrderedDict
+from operator import itemgetter
+
+MAGIC = b"LEX\x01"  # Header of a lexicon file. Pickled dictionaries start with b"\x80"
+HEADER = struct.Struct("<IIIQQQQ")  # Terms, fields, terms per block, values, block index, terms and meta offsets
+BLOCK_OFFSET = struct.Struct("<Q")
+TERMS_PER_BLOCK = 16  # Terms front coded against the first term of their block
+CACHE_SIZE = 4096  # Terms whose values a Lexicon keeps, the least recently looked up are dropped first
+
+
+def encode_number(number, out):
+    """
+    Appends the variable byte encoding of a number to out, with the high bit set on the last byte
+    """
+    encoded = [number & 127]
+    number >>= 7
+    while number:
+        encoded.append(number & 127)
+        number >>= 7
+    encoded[0] |= 128
+    out.extend(reversed(encoded))
+
+
+def decode_number(data, pos):
+    """
+    :return: (number at pos, index of the byte after it)
+    """
+    number = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        if byte < 128:
+            number = (number << 7) | byte
+        else:
+            return (number << 7) | (byte - 128), pos
+
+
+def write_lexicon(file_name, entries, num_fields, meta=None, terms_per_block=TERMS_PER_BLOCK):
+    """
+    Writes a lexicon file. Layout: MAGIC, header, values, block index, terms, meta
+    Values are num_fields signed 64 bit ints per term in term order, so the values of the i-th term are at a fixed offset.
+    Terms are sorted by their UTF-8 bytes and front coded in blocks: the first term of a block is stored in full,
+    the others as the length of the prefix shared with the previous term and the rest of the term.
+    The block index has the offset of every block so a term is found by binary search on the first terms of the blocks
+    :param file_name: lexicon file to write
+    :param entries: iterable of (term, [field values]) in any order
+    :param num_fields: number of values of every term
+    :param meta: picklable object stored after the terms, e.g. document lengths
+    :param terms_per_block: number of terms in a front coded block
+    """
+    entries = sorted(((term.encode('utf8'), values) for term, values in entries), key=itemgetter(0))
+
+    values = []
+    for _, term_values in entries:
+        values.extend(term_values)
+
+    terms = bytearray()
+    block_offsets = []
+    prev_term = b""
+    for i, (term, _) in enumerate(entries):
+        if i % terms_per_block == 0:
+            block_offsets.append(len(terms))
+            encode_number(len(term), terms)
+            terms.extend(term)
+        else:
+            shared = 0
+            max_shared = min(len(prev_term), len(term))
+            while shared < max_shared and prev_term[shared] == term[shared]:
+                shared += 1
+            encode_number(shared, terms)
+            encode_number(len(term) - shared, terms)
+            terms.extend(term[shared:])
+        prev_term = term
+
+    values_start = len(MAGIC) + HEADER.size
+    block_index_start = values_start + 8 * len(values)
+    terms_start = block_index_start + BLOCK_OFFSET.size * len(block_offsets)
+    meta_start = terms_start + len(terms)
+
+    with open(file_name, 'wb') as f:
+        f.write(MAGIC)
+        f.write(HEADER.pack(len(entries), num_fields, terms_per_block,
+                            values_start, block_index_start, terms_start, meta_start))
+        f.write(struct.pack("<%dq" % len(values), *values))
+        f.write(b"".join(BLOCK_OFFSET.pack(terms_start + offset) for offset in block_offsets))
+        f.write(terms)
+        pickle.dump(meta, f)
+
+
+def is_lexicon(file_name):
+    """
+    :return: True if the file is a lexicon, False if it is a pickled dictionary
+    """
+    with open(file_name, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class Lexicon(object):
+    """
+    Read only mapping of term to its values, memory mapped from a lexicon file
+    Opening only reads the header, and a lookup binary searches the block index
+    and decodes one block, so only a few pages of the file are touched
+    """
+    def __init__(self, file_name, fields=None, cache_size=CACHE_SIZE):
+        """
+        :param file_name: lexicon file
+        :param fields: names of the values. If given, a lookup returns a dict of them instead of a tuple
+        :param cache_size: number of looked up terms whose values are kept
+        """
+        self.file = open(file_name, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        (self.num_terms, self.num_fields, self.terms_per_block, self.values_start,
+         self.block_index_start, self.terms_start, self.meta_start) = HEADER.unpack_from(self.data, len(MAGIC))
+        self.num_blocks = (self.num_terms + self.terms_per_block - 1) // self.terms_per_block
+        self.values_format = struct.Struct("<%dq" % self.num_fields)
+        self.fields = fields
+        self.cache = OrderedDict()  # Format : {term: values or None} in least to most recently looked up order
+        self.cache_size = cache_size
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def get_meta(self):
+        """
+        :return: object stored after the terms
+        """
+        return pickle.loads(self.data[self.meta_start:])
+
+    def get_block_offset(self, block):
+        return BLOCK_OFFSET.unpack_from(self.data, self.block_index_start + block * BLOCK_OFFSET.size)[0]
+
+    def get_first_term(self, block):
+        """
+        :return: UTF-8 bytes of the first term of a block
+        """
+        length, pos = decode_number(self.data, self.get_block_offset(block))
+        return self.data[pos:pos + length]
+
+    def find_block(self, key):
+        """
+        :param key: UTF-8 bytes of a term
+        :return: last block whose first term is <= key, -1 if key is before all terms
+        """
+        low, high = 0, self.num_blocks
+        while low < high:
+            mid = (low + high) // 2
+            if self.get_first_term(mid) <= key:
+                low = mid + 1
+            else:
+                high = mid
+        return low - 1
+
+    def find(self, term):
+        """
+        :param term: normalised term
+        :return: index of the term in sorted order, -1 if not present
+        """
+        key = term.encode('utf8')
+        block = self.find_block(key)
+        if block < 0:
+            return -1
+
+        data = self.data
+        index = block * self.terms_per_block
+        last = min(index + self.terms_per_block, self.num_terms)
+        length, pos = decode_number(data, self.get_block_offset(block))
+        current = data[pos:pos + length]
+        pos += length
+        while current < key and index + 1 < last:
+            shared, pos = decode_number(data, pos)
+            length, pos = decode_number(data, pos)
+            current = current[:shared] + data[pos:pos + length]
+            pos += length
+            index += 1
+
+        return index if current == key else -1
+
+    def get_values(self, index):
+        values = self.values_format.unpack_from(self.data, self.values_start + index * self.values_format.size)
+        if self.fields is not None:
+            return dict(zip(self.fields, values))
+        return values
+
+    def get(self, term, default=None):
+        if term in self.cache:
+            self.cache.move_to_end(term)
+            values = self.cache[term]
+        else:
+            index = self.find(term)
+            values = self.get_values(index) if index >= 0 else None
+            self.cache[term] = values
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return default if values is None else values
+
+    def __contains__(self, term):
+        return self.get(term) is not None
+
+    def __getitem__(self, term):
+        values = self.get(term)
+        if values is None:
+            raise KeyError(term)
+        return values
+
+    def __len__(self):
+        return self.num_terms
+
+    def __iter__(self):
+        """
+        :return: generator of all terms in sorted order
+        """
+        for term, _ in self.iter_from(0):
+            yield term.decode('utf8')
+
+    def iter_from(self, block):
+        """
+        :param block: block to start decoding from
+        :return: generator of (UTF-8 bytes of term, index) in sorted order from the first term of block
+        """
+        data = self.data
+        pos = self.get_block_offset(block) if block < self.num_blocks else self.meta_start
+        current = b""
+        for i in range(block * self.terms_per_block, self.num_terms):
+            if i % self.terms_per_block == 0:
+                length, pos = decode_number(data, pos)
+                current = data[pos:pos + length]
+            else:
+                shared, pos = decode_number(data, pos)
+                length, pos = decode_number(data, pos)
+                current = current[:shared] + data[pos:pos + length]
+            pos += length
+            yield current, i
+
+    def iter_prefix(self, prefix):
+        """
+        :param prefix: start of the terms
+        :return: generator of (term, values) of all terms starting with prefix in sorted order
+        """
+        key = prefix.encode('utf8')
+        for term, index in self.iter_from(max(self.find_block(key), 0)):
+            if term.startswith(key):
+                yield term.decode('utf8'), self.get_values(index)
+            elif term > key:
+                return
@@ -0,0 +1,47 @@
+from collections import deque
+from multiprocessing import Pool
+
+DOCUMENTS_PER_CHUNK = 16  # Documents tokenized by a worker process at a time
+
+
+def process_chunk(function, chunk):
+    """
+    Runs function on every item of a chunk in a worker process
+    """
+    return [function(item) for item in chunk]
+
+
+def map_documents(function, items, num_workers=1, chunk_size=DOCUMENTS_PER_CHUNK):
+    """
+    Producer/consumer pipeline which tokenizes documents on a pool of worker processes.
+    Items are sent to the workers in chunks and the results are yielded in the order of items,
+    so the index built from them is the same as the one of a serial run.
+    At most 2 chunks per worker are pending, so the documents are not all held in memory
+    :param function: module level function to apply to every item
+    :param items: iterable of items (e.g. documentIds)
+    :param num_workers: number of worker processes, 1 to run in this process
+    :param chunk_size: number of items sent to a worker at once
+    :return: generator of (item, function(item))
+    """
+    if num_workers <= 1:
+        for item in items:
+            yield item, function(item)
+        return
+
+    with Pool(num_workers) as pool:
+        pending = deque()
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) == chunk_size:
+                pending.append((chunk, pool.apply_async(process_chunk, (function, chunk))))
+                chunk = []
+                if len(pending) >= 2 * num_workers:
+                    done_chunk, result = pending.popleft()
+                    yield from zip(done_chunk, result.get())
+
+        if chunk:
+            pending.append((chunk, pool.apply_async(process_chunk, (function, chunk))))
+        while pending:
+            done_chunk, result = pending.popleft()
+            yield from zip(done_chunk, result.get())
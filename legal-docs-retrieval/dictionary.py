@@ -2,12 +2,15 @@ import pickle
 
 from math import sqrt, log
 from posting import Posting
+from lexicon import Lexicon, write_lexicon, is_lexicon
 import util
 
+LEXICON_FIELDS = ("docFreq", "offset", "size")  # Values of a term stored in the lexicon
+
 class Dictionary(object):
     """
     Getter and Setter functions related to the dictionary index.
-    Store on disk and accessed using pickle.
+    Stored on disk as a lexicon file which is memory mapped when loaded, older dictionaries are read with pickle.
     Tracks normalised docs lengths, and total number of docs.
     """
     def __init__(self, disk_file):
@@ -168,28 +171,30 @@ class Dictionary(object):
 
     def save(self):
         """
-        Saves dictionary dict() using pickle dump
-        in dict format as {terms: {}, normalised_doc_lengths: {}, num_of_docs: int}
+        Saves dictionary as a lexicon file of sorted front coded terms with their docFreq, offset and size
+        followed by {court_weights: {}, normalised_doc_lengths: {}, num_of_docs: int}
         """
-        with open(self.disk_file, 'wb') as f:
-            pickle.dump({
-                "terms": self.terms,
-                "court_weights": self.court_weights,
-                "normalised_doc_lengths": self.normalised_doc_lengths,
-                "num_of_docs": self.num_of_docs}, f)
-        f.close()
+        write_lexicon(self.disk_file,
+                      ((term, [info[field] for field in LEXICON_FIELDS]) for term, info in self.terms.items()),
+                      len(LEXICON_FIELDS), {
+                          "court_weights": self.court_weights,
+                          "normalised_doc_lengths": self.normalised_doc_lengths,
+                          "num_of_docs": self.num_of_docs})
 
 
     def load(self):
         """
-        Loads dictionary from disk and stores in the Dictionary in memory object
-        in dict format as {terms: {}, normalised_doc_lengths: {}, num_of_docs: int}
+        Memory maps the lexicon file, terms are then looked up on disk when needed.
+        A dictionary saved with pickle in dict format as {terms: {}, normalised_doc_lengths: {}, num_of_docs: int}
+        is loaded into memory.
         """
-        with open(self.disk_file, 'rb') as f:
-            res = pickle.load(f)
-            self.terms = res["terms"]
-            self.court_weights = res["court_weights"]
-            self.normalised_doc_lengths = res["normalised_doc_lengths"]
-            self.num_of_docs = res["num_of_docs"]
-
-        f.close()
+        if is_lexicon(self.disk_file):
+            self.terms = Lexicon(self.disk_file, LEXICON_FIELDS)
+            res = self.terms.get_meta()
+        else:
+            with open(self.disk_file, 'rb') as f:
+                res = pickle.load(f)
+                self.terms = res["terms"]
+        self.court_weights = res["court_weights"]
+        self.normalised_doc_lengths = res["normalised_doc_lengths"]
+        self.num_of_docs = res["num_of_docs"]
@@ -8,6 +8,7 @@ import getopt
 import os
 import csv
 
+import pipeline
 import util
 from dictionary import Dictionary
 from postingsfile import PostingsFile
@@ -24,16 +25,50 @@ while True:
 
 
 def usage():
-    print("usage: " + sys.argv[0] + " -i dataset-file -d dictionary-file -p postings-file")
+    print("usage: " + sys.argv[0] + " -i dataset-file -d dictionary-file -p postings-file [-j workers]")
 
 
-def process_csv(dataset_file, out_dict):
+def read_rows(dataset_csv):
+    """
+    Reads the rows of the documents from the CSV data file, skipping the header and duplicate document IDs.
+
+    Params:
+        - dataset_csv: Opened dataset file
+
+    Returns:
+        - generator of the CSV rows of the documents
+    """
+    i = 0
+    prev_docId = 0
+
+    csv_reader = csv.reader(dataset_csv)
+    for row in csv_reader:
+        i += 1
+
+        # Skip CSV header
+        if i == 1:
+            continue
+
+        docId = row[0]
+
+        # Skip duplicate document IDs
+        if prev_docId == docId:
+            continue
+
+        yield row
+
+        prev_docId = docId
+
+
+def process_csv(dataset_file, out_dict, num_workers=1):
     """
     Parses and processes the CSV data file to create the index and postings lists.
+    The content of the documents is tokenized by num_workers processes while this process adds it to the index.
 
     Params:
         - dataset_file: Path to dataset
         - out_dict: Path to save dictionary to
+        - num_workers: Number of processes tokenizing the documents
 
     Returns:
         - dictionary: Dictionary containing index and postings
@@ -41,25 +76,11 @@ def process_csv(dataset_file, out_dict):
     dictionary = Dictionary(out_dict)
 
     with open(dataset_file, encoding="utf8") as dataset_csv:
-        i = 0
-        prev_docId = 0
-
-        csv_reader = csv.reader(dataset_csv)
-        for row in csv_reader:
-            i += 1
-
-            # Skip CSV header
-            if i == 1:
-                continue
-
+        # For each document, get the content tokens and add it to the posting lists
+        for row, tokens in pipeline.map_documents(util.preprocess_row, read_rows(dataset_csv), num_workers):
             docId = row[0]
-
-            # Skip duplicate document IDs
-            if prev_docId == docId:
-                continue
-            
-            # For each document, get the content tokens and add it to the posting lists
-            tokens = util.preprocess_content(row[1] + " " + row[2] + " " + row[3] + " " + row[4])
+            # Interned so the dictionary pickles to the same bytes whether tokens were made here or in a worker
+            tokens = [sys.intern(token) for token in tokens]
             normalised_tf = dictionary.add_tokens_of_doc(tokens, docId)
 
             # Maintain document lengths and count in dictionary
@@ -67,14 +88,10 @@ def process_csv(dataset_file, out_dict):
             dictionary.add_court_weight(docId, court.get_court_weight(row[4]))
             dictionary.add_doc_count()
 
-            prev_docId = docId
-
-    dataset_csv.close()
-
     return dictionary
 
 
-def build_index(dataset_file, out_dict, out_postings):
+def build_index(dataset_file, out_dict, out_postings, num_workers=1):
     """
     build index from documents stored in the dataset file,
     then output the dictionary file and postings file
@@ -83,33 +100,44 @@ def build_index(dataset_file, out_dict, out_postings):
 
     postings_file = PostingsFile(out_postings)
 
-    dictionary = process_csv(dataset_file, out_dict)
+    dictionary = process_csv(dataset_file, out_dict, num_workers)
 
     # Save dictionary and postings lists to disk
     postings_file.save(dictionary)
     dictionary.save()
 
 
-dataset_file = output_file_dictionary = output_file_postings = None
-
-try:
-    opts, args = getopt.getopt(sys.argv[1:], 'i:d:p:')
-except getopt.GetoptError:
-    usage()
-    sys.exit(2)
-
-for o, a in opts:
-    if o == '-i': # dataset file
-        dataset_file = a
-    elif o == '-d': # dictionary file
-        output_file_dictionary = a
-    elif o == '-p': # postings file
-        output_file_postings = a
-    else:
-        assert False, "unhandled option"
-
-if dataset_file == None or output_file_postings == None or output_file_dictionary == None:
-    usage()
-    sys.exit(2)
+def main():
+    """
+    Parses the command line and builds the index
+    """
+    dataset_file = output_file_dictionary = output_file_postings = None
+    num_workers = 1
 
-build_index(dataset_file, output_file_dictionary, output_file_postings)
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'i:d:p:j:')
+    except getopt.GetoptError:
+        usage()
+        sys.exit(2)
+
+    for o, a in opts:
+        if o == '-i': # dataset file
+            dataset_file = a
+        elif o == '-d': # dictionary file
+            output_file_dictionary = a
+        elif o == '-p': # postings file
+            output_file_postings = a
+        elif o == '-j': # number of tokenizer processes
+            num_workers = int(a)
+        else:
+            assert False, "unhandled option"
+
+    if dataset_file == None or output_file_postings == None or output_file_dictionary == None:
+        usage()
+        sys.exit(2)
+
+    build_index(dataset_file, output_file_dictionary, output_file_postings, num_workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -34,6 +34,16 @@ def preprocess_content(content):
     return terms
 
 
+def preprocess_row(row):
+    """
+    Preprocess the content of a row of the dataset CSV.
+
+    :param row: CSV row of a document
+    :return: list of normalised tokens of its content, title, date posted and court
+    """
+    return preprocess_content(row[1] + " " + row[2] + " " + row[3] + " " + row[4])
+
+
 def format_results(results):
     """
     Formats result as required for output file.
@@ -0,0 +1,143 @@
+#!/usr/bin/python3
+import sys
+import getopt
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from dictionary import Dictionary
+from postingsfile import PostingsFile, PICKLE, ARRAY
+import util
+
+NUM_DOCS = 200000  # Documents of the synthetic index of the scoring benchmark
+LIST_SIZES = [100, 1000, 10000, 100000]  # Postings of every query term
+QUERY_TERMS = "abc"  # Suffixes of the terms of a query, one term per letter
+MAX_TF = 5
+
+
+def usage():
+    print("usage: " + sys.argv[0] + " -b " + "|".join(sorted(BENCHMARKS)) + " [-r repeats] [-s seed]")
+
+def time_call(function, repeats):
+    """
+    Runs function repeats times
+    :return: fastest run in seconds
+    """
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def build_synthetic_index(rng, directory, postings_format):
+    """
+    Writes an index of NUM_DOCS documents with one term per list size and query letter, e.g. "term1000a"
+    in 1000 random documents with random tf
+    :param rng: random.Random to draw from, seeded the same for every format so the indexes hold the same postings
+    :param directory: where the dictionary and postings files are written
+    :param postings_format: layout of the posting lists
+    :return: (Dictionary, PostingsFile) of the index, loaded for searching
+    """
+    dict_file = os.path.join(directory, "dictionary-" + postings_format)
+    postings_file = os.path.join(directory, "postings-" + postings_format)
+
+    dictionary = Dictionary(dict_file)
+    dictionary.set_impact_bits(0)
+    dictionary.set_postings_format(postings_format)
+    for doc_id in range(1, NUM_DOCS + 1):
+        dictionary.normalised_doc_length[doc_id] = rng.uniform(1.0, 10.0)
+        dictionary.add_doc_count()
+
+    temp_postings = {}
+    for size in LIST_SIZES:
+        for letter in QUERY_TERMS:
+            temp_postings["term%d%s" % (size, letter)] = {doc_id: rng.randint(1, MAX_TF)
+                                                          for doc_id in rng.sample(range(1, NUM_DOCS + 1), size)}
+
+    postings = PostingsFile(postings_file, postings_format)
+    postings.format_posting(temp_postings)
+    postings.save(dictionary)
+    dictionary.save()
+
+    dictionary = Dictionary(dict_file)
+    dictionary.load()
+    return dictionary, PostingsFile(postings_file, dictionary.get_postings_format(), dictionary.get_value_type())
+
+def bench_scoring(repeats, seed, options):
+    """
+    Compares the Python scorer (exhaustive and MaxScore) on pickled postings with the NumPy engine on array
+    postings, for queries of terms with longer and longer posting lists. An even query has 3 lists of the same
+    length, a skewed one a long list and 2 short ones, which is where MaxScore skips the most
+    """
+    import npengine  # NumPy is only needed by this benchmark
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        pickle_index = build_synthetic_index(random.Random(seed), temp_dir, PICKLE)
+        array_index = build_synthetic_index(random.Random(seed), temp_dir, ARRAY)
+        numpy_engine = npengine.NumpyEngine(*array_index)
+
+        print("%8s %8s %10s %12s %12s %12s %8s %10s" % ("list", "query", "postings", "python", "maxscore", "numpy",
+                                                       "speedup", "chosen"))
+        for size in LIST_SIZES:
+            queries = [("even", ["term%d%s" % (size, letter) for letter in QUERY_TERMS]),
+                       ("skewed", ["term%d%s" % (size, QUERY_TERMS[0]), "term%d%s" % (LIST_SIZES[0], QUERY_TERMS[1]),
+                                   "term%d%s" % (LIST_SIZES[1], QUERY_TERMS[2])])]
+            for shape, terms in queries:
+                query = " ".join(terms)
+                num_postings = sum(pickle_index[0].get_df(term) for term in terms)
+                expected = util.eval_query(query, pickle_index[0], pickle_index[1], True)
+                assert numpy_engine.eval_query(query) == expected, "engines disagree on " + query
+
+                python_time = time_call(lambda: util.eval_query(query, pickle_index[0], pickle_index[1], True),
+                                        repeats)
+                maxscore_time = time_call(lambda: util.eval_query(query, pickle_index[0], pickle_index[1],
+                                                                  maxscore_min_postings=0), repeats)
+                numpy_time = time_call(lambda: numpy_engine.eval_query(query), repeats)
+                chosen = "maxscore" if num_postings >= util.MAXSCORE_MIN_POSTINGS else "exhaustive"
+                print("%8d %8s %10d %10.3fms %10.3fms %10.3fms %7.1fx %10s" % (size, shape, num_postings,
+                                                                             python_time * 1000, maxscore_time * 1000,
+                                                                             numpy_time * 1000,
+                                                                             python_time / numpy_time, chosen))
+        numpy_engine.close()
+        pickle_index[1].close()
+        array_index[1].close()
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+BENCHMARKS = {
+    "scoring": bench_scoring,
+}
+
+benchmark = None
+repeats = 5
+seed = 3245
+options = {}
+
+try:
+    opts, args = getopt.getopt(sys.argv[1:], 'b:r:s:')
+except getopt.GetoptError:
+    usage()
+    sys.exit(2)
+
+for o, a in opts:
+    if o == '-b':
+        benchmark = a
+    elif o == '-r':
+        repeats = int(a)
+    elif o == '-s':
+        seed = int(a)
+    else:
+        assert False, "unhandled option"
+
+if benchmark not in BENCHMARKS:
+    usage()
+    sys.exit(2)
+
+BENCHMARKS[benchmark](repeats, seed, options)
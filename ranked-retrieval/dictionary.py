@@ -1,17 +1,38 @@
 import pickle
+import struct
 from math import sqrt, log
 
+from lexicon import Lexicon, write_lexicon, is_lexicon
+from postingsfile import PICKLE, FLOAT_VALUES, count_tiers
+
+WEIGHT = struct.Struct("<d")  # Max weights are stored as the bits of a double in a 64 bit lexicon value
+FIELD = struct.Struct("<q")
+
+
+def weight_to_field(weight):
+    return FIELD.unpack(WEIGHT.pack(weight))[0]
+
+
+def field_to_weight(field):
+    return WEIGHT.unpack(FIELD.pack(field))[0]
+
+
 class Dictionary(object):
     """
     Getter and Setter functions related to the dictionary
-    Also used to store on disk and access it using pickle
+    Stored on disk as a lexicon file which is memory mapped when loaded, older dictionaries are read with pickle
     Stores normalised docs length and also the total num of docs
     """
     def __init__(self, disk_file):
-        self.terms = {}  # Format : {term: (documentFrequency, offsetOfPostingList) E.g. {"hello": (4, 63)}
+        self.terms = {}  # Format : {term: (documentFrequency, offsetOfPostingList, maxWeight) E.g. {"hello": (4, 63, w)}
         self.disk_file = disk_file  # File name where dictionary is stored in disk
         self.num_of_docs = 0  # Total number of documents in corpus
         self.normalised_doc_length = {}  # Format : { doc_id: normalized_length } where normalized_length = sqrt(sum((1+log(tf)^2)))
+        self.max_weights = True  # False for dictionaries saved without the max weights of the terms
+        self.impact_bits = None  # None if postings hold tf, 0 if they hold lnc weights, 8 or 16 if the weights are quantized
+        self.postings_format = PICKLE  # Layout of the posting lists, see postingsfile.POSTINGS_FORMATS
+        self.value_type = FLOAT_VALUES  # Array typecode of the values of the posting lists in the array format
+        self.tiers = None  # Sizes of the tiers of a term but the last, the first is its champion list, or None
 
     def get_terms(self):
         """
@@ -32,14 +53,15 @@ class Dictionary(object):
         else:
             return -1
 
-    def add_term(self, term, docFreq, offset):
+    def add_term(self, term, docFreq, offset, max_weight=0.0):
         """
         Add a term to in memory dictionary
         :param term: normalised term
         :param docFreq: document Frequency of term
         :param offset: offset in postings file for posting list of word
+        :param max_weight: largest lnc weight (1+log(tf))/normalised_length of the term in a document
         """
-        self.terms[term] = [docFreq, offset]
+        self.terms[term] = [docFreq, offset, weight_to_field(max_weight)]
 
     def get_offset_of_term(self, term):
         """
@@ -52,6 +74,83 @@ class Dictionary(object):
         else:
             return -1
 
+    def has_max_weights(self):
+        """
+        :return: True if the max weights of the terms are stored, so queries can be evaluated with MaxScore
+        """
+        return self.max_weights
+
+    def get_max_weight(self, term):
+        """
+        Gets the largest lnc weight of a term in any document, the most it adds to a score per unit of query weight
+        :param term: normalised term
+        :return: float max weight, 0 if term not present
+        """
+        if term in self.terms:
+            return field_to_weight(self.terms[term][2])
+        else:
+            return 0.0
+
+    def set_impact_bits(self, impact_bits):
+        """
+        Sets what the postings hold instead of tf
+        :param impact_bits: None for tf, 0 for lnc weights (tf and doc length already applied) or 8 or 16 for
+        weights quantized to that many bits
+        """
+        self.impact_bits = impact_bits
+
+    def get_impact_bits(self):
+        return self.impact_bits
+
+    def has_impacts(self):
+        """
+        :return: True if postings hold lnc weights instead of tf
+        """
+        return self.impact_bits is not None
+
+    def get_impact_scale(self):
+        """
+        :return: factor from the impact in a posting to the lnc weight
+        """
+        if self.impact_bits:
+            return 1.0 / ((1 << self.impact_bits) - 1)
+        return 1.0
+
+    def set_postings_format(self, postings_format):
+        self.postings_format = postings_format
+
+    def get_postings_format(self):
+        """
+        :return: layout of the posting lists in the postings file, "pickle" or "array"
+        """
+        return self.postings_format
+
+    def set_value_type(self, value_type):
+        self.value_type = value_type
+
+    def get_value_type(self):
+        """
+        :return: array typecode of the values of the posting lists in the array format, "f", "H" or "B"
+        """
+        return self.value_type
+
+    def set_tiers(self, tiers):
+        """
+        :param tiers: sizes of the tiers of every term but the last, e.g. [20] for champion lists of 20 documents
+        followed by the other documents, or None for a single tier
+        """
+        self.tiers = tiers
+
+    def get_tiers(self):
+        return self.tiers
+
+    def get_num_tiers(self, term):
+        """
+        :param term: normalised term
+        :return: number of posting lists of the term, written one after the other from its offset
+        """
+        return count_tiers(self.get_df(term), self.tiers)
+
     def update_offset(self, term, offset):
         """
         Updates offset of where data stored in posting list
@@ -80,6 +179,12 @@ class Dictionary(object):
         """
         return self.normalised_doc_length[doc_id]
 
+    def get_normalised_doc_lengths(self):
+        """
+        :return: dict of the Document normalised length of every docId
+        """
+        return self.normalised_doc_length
+
     def add_doc_count(self):
         """
         Adds one to doc count of corpus
@@ -95,24 +200,36 @@ class Dictionary(object):
 
     def save(self):
         """
-        Saves dictionary dict() using pickle dump
-        in dict format as {terms: {}, normalised_doc_length: {}, num_of_docs: int}
-        """
-        with open(self.disk_file, 'wb') as f:
-            pickle.dump({
-                "terms": self.terms,
-                "normalised_doc_length": self.normalised_doc_length,
-                "num_of_docs": self.num_of_docs }, f)
-        f.close()
+        Saves dictionary as a lexicon file of sorted front coded terms with their docFreq, offset and max weight
+        followed by {normalised_doc_length: {}, num_of_docs: int, impact_bits: int or None, postings_format: str,
+        value_type: str, tiers: [] or None}
+        """
+        write_lexicon(self.disk_file, self.terms.items(), 3, {
+            "normalised_doc_length": self.normalised_doc_length,
+            "num_of_docs": self.num_of_docs,
+            "impact_bits": self.impact_bits,
+            "postings_format": self.postings_format,
+            "value_type": self.value_type,
+            "tiers": self.tiers})
 
     def load(self):
         """
-        Loads dictionary from disk and stores in the Dictionary in memory object
-        in dict format as {terms: {}, normalised_doc_length: {}, num_of_docs: int}
+        Memory maps the lexicon file, terms are then looked up on disk when needed
+        A dictionary saved with pickle in dict format as {terms: {}, normalised_doc_length: {}, num_of_docs: int}
+        is loaded into memory
         """
-        with open(self.disk_file, 'rb') as f:
-            res = pickle.load(f)
-            self.terms = res["terms"]
-            self.normalised_doc_length = res["normalised_doc_length"]
-            self.num_of_docs = res["num_of_docs"]
-        f.close()
+        if is_lexicon(self.disk_file):
+            self.terms = Lexicon(self.disk_file)
+            res = self.terms.get_meta()
+            self.max_weights = self.terms.num_fields > 2
+        else:
+            with open(self.disk_file, 'rb') as f:
+                res = pickle.load(f)
+                self.terms = res["terms"]
+            self.max_weights = False
+        self.normalised_doc_length = res["normalised_doc_length"]
+        self.num_of_docs = res["num_of_docs"]
+        self.impact_bits = res.get("impact_bits")
+        self.postings_format = res.get("postings_format", PICKLE)
+        self.value_type = res.get("value_type", FLOAT_VALUES)
+        self.tiers = res.get("tiers")
@@ -7,32 +7,42 @@ import sys
 import getopt
 import os
 import pickle
+from functools import partial
 
 from dictionary import Dictionary
-from postingsfile import PostingsFile
+from postingsfile import PostingsFile, PICKLE, POSTINGS_FORMATS
+import pipeline
 import util
 
 
 def usage():
-    print("usage: " + sys.argv[0] + " -i directory-of-documents -d dictionary-file -p postings-file")
+    print("usage: " + sys.argv[0] + " -i directory-of-documents -d dictionary-file -p postings-file [-j workers] [-w tf|float|8|16] [-f pickle|array] [-c tier-sizes]")
 
-def build_index(in_dir, out_dict, out_postings):
+IMPACT_BITS = {"tf": None, "float": 0, "8": 8, "16": 16}  # What the postings hold, see Dictionary.set_impact_bits
+
+def build_index(in_dir, out_dict, out_postings, num_workers=1, impact_bits=0, postings_format=PICKLE, tiers=None):
     """
     build index from documents stored in the input directory,
     then output the dictionary file and postings file
+    Documents are tokenized by num_workers processes while this process counts the terms
+    Postings hold tf if impact_bits is None, else the lnc weight quantized to impact_bits bits (0 for floats)
+    postings_format is the layout of the posting lists, pickled tuples or parallel arrays
+    tiers are the sizes of the tiers of every term but the last, the first being its champion list, or None
     """
     print('indexing...')
 
     indexing_doc_files = sorted(map(int, os.listdir(in_dir)))
 
     dictionary = Dictionary(out_dict)
-    postings = PostingsFile(out_postings)
+    dictionary.set_impact_bits(impact_bits)
+    dictionary.set_postings_format(postings_format)
+    dictionary.set_tiers(tiers)
+    postings = PostingsFile(out_postings, postings_format)
 
     temp_dictionary = defaultdict(lambda: defaultdict(int))
 
     # For each document get the terms and add it into the temporary in-memory posting lists
-    for document in indexing_doc_files:
-        terms = util.read_document(in_dir, document)
+    for document, terms in pipeline.map_documents(partial(util.read_document, in_dir), indexing_doc_files, num_workers):
         tf_for_doc = defaultdict(int)
 
         for term in terms:
@@ -51,26 +61,53 @@ def build_index(in_dir, out_dict, out_postings):
     dictionary.save()
 
 
-input_directory = output_file_dictionary = output_file_postings = None
-
-try:
-    opts, args = getopt.getopt(sys.argv[1:], 'i:d:p:')
-except getopt.GetoptError:
-    usage()
-    sys.exit(2)
-
-for o, a in opts:
-    if o == '-i': # input directory
-        input_directory = a
-    elif o == '-d': # dictionary file
-        output_file_dictionary = a
-    elif o == '-p': # postings file
-        output_file_postings = a
-    else:
-        assert False, "unhandled option"
-
-if input_directory == None or output_file_postings == None or output_file_dictionary == None:
-    usage()
-    sys.exit(2)
-
-build_index(input_directory, output_file_dictionary, output_file_postings)
+def main():
+    """
+    Parses the command line and builds the index
+    """
+    input_directory = output_file_dictionary = output_file_postings = None
+    num_workers = 1
+    impact_bits = 0
+    postings_format = PICKLE
+    tiers = None
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'i:d:p:j:w:f:c:')
+    except getopt.GetoptError:
+        usage()
+        sys.exit(2)
+
+    for o, a in opts:
+        if o == '-i': # input directory
+            input_directory = a
+        elif o == '-d': # dictionary file
+            output_file_dictionary = a
+        elif o == '-p': # postings file
+            output_file_postings = a
+        elif o == '-j': # number of tokenizer processes
+            num_workers = int(a)
+        elif o == '-w': # weights in the postings
+            if a not in IMPACT_BITS:
+                usage()
+                sys.exit(2)
+            impact_bits = IMPACT_BITS[a]
+        elif o == '-f': # layout of the posting lists
+            if a not in POSTINGS_FORMATS:
+                usage()
+                sys.exit(2)
+            postings_format = a
+        elif o == '-c': # sizes of the champion lists and of the next tiers, e.g. 20 or 20,200
+            tiers = [int(size) for size in a.split(',')]
+        else:
+            assert False, "unhandled option"
+
+    if input_directory == None or output_file_postings == None or output_file_dictionary == None:
+        usage()
+        sys.exit(2)
+
+    build_index(input_directory, output_file_dictionary, output_file_postings, num_workers, impact_bits,
+                postings_format, tiers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+../common/lexicon.py
\ No newline at end of file
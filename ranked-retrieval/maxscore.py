@@ -0,0 +1,107 @@
+from bisect import bisect_left
+from heapq import heappush, heapreplace
+from math import log
+
+ROUNDING_SLACK = 1e-9  # Relative margin on upper bounds, so float rounding never prunes a document of the top k
+
+
+def top_k(query_terms, posting_lists, max_weights, norm_query, dictionary, k, stats=None, impacts=False):
+    """
+    Document at a time MaxScore evaluation of lnc.ltc. Terms are sorted by the most they can add to a score.
+    Once k documents are found, the terms whose bounds together cannot beat the k-th score are non essential:
+    only documents of the other terms are candidates, and a candidate is dropped as soon as its partial score
+    plus the bounds of the terms not checked yet cannot beat the k-th score.
+    Documents are visited in docId order, so a document has to beat the k-th score and ties keep the smaller docIds.
+    The score of a candidate adds the terms in query order, so it is the same float as the one of eval_query
+    :param query_terms: list of (term, ltc weight) in query order
+    :param posting_lists: posting list [(docId, tf)] of every query term in the same order
+    :param max_weights: largest lnc weight (or impact) of every query term in the same order
+    :param norm_query: length of the query vector, not 0
+    :param dictionary: Object of Dictionary
+    :param k: number of results
+    :param stats: dict counting "scored" postings and "postings" of the lists, or None
+    :param impacts: if set, posting lists are [(docId, impact)] and a score is only the sum of weight * impact
+    :return: top k docIds, by decreasing score then increasing docId
+    """
+    num_terms = len(query_terms)
+    weights = [weight for _, weight in query_terms]
+    bounds = [weights[i] * max_weights[i] / norm_query for i in range(num_terms)]
+
+    # Terms by increasing bound, prefix_bounds[j] is the sum of the bounds of the first j + 1
+    order = sorted((i for i in range(num_terms) if posting_lists[i]), key=bounds.__getitem__)
+    prefix_bounds = []
+    total = 0.0
+    for i in order:
+        total += bounds[i]
+        prefix_bounds.append(total * (1 + ROUNDING_SLACK))
+
+    positions = [0] * num_terms
+    lengths = [len(posting_list) for posting_list in posting_lists]
+    heap = []  # Format : [(score, -docId)] of the top k found so far, the k-th is heap[0]
+    threshold = -1.0  # Scores are >= 0, so nothing is pruned until there are k results
+    first_essential = 0  # order[first_essential:] are the essential terms
+    essential = order
+    scored = 0
+
+    while True:
+        # Next candidate is the smallest docId of the essential terms
+        doc_id = None
+        for i in essential:
+            if positions[i] < lengths[i]:
+                candidate = posting_lists[i][positions[i]][0]
+                if doc_id is None or candidate < doc_id:
+                    doc_id = candidate
+        if doc_id is None:
+            break
+
+        norm = norm_query if impacts else norm_query * dictionary.get_normalised_doc_length(doc_id)
+        tf_docs = [0] * num_terms  # lnc weight (or impact) of doc_id for every term, 0 if it is not in the list
+        partial = 0.0
+        for i in essential:
+            position = positions[i]
+            if position < lengths[i] and posting_lists[i][position][0] == doc_id:
+                tf_docs[i] = posting_lists[i][position][1] if impacts else 1.0 + log(posting_lists[i][position][1], 10)
+                partial += weights[i] * tf_docs[i]
+                positions[i] = position + 1
+                scored += 1
+
+        # Non essential terms from the largest bound, each is only looked up if the document can still make it
+        pruned = False
+        for j in range(first_essential - 1, -1, -1):
+            if (partial / norm) * (1 + ROUNDING_SLACK) + prefix_bounds[j] <= threshold:
+                pruned = True
+                break
+            i = order[j]
+            position = bisect_left(posting_lists[i], (doc_id,), positions[i])
+            positions[i] = position
+            if position < lengths[i] and posting_lists[i][position][0] == doc_id:
+                tf_docs[i] = posting_lists[i][position][1] if impacts else 1.0 + log(posting_lists[i][position][1], 10)
+                partial += weights[i] * tf_docs[i]
+                scored += 1
+        if pruned:
+            continue
+
+        score = 0
+        for i in range(num_terms):
+            if tf_docs[i]:
+                score += weights[i] * tf_docs[i]
+        score = score / norm
+
+        if len(heap) < k:
+            heappush(heap, (score, -doc_id))
+        elif score > threshold:
+            heapreplace(heap, (score, -doc_id))
+        else:
+            continue
+
+        if len(heap) == k:
+            threshold = heap[0][0]
+            while first_essential < len(order) and prefix_bounds[first_essential] <= threshold:
+                first_essential += 1
+            essential = order[first_essential:]
+
+    if stats is not None:
+        stats["scored"] = stats.get("scored", 0) + scored
+        stats["postings"] = stats.get("postings", 0) + sum(map(len, posting_lists))
+
+    return [-neg_doc_id for _, neg_doc_id in sorted(heap, key=lambda entry: (-entry[0], -entry[1]))]
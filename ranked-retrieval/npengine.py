@@ -0,0 +1,136 @@
+import mmap
+import os
+from math import log
+
+import numpy as np
+
+from postingsfile import ARRAY, COUNT
+import util
+
+
+class NumpyEngine(object):
+    """
+    Scores queries with NumPy: a posting list is a pair of arrays of docIds and values, and the scores of all
+    documents are a dense array indexed by docId, so a term is scored with one vectorized multiply-add
+    Postings in the array format are memory mapped, pickled lists are converted. Values are scored in float64 and
+    tf weights use the log of util, so the scores are the same floats as the ones of util.eval_query
+    """
+    def __init__(self, dictionary, postings):
+        """
+        :param dictionary: Object of Dictionary, loaded
+        :param postings: Object of PostingsFile
+        """
+        self.dictionary = dictionary
+        self.postings = postings
+        self.impacts = dictionary.has_impacts()
+
+        doc_lengths = dictionary.get_normalised_doc_lengths()
+        num_slots = max(doc_lengths) + 1 if doc_lengths else 1
+        self.scores = np.zeros(num_slots)  # Accumulators by docId, back to 0 after every query
+        self.matched = np.zeros(num_slots, dtype=bool)  # docIds with a posting of the query, cleared after every query
+        self.doc_lengths = np.ones(num_slots)  # Normalised length by docId
+        if doc_lengths:
+            self.doc_lengths[np.fromiter(doc_lengths.keys(), dtype=np.int64, count=len(doc_lengths))] = \
+                np.fromiter(doc_lengths.values(), dtype=np.float64, count=len(doc_lengths))
+
+        self.file = None
+        self.data = None
+        if postings.postings_format == ARRAY and os.path.getsize(postings.disk_file):
+            self.file = open(postings.disk_file, 'rb')
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.file.close()
+
+    def get_tier_arrays(self, offset, num_tiers):
+        """
+        :param offset: offset of the first posting list of a term in the postings file
+        :param num_tiers: number of tiers of the term
+        :return: generator of the (int32 docIds, values) arrays of every tier, from the champions
+        """
+        if self.data is not None:
+            value_type = np.dtype(self.dictionary.get_value_type())  # float32, uint8 or uint16
+            for _ in range(num_tiers):
+                count = COUNT.unpack_from(self.data, offset)[0]
+                start = offset + COUNT.size
+                doc_ids = np.frombuffer(self.data, dtype=np.int32, count=count, offset=start)
+                values = np.frombuffer(self.data, dtype=value_type, count=count, offset=start + 4 * count)
+                values = values.astype(np.float64)
+                yield doc_ids, values
+                offset = start + (4 + value_type.itemsize) * count
+            return
+
+        for posting_list in self.postings.get_tiers(offset, num_tiers):
+            doc_ids = np.fromiter((posting[0] for posting in posting_list), dtype=np.int32, count=len(posting_list))
+            values = np.fromiter((posting[1] for posting in posting_list), dtype=np.float64, count=len(posting_list))
+            yield doc_ids, values
+
+    def eval_query(self, query, stats=None, k=util.NUM_RESULTS, all_tiers=False):
+        """
+        Evaluates the query with lnc.ltc like util.eval_query and returns the top k results
+        The tiers of a tiered index are scored one at a time for all terms until k documents are found
+        :param query: query free text
+        :param stats: dict counting "scored" postings and "postings" of the lists, or None
+        :param k: number of results
+        :param all_tiers: score the whole posting lists of a tiered index
+        :return: Top k docIds by decreasing score then increasing docId
+        """
+        query_terms, norm_query = util.get_query_weights(query, self.dictionary)
+        scores = self.scores
+
+        matched = self.matched
+        tiers = list()  # Format : [(weight, generator of the tier arrays)] of the query terms in the dictionary
+        total_postings = 0
+        for term, weight in query_terms:
+            offset = self.dictionary.get_offset_of_term(term)
+            if offset != -1:
+                tiers.append((weight, self.get_tier_arrays(offset, self.dictionary.get_num_tiers(term))))
+                total_postings += self.dictionary.get_df(term)
+
+        num_postings = 0
+        for _ in range(len(self.dictionary.get_tiers() or ()) + 1):
+            for weight, tier_arrays in tiers:
+                doc_ids, values = next(tier_arrays, (None, None))
+                if doc_ids is None:
+                    continue
+                if not self.impacts:
+                    # np.log10 can be an ulp away from math.log, so the weight of each distinct tf comes from the latter
+                    tfs, inverse = np.unique(values, return_inverse=True)
+                    values = np.array([1.0 + log(tf, 10) for tf in tfs.tolist()])[inverse]
+                # docIds of a posting list are distinct, so fancy indexing adds once per docId like np.add.at
+                scores[doc_ids] += weight * values
+                matched[doc_ids] = True
+                num_postings += len(doc_ids)
+            if not all_tiers and np.count_nonzero(matched) >= k:
+                break
+
+        if stats is not None:
+            stats["scored"] = stats.get("scored", 0) + num_postings
+            stats["postings"] = stats.get("postings", 0) + total_postings
+        if not num_postings:
+            return []
+
+        candidates = np.flatnonzero(matched)
+        candidate_scores = scores[candidates]
+        scores[candidates] = 0
+        matched[candidates] = False
+
+        # All weights are 0 if every query term is in every document, the scores are then all 0
+        norm_query = norm_query or 1.0
+        if self.impacts:
+            candidate_scores = candidate_scores / norm_query
+        else:
+            candidate_scores = candidate_scores / (norm_query * self.doc_lengths[candidates])
+
+        if len(candidates) > k:
+            # argpartition picks k of the best in linear time, the documents tied with the k-th are kept
+            # so the order below ranks ties by docId
+            kth_score = candidate_scores[np.argpartition(-candidate_scores, k - 1)[:k]].min()
+            keep = candidate_scores >= kth_score
+            candidates = candidates[keep]
+            candidate_scores = candidate_scores[keep]
+
+        order = np.lexsort((candidates, -candidate_scores))[:k]
+        return candidates[order].tolist()
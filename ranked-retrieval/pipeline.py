@@ -0,0 +1 @@
+../common/pipeline.py
\ No newline at end of file
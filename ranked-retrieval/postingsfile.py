@@ -1,15 +1,105 @@
 import pickle
+import struct
+from array import array
 from collections import defaultdict
+from math import log
+
+PICKLE = "pickle"  # Posting lists pickled as [(docId, value)]
+ARRAY = "array"  # Posting lists as a count followed by int32 docIds and their values, read without unpickling
+POSTINGS_FORMATS = (PICKLE, ARRAY)
+COUNT = struct.Struct("<I")
+FLOAT_VALUES = 'f'  # Array typecode of tf and float impacts in the array format
+QUANTIZED_VALUES = {8: 'B', 16: 'H'}  # Format : {impact bits: array typecode}
+
+
+def get_value_type(impact_bits):
+    """
+    :param impact_bits: impact bits of the dictionary, see Dictionary.set_impact_bits
+    :return: array typecode of the values of the postings in the array format
+    """
+    return QUANTIZED_VALUES.get(impact_bits, FLOAT_VALUES)
+
+
+def quantize(weight, bits):
+    """
+    :param weight: lnc weight in (0, 1]
+    :param bits: number of bits of the quantized weight
+    :return: int in [1, 2^bits - 1], weights are never rounded to 0 so every posting still counts
+    """
+    return max(1, int(round(weight * ((1 << bits) - 1))))
+
+
+def count_tiers(df, tiers):
+    """
+    :param df: document frequency of a term
+    :param tiers: sizes of the tiers but the last, e.g. [20, 200], or None
+    :return: number of non empty tiers of the term
+    """
+    num_tiers = 1
+    bound = 0
+    for size in tiers or ():
+        bound += size
+        if bound < df:
+            num_tiers += 1
+    return num_tiers
+
+
+def split_tiers(docs_list, tiers):
+    """
+    Splits a posting list into tiers by decreasing value: the first has the champions of the term, the top tiers[0]
+    documents, the next the following tiers[1] documents and so on, the last the rest
+    :param docs_list: posting list [(docId, value)]
+    :param tiers: sizes of the tiers but the last, or None for a single tier
+    :return: list of the non empty tiers, each sorted by docId
+    """
+    if not tiers:
+        return [sorted(docs_list)]
+
+    ranked = sorted(docs_list, key=lambda posting: (-posting[1], posting[0]))
+    tier_lists = []
+    start = 0
+    for size in tiers:
+        if start + size >= len(ranked):
+            break
+        tier_lists.append(sorted(ranked[start:start + size]))
+        start += size
+    tier_lists.append(sorted(ranked[start:]))
+    return tier_lists
 
 
 class PostingsFile(object):
     """
     Getter and Setter functions related to the postings and posting list
     Also used to store on disk and access it using pickle and until functions
+    The file is opened by the first read and kept open until close, so a query does not open it once per term
     """
-    def __init__(self, file_name):
+    def __init__(self, file_name, postings_format=PICKLE, value_type=FLOAT_VALUES):
+        """
+        :param file_name: postings file
+        :param postings_format: layout of the posting lists, PICKLE or ARRAY
+        :param value_type: array typecode of the values in the array format, see Dictionary.get_value_type
+        """
         self.disk_file = file_name
         self.postings = defaultdict(list)
+        self.postings_format = postings_format
+        self.value_type = value_type
+        self.file = None  # Postings file open for reading
+
+    def get_file(self):
+        """
+        :return: the postings file open for reading, opened on the first call
+        """
+        if self.file is None:
+            self.file = open(self.disk_file, 'rb')
+        return self.file
+
+    def close(self):
+        """
+        Closes the postings file if it was opened for reading
+        """
+        if self.file is not None:
+            self.file.close()
+            self.file = None
 
     def format_posting(self, temp_postings):
         """
@@ -22,13 +112,59 @@ class PostingsFile(object):
                 self.postings[key].append((docId, tf))
 
     def save(self, dictionary):
+        """
+        Writes the posting lists and adds their terms to the dictionary with their offset and max lnc weight
+        If the dictionary has impacts, postings hold the lnc weight (1+log(tf))/normalised_length instead of tf,
+        quantized to its impact bits if set
+        :param dictionary: Dictionary with the normalised lengths of all documents
+        """
+        impact_bits = dictionary.get_impact_bits()
+        scale = dictionary.get_impact_scale()
+        tiers = dictionary.get_tiers()
+        if self.postings_format == ARRAY:
+            self.value_type = get_value_type(impact_bits)
+            dictionary.set_value_type(self.value_type)
         with open(self.disk_file, 'wb') as posting_file:
             for token, docs_list in sorted(self.postings.items()):
                 offset = posting_file.tell()
-                dictionary.add_term(token, len(docs_list), offset)
-                pickle.dump(sorted(docs_list), posting_file)
+                weights = [(docId, (1 + log(tf, 10)) / dictionary.get_normalised_doc_length(docId))
+                           for docId, tf in docs_list]
+                if impact_bits:
+                    docs_list = [(docId, quantize(weight, impact_bits)) for docId, weight in weights]
+                elif impact_bits == 0:
+                    docs_list = weights
+                    if self.postings_format == ARRAY:
+                        # Rounded to float32 as written, so the max weight bounds the impacts which are read back
+                        rounded = array('f', [weight for _, weight in weights]).tolist()
+                        docs_list = [(docId, weight) for (docId, _), weight in zip(weights, rounded)]
+
+                if impact_bits:
+                    # Upper bound of the dequantized weights
+                    max_weight = max(impact for _, impact in docs_list) * scale
+                elif impact_bits == 0:
+                    max_weight = max(impact for _, impact in docs_list)
+                else:
+                    max_weight = max(weight for _, weight in weights)
+                dictionary.add_term(token, len(docs_list), offset, max_weight)
+                # Tiers of a term are written one after the other from its offset
+                for tier_list in split_tiers(docs_list, tiers):
+                    if self.postings_format == ARRAY:
+                        self.write_arrays(posting_file, tier_list)
+                    else:
+                        pickle.dump(tier_list, posting_file)
         posting_file.close()
 
+    def write_arrays(self, posting_file, docs_list):
+        """
+        Writes a posting list as parallel arrays: its length, the int32 docIds and the values, float32 or the
+        unsigned ints of quantized impacts
+        :param posting_file: file open for writing
+        :param docs_list: posting list [(docId, value)]
+        """
+        posting_file.write(COUNT.pack(len(docs_list)))
+        posting_file.write(array('i', [docId for docId, _ in docs_list]).tobytes())
+        posting_file.write(array(self.value_type, [value for _, value in docs_list]).tobytes())
+
     def get_postings(self):
         """
         Gets postings in file
@@ -36,13 +172,46 @@ class PostingsFile(object):
         """
         return self.postings
 
-    def get_posting_list(self, offset):
+    def read_posting_list(self, file):
+        """
+        :param file: postings file at the start of a posting list
+        :return: posting list [(docId, value)], the file is left at the end of the list
+        """
+        if self.postings_format == ARRAY:
+            count = COUNT.unpack(file.read(COUNT.size))[0]
+            doc_ids = array('i')
+            doc_ids.frombytes(file.read(doc_ids.itemsize * count))
+            values = array(self.value_type)
+            values.frombytes(file.read(values.itemsize * count))
+            return list(zip(doc_ids, values))
+        return pickle.load(file)
+
+    def get_tiers(self, offset, num_tiers):
+        """
+        Reads the tiers of a term one at a time
+        :param offset: the offset of the first tier in file
+        :param num_tiers: number of tiers of the term
+        :return: generator of the posting list of every tier, from the champions
+        """
+        # The file is shared with the reads of other terms, so every tier seeks to where the previous one ended
+        position = offset
+        for _ in range(num_tiers):
+            file = self.get_file()
+            file.seek(position)
+            tier_list = self.read_posting_list(file)
+            position = file.tell()
+            yield tier_list
+
+    def get_posting_list(self, offset, num_tiers=1):
         """
         Gets posting list for a given offset in file
         :param offset: the offset to seek to in file
-        :return: Posting list with TF [(1, 5), (10, 4)]
+        :param num_tiers: number of tiers of the term, which are merged
+        :return: Posting list with TF [(1, 5), (10, 4)], or with the impacts if the index has them
         """
-        with open(self.disk_file, 'rb') as file:
-            file.seek(offset)
-            return pickle.load(file)
+        if num_tiers > 1:
+            return sorted(posting for tier_list in self.get_tiers(offset, num_tiers) for posting in tier_list)
 
+        file = self.get_file()
+        file.seek(offset)
+        return self.read_posting_list(file)
@@ -6,41 +6,79 @@ from postingsfile import PostingsFile
 import util
 
 def usage():
-    print("usage: " + sys.argv[0] + " -d dictionary-file -p postings-file -q file-of-queries -o output-file-of-results")
+    print("usage: " + sys.argv[0] + " -d dictionary-file -p postings-file -q file-of-queries -o output-file-of-results [-x] [-v] [-e python|numpy] [-r]")
 
-def run_search(dict_file, postings_file, queries_file, results_file):
+ENGINES = ("python", "numpy")
+
+def run_search(dict_file, postings_file, queries_file, results_file, exhaustive=False, verbose=False, engine="python",
+               report_recall=False):
     """
     using the given dictionary file and postings file,
     perform searching on the given queries file and output the results to a file
+    If exhaustive, every posting is scored instead of using MaxScore or the tiers of a tiered index
+    If verbose, the number of postings scored is printed for every query and for the whole file
+    engine is "python" to score postings one at a time or "numpy" to score them with arrays
+    If report_recall, the recall@10 of the results against scoring all postings is printed (e.g. for tiered indexes)
     """
 
     dictionary = Dictionary(dict_file)
-    postings = PostingsFile(postings_file)
 
     dictionary.load()  # Load dictionary into memory
+    postings = PostingsFile(postings_file, dictionary.get_postings_format(), dictionary.get_value_type())
+
+    numpy_engine = None
+    if engine == "numpy":
+        import npengine  # NumPy is only needed by this engine
+        numpy_engine = npengine.NumpyEngine(dictionary, postings)
 
     with open(queries_file, 'r') as query_file:
         with open(results_file, 'w') as output_file:
             complete_result = []
+            total_stats = {"scored": 0, "postings": 0}
+            recalls = []
             for query in query_file:
                 if query.strip():
-                    result = util.eval_query(query, dictionary, postings)
+                    stats = {"scored": 0, "postings": 0}
+                    if numpy_engine is not None:
+                        result = numpy_engine.eval_query(query, stats, util.NUM_RESULTS, exhaustive)
+                    else:
+                        result = util.eval_query(query, dictionary, postings, exhaustive, stats)
+                    if report_recall:
+                        reference = util.eval_query(query, dictionary, postings, True, None, True)
+                        recalls.append(util.recall(result, reference))
                     result = util.format_result(result)
                     complete_result.append(result)
+                    if verbose:
+                        print("%s: scored %d of %d postings" % (query.strip(), stats["scored"], stats["postings"]))
+                        if report_recall:
+                            print("%s: recall@%d %.2f" % (query.strip(), util.NUM_RESULTS, recalls[-1]))
+                    total_stats["scored"] += stats["scored"]
+                    total_stats["postings"] += stats["postings"]
                 else:
                     complete_result.append("")
 
+            if verbose:
+                print("total: scored %d of %d postings" % (total_stats["scored"], total_stats["postings"]))
+            if report_recall and recalls:
+                print("recall@%d: %.3f over %d queries" % (util.NUM_RESULTS, sum(recalls) / len(recalls), len(recalls)))
+
             write_data = "\n".join(complete_result)
             output_file.write(write_data)
 
         output_file.close()
     query_file.close()
+    if numpy_engine is not None:
+        numpy_engine.close()
+    postings.close()
 
 
 dictionary_file = postings_file = file_of_queries = file_of_output = None
+exhaustive = verbose = False
+engine = "python"
+report_recall = False
 
 try:
-    opts, args = getopt.getopt(sys.argv[1:], 'd:p:q:o:')
+    opts, args = getopt.getopt(sys.argv[1:], 'd:p:q:o:xve:r')
 except getopt.GetoptError:
     usage()
     sys.exit(2)
@@ -54,6 +92,17 @@ for o, a in opts:
         file_of_queries = a
     elif o == '-o':
         file_of_output = a
+    elif o == '-x': # score every posting
+        exhaustive = True
+    elif o == '-v': # report the number of postings scored
+        verbose = True
+    elif o == '-e': # scoring engine
+        if a not in ENGINES:
+            usage()
+            sys.exit(2)
+        engine = a
+    elif o == '-r': # report recall@10 against scoring all postings
+        report_recall = True
     else:
         assert False, "unhandled option"
 
@@ -61,4 +110,5 @@ if dictionary_file == None or postings_file == None or file_of_queries == None o
     usage()
     sys.exit(2)
 
-run_search(dictionary_file, postings_file, file_of_queries, file_of_output)
+run_search(dictionary_file, postings_file, file_of_queries, file_of_output, exhaustive, verbose, engine,
+           report_recall)
@@ -0,0 +1,234 @@
+#!/usr/bin/python3
+import sys
+import getopt
+import os
+import signal
+import socketserver
+import stat
+import threading
+import time
+from multiprocessing import Pool
+from multiprocessing.util import Finalize
+
+from dictionary import Dictionary
+from postingsfile import PostingsFile
+import util
+
+ENGINES = ("python", "numpy")
+
+# Index of this process, set once by load_index. Workers of the pool each load their own
+index_dictionary = None
+index_postings = None
+index_engine = None
+
+
+def usage():
+    print("usage: " + sys.argv[0] + " -d dictionary-file -p postings-file [-s socket-file] [-j workers] [-e python|numpy]")
+
+def load_index(dict_file, postings_file, engine="python"):
+    """
+    Loads the dictionary, opens the postings file and tokenizes a query once, so the first query of a client
+    does not pay for loading the index or the tokenizer models
+    :param dict_file: dictionary file
+    :param postings_file: postings file
+    :param engine: "python" or "numpy", see search.py
+    """
+    global index_dictionary, index_postings, index_engine
+
+    index_dictionary = Dictionary(dict_file)
+    index_dictionary.load()
+    index_postings = PostingsFile(postings_file, index_dictionary.get_postings_format(),
+                                 index_dictionary.get_value_type())
+    index_engine = None
+    if engine == "numpy":
+        import npengine  # NumPy is only needed by this engine
+        index_engine = npengine.NumpyEngine(index_dictionary, index_postings)
+    # Closed when a worker exits after the pool is closed
+    Finalize(index_postings, close_index, exitpriority=10)
+
+    util.get_query_terms("warm up")
+
+def init_worker(dict_file, postings_file, engine):
+    """
+    Loads the index in a worker of the pool. Ctrl-C is left to the server, which then closes the pool
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    load_index(dict_file, postings_file, engine)
+
+def close_index():
+    """
+    Closes the postings file and the NumPy engine loaded by load_index
+    """
+    global index_postings, index_engine
+
+    if index_engine is not None:
+        index_engine.close()
+        index_engine = None
+    if index_postings is not None:
+        index_postings.close()
+        index_postings = None
+
+def answer_query(query):
+    """
+    A query which fails is answered with an empty line and its error printed on stderr, the server keeps running
+    :param query: query free text
+    :return: (formatted top 10 docIds, seconds taken to evaluate the query)
+    """
+    start = time.perf_counter()
+    try:
+        if not query.strip():
+            result = ""
+        elif index_engine is not None:
+            result = util.format_result(index_engine.eval_query(query))
+        else:
+            result = util.format_result(util.eval_query(query, index_dictionary, index_postings))
+    except Exception as error:
+        sys.stderr.write("error on query %r: %s: %s\n" % (query, type(error).__name__, error))
+        sys.stderr.flush()
+        result = ""
+    return result, time.perf_counter() - start
+
+
+class QueryEvaluator(object):
+    """
+    Evaluates the queries of all clients, in this process or on a pool of worker processes which have each loaded
+    the index. Evaluation in this process is serialised since the NumPy engine reuses its score arrays
+    """
+    def __init__(self, dict_file, postings_file, engine, num_workers):
+        self.pool = None
+        self.lock = threading.Lock()
+        if num_workers > 1:
+            self.pool = Pool(num_workers, init_worker, (dict_file, postings_file, engine))
+        else:
+            load_index(dict_file, postings_file, engine)
+
+    def evaluate(self, query):
+        """
+        :param query: query free text
+        :return: (formatted result, seconds taken to evaluate the query)
+        """
+        if self.pool is not None:
+            return self.pool.apply(answer_query, (query,))
+        with self.lock:
+            return answer_query(query)
+
+    def close(self):
+        if self.pool is not None:
+            # The workers exit on their own so they close their postings file, terminate would kill them
+            self.pool.close()
+            self.pool.join()
+        else:
+            close_index()
+
+
+def report_latency(query, total, evaluation):
+    """
+    Prints the latency of a query on stderr: the time until its answer and the time of its evaluation,
+    which differ by the time spent waiting for a worker
+    """
+    sys.stderr.write("%8.2fms %8.2fms  %s\n" % (total * 1000, evaluation * 1000, query))
+    sys.stderr.flush()
+
+
+class QueryHandler(socketserver.StreamRequestHandler):
+    """
+    Answers the queries of one client: every line received is a query and every line sent back its result
+    """
+    def handle(self):
+        for line in self.rfile:
+            start = time.perf_counter()
+            query = line.decode('utf8').rstrip("\r\n")
+            result, evaluation = self.server.evaluator.evaluate(query)
+            self.wfile.write((result + "\n").encode('utf8'))
+            self.wfile.flush()
+            report_latency(query, time.perf_counter() - start, evaluation)
+
+
+class QueryServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Unix socket server with a thread per client, the queries are evaluated by the shared QueryEvaluator
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_file, evaluator):
+        socketserver.UnixStreamServer.__init__(self, socket_file, QueryHandler)
+        self.evaluator = evaluator
+
+
+def serve(dict_file, postings_file, socket_file=None, num_workers=1, engine="python"):
+    """
+    Loads the index once and answers queries until stopped
+    Without socket_file queries are read from stdin one per line and their results written to stdout,
+    otherwise clients connect to the Unix socket socket_file and send queries one per line
+    The latency of every query is printed on stderr
+    :param num_workers: number of processes evaluating queries, 1 to evaluate them in this process
+    """
+    evaluator = QueryEvaluator(dict_file, postings_file, engine, num_workers)
+    try:
+        if socket_file is None:
+            for line in sys.stdin:
+                start = time.perf_counter()
+                query = line.rstrip("\r\n")
+                result, evaluation = evaluator.evaluate(query)
+                sys.stdout.write(result + "\n")
+                sys.stdout.flush()
+                report_latency(query, time.perf_counter() - start, evaluation)
+            return
+
+        # A socket left by a server which was killed is replaced, any other file is kept and binding fails
+        if os.path.exists(socket_file) and stat.S_ISSOCK(os.stat(socket_file).st_mode):
+            os.remove(socket_file)
+        server = QueryServer(socket_file, evaluator)
+        sys.stderr.write("listening on %s\n" % socket_file)
+        sys.stderr.flush()
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            os.remove(socket_file)
+    finally:
+        evaluator.close()
+
+
+def main():
+    """
+    Parses the command line and serves queries
+    """
+    dictionary_file = postings_file = socket_file = None
+    num_workers = 1
+    engine = "python"
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'd:p:s:j:e:')
+    except getopt.GetoptError:
+        usage()
+        sys.exit(2)
+
+    for o, a in opts:
+        if o == '-d':
+            dictionary_file = a
+        elif o == '-p':
+            postings_file = a
+        elif o == '-s': # Unix socket to listen on, stdin if not set
+            socket_file = a
+        elif o == '-j': # number of processes evaluating queries
+            num_workers = int(a)
+        elif o == '-e': # scoring engine
+            if a not in ENGINES:
+                usage()
+                sys.exit(2)
+            engine = a
+        else:
+            assert False, "unhandled option"
+
+    if dictionary_file == None or postings_file == None:
+        usage()
+        sys.exit(2)
+
+    serve(dictionary_file, postings_file, socket_file, num_workers, engine)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,8 +5,12 @@ from math import log, sqrt
 import heapq
 import string
 
+import maxscore
+
 STEMMER = nltk.stem.porter.PorterStemmer()
 REMOVE_PUNCTUATION = False
+NUM_RESULTS = 10  # Documents returned per query
+MAXSCORE_MIN_POSTINGS = 50000  # Postings of a query from which MaxScore beats scoring every posting, see benchmark.py
 
 def read_document(directory, doc):
     """
@@ -30,13 +34,11 @@ def read_document(directory, doc):
 
         return terms
 
-def eval_query(query, dictionary, postings):
+
+def get_query_terms(query):
     """
-    Main part of searching. Evaluates the query and returns top 10 results using heap based on lnc.ltc
     :param query: query free text
-    :param dictionary: Object of Dictionary
-    :param postings: Object of PostingsFile
-    :return: Top 10 results as an array []
+    :return: normalised terms of the query
     """
     query = query.strip()
 
@@ -45,26 +47,27 @@ def eval_query(query, dictionary, postings):
         query = ''.join(ch for ch in query if ch not in exclude)
 
     query_tokens = nltk.tokenize.word_tokenize(query)
+    return [STEMMER.stem(token.lower()) for token in query_tokens]
 
+
+def get_query_weights(query, dictionary):
+    """
+    Builds the ltc vector of a query
+    :param query: query free text
+    :param dictionary: Object of Dictionary
+    :return: ([(term, weight)], norm_query) with the terms in the order they first appear in the query,
+    weights include the impact scale if the postings hold impacts, norm_query is the length of the ltc vector
+    """
     tf_query = defaultdict(float)
-    document_score = defaultdict(int)
-    query_norm_tokens = list()
+    query_norm_tokens = get_query_terms(query)
     total_docs = dictionary.get_doc_count()
 
-    for token in query_tokens:
-        query_norm_tokens.append(STEMMER.stem(token.lower()))
-
     for norm_token in query_norm_tokens:
         tf_query[norm_token] += 1
 
-    for norm_token in set(query_norm_tokens):
-
-        offset = dictionary.get_offset_of_term(norm_token)
-        if offset != -1:
-            posting_list = postings.get_posting_list(offset)
-        else:
-            posting_list = list()
-
+    # Terms in the order they first appear in the query, so scores are added up in the same order by all evaluations
+    query_terms = list()
+    for norm_token in tf_query:
         df = dictionary.get_df(norm_token)
 
         if df == 0 or df == -1:
@@ -73,23 +76,164 @@ def eval_query(query, dictionary, postings):
             idf = log(total_docs / df, 10)
 
         tf_query[norm_token] = idf * (1 + log(tf_query[norm_token], 10))
-
-        for posting in posting_list:
-            doc_id = posting[0]
-            tf_doc = 1.0 + log(posting[1], 10)
-
-            document_score[doc_id] += tf_query[norm_token] * tf_doc
+        query_terms.append((norm_token, tf_query[norm_token]))
 
     norm_query = 0
     for term, wt in tf_query.items():
         norm_query += (wt * wt)
     norm_query = sqrt(norm_query)
 
+    # Postings with impacts already hold the lnc weight, the impact scale is applied once to the query weights
+    if dictionary.has_impacts():
+        scale = dictionary.get_impact_scale()
+        query_terms = [(norm_token, weight * scale) for norm_token, weight in query_terms]
+
+    return query_terms, norm_query
+
+
+def eval_query(query, dictionary, postings, exhaustive=False, stats=None, all_tiers=False,
+               maxscore_min_postings=MAXSCORE_MIN_POSTINGS):
+    """
+    Main part of searching. Evaluates the query and returns top 10 results based on lnc.ltc
+    With the max weights of the terms in the dictionary and at least maxscore_min_postings postings in the query lists,
+    the top 10 are found with MaxScore, which skips the documents that cannot make it. Otherwise (or if exhaustive)
+    every posting is scored and a heap gives the top 10, which is faster for short lists since MaxScore pays for its
+    bookkeeping on every candidate. Both give the same results, ties are ranked by increasing docId
+    A tiered index is evaluated from its champion lists, see eval_tiers, unless all_tiers or exhaustive is set
+    :param query: query free text
+    :param dictionary: Object of Dictionary
+    :param postings: Object of PostingsFile
+    :param exhaustive: score every posting even if MaxScore or the tiers could be used
+    :param stats: dict counting "scored" postings and "postings" of the lists, or None
+    :param all_tiers: score the whole posting lists of a tiered index
+    :param maxscore_min_postings: postings of the query lists from which MaxScore is used, 0 to always use it
+    :return: Top 10 results as an array []
+    """
+    query_terms, norm_query = get_query_weights(query, dictionary)
+    # All weights are 0 if every query term is in every document, the scores are then all 0
+    norm_query = norm_query or 1.0
+    impacts = dictionary.has_impacts()
+
+    if dictionary.get_tiers() and not (all_tiers or exhaustive):
+        return eval_tiers(query_terms, norm_query, dictionary, postings, stats)
+
+    posting_lists = list()
+    for norm_token, _ in query_terms:
+        offset = dictionary.get_offset_of_term(norm_token)
+        if offset != -1:
+            posting_lists.append(postings.get_posting_list(offset, dictionary.get_num_tiers(norm_token)))
+        else:
+            posting_lists.append(list())
+
+    if not exhaustive and dictionary.has_max_weights() and \
+            sum(map(len, posting_lists)) >= maxscore_min_postings:
+        max_weights = [dictionary.get_max_weight(term) for term, _ in query_terms]
+        if impacts:
+            max_weights = [max_weight / dictionary.get_impact_scale() for max_weight in max_weights]
+        return maxscore.top_k(query_terms, posting_lists, max_weights, norm_query, dictionary, NUM_RESULTS, stats,
+                              impacts)
+
+    document_score = defaultdict(int)
+    for (norm_token, weight), posting_list in zip(query_terms, posting_lists):
+        score_postings(document_score, weight, posting_list, impacts)
+
+    if stats is not None:
+        stats["scored"] = stats.get("scored", 0) + sum(map(len, posting_lists))
+        stats["postings"] = stats.get("postings", 0) + sum(map(len, posting_lists))
+
+    return top_documents(document_score, norm_query, dictionary)
+
+
+def eval_tiers(query_terms, norm_query, dictionary, postings, stats=None):
+    """
+    Evaluates a query on a tiered index. The first tiers (champion lists) of all query terms are scored, and the
+    next tiers only if fewer than 10 documents were found, and so on. Documents are scored with the postings of the
+    tiers read, so the top 10 may differ from the one of the whole lists
+    :param query_terms: list of (term, ltc weight) in query order
+    :param norm_query: length of the query vector
+    :param dictionary: Object of Dictionary
+    :param postings: Object of PostingsFile
+    :param stats: dict counting "scored" postings and "postings" of the lists, or None
+    :return: Top 10 results as an array []
+    """
+    impacts = dictionary.has_impacts()
+    tier_lists = list()  # Generator of the tiers of every query term
+    num_postings = 0
+    for norm_token, _ in query_terms:
+        offset = dictionary.get_offset_of_term(norm_token)
+        if offset != -1:
+            tier_lists.append(postings.get_tiers(offset, dictionary.get_num_tiers(norm_token)))
+            num_postings += dictionary.get_df(norm_token)
+        else:
+            tier_lists.append(iter(()))
+
+    document_score = defaultdict(int)
+    scored = 0
+    for _ in range(len(dictionary.get_tiers()) + 1):
+        for (norm_token, weight), tiers in zip(query_terms, tier_lists):
+            posting_list = next(tiers, None)
+            if posting_list is not None:
+                score_postings(document_score, weight, posting_list, impacts)
+                scored += len(posting_list)
+        if len(document_score) >= NUM_RESULTS:
+            break
+
+    if stats is not None:
+        stats["scored"] = stats.get("scored", 0) + scored
+        stats["postings"] = stats.get("postings", 0) + num_postings
+
+    return top_documents(document_score, norm_query, dictionary)
+
+
+def score_postings(document_score, weight, posting_list, impacts):
+    """
+    Adds the products of the query weight of a term and its lnc weight in every document of its posting list
+    :param document_score: dict of the scores {docId: score}
+    :param weight: ltc weight of the term in the query
+    :param posting_list: [(docId, tf)] or [(docId, impact)]
+    :param impacts: True if posting_list holds impacts
+    """
+    if impacts:
+        for doc_id, impact in posting_list:
+            document_score[doc_id] += weight * impact
+        return
+
+    for posting in posting_list:
+        doc_id = posting[0]
+        tf_doc = 1.0 + log(posting[1], 10)
+
+        document_score[doc_id] += weight * tf_doc
+
+
+def top_documents(document_score, norm_query, dictionary):
+    """
+    Normalises the scores by the lengths of the query and documents and returns the top 10
+    :param document_score: dict of the scores {docId: score}
+    :param norm_query: length of the query vector
+    :param dictionary: Object of Dictionary
+    :return: Top 10 docIds by decreasing score then increasing docId
+    """
+    impacts = dictionary.has_impacts()
     for docId, score in document_score.items():
+        if impacts:
+            document_score[docId] = score / norm_query
+            continue
         doc_norm_len = dictionary.get_normalised_doc_length(docId)
         document_score[docId] = score / (norm_query * doc_norm_len)
 
-    return heapq.nlargest(10, document_score, key=document_score.__getitem__)
+    # nlargest keeps the first of equal scores, so ties are ranked by increasing docId
+    return heapq.nlargest(NUM_RESULTS, sorted(document_score), key=document_score.__getitem__)
+
+
+def recall(result, reference):
+    """
+    :param result: docIds returned
+    :param reference: docIds which should have been returned
+    :return: fraction of reference in result, 1 if reference is empty
+    """
+    if not reference:
+        return 1.0
+    return len(set(result) & set(reference)) / float(len(reference))
 
 
 def format_result(result):